@@ -0,0 +1,208 @@
+# Copyright 2020 The StackStorm Authors
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module for compiling RBAC definitions into a single bundle file and for loading them from it.
+
+Bundle contains all the role definitions, user role assignments and group to role mappings and
+can be distributed to all the nodes and loaded with a single sequential read instead of scanning
+and parsing the whole RBAC definitions directory.
+
+Bundle format:
+
+    * Magic bytes (``ST2RBAC\\x00``)
+    * Format version (4 bytes, unsigned big endian integer)
+    * Length of the payload (8 bytes, unsigned big endian integer)
+    * sha256 digest of the payload (32 bytes)
+    * Payload - zlib compressed JSON document with "index" and "sections" attributes. Index maps
+      section name to a list of names (role name, username, group name) in the same order as
+      definitions are stored in the section. Each item in the section contains "definition" with
+      the attributes which are defined in the API class schema and "file_path" with the path to
+      the file the definition has been loaded from (if any).
+"""
+
+from __future__ import absolute_import
+
+import os
+import json
+import zlib
+import struct
+import hashlib
+import tempfile
+from collections import OrderedDict
+
+from st2common import log as logging
+from st2common.models.api.rbac import RoleDefinitionFileFormatAPI
+from st2common.models.api.rbac import UserRoleAssignmentFileFormatAPI
+from st2common.models.api.rbac import AuthGroupToRoleMapAssignmentFileFormatAPI
+
+__all__ = ["BUNDLE_VERSION", "InvalidBundleError", "write_bundle", "read_bundle"]
+
+LOG = logging.getLogger(__name__)
+
+BUNDLE_MAGIC = b"ST2RBAC\x00"
+BUNDLE_VERSION = 2
+
+HEADER_FORMAT = ">8sIQ32s"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Maps bundle section name to the file format API class and the attribute which identifies a
+# definition inside the section
+SECTIONS = OrderedDict(
+    [
+        ("roles", (RoleDefinitionFileFormatAPI, "name")),
+        ("role_assignments", (UserRoleAssignmentFileFormatAPI, "username")),
+        ("group_to_role_maps", (AuthGroupToRoleMapAssignmentFileFormatAPI, "group")),
+    ]
+)
+
+
+class InvalidBundleError(ValueError):
+    pass
+
+
+def write_bundle(path, definitions):
+    """
+    Write RBAC definitions to a bundle file. File is written atomically.
+
+    :param path: Path to the bundle file.
+    :type path: ``str``
+
+    :param definitions: Definitions as returned by RBACDefinitionsLoader.load().
+    :type definitions: ``dict``
+
+    :return: sha256 digest of the bundle payload.
+    :rtype: ``str``
+    """
+    index = OrderedDict()
+    sections = OrderedDict()
+
+    for section_name in SECTIONS.keys():
+        apis = definitions.get(section_name, {})
+        index[section_name] = list(apis.keys())
+        api_cls = SECTIONS[section_name][0]
+        sections[section_name] = [_api_to_item(api_cls, api) for api in apis.values()]
+
+    payload = json.dumps({"index": index, "sections": sections}, sort_keys=True)
+    payload = zlib.compress(payload.encode("utf-8"))
+    sha256 = hashlib.sha256(payload)
+
+    header = struct.pack(HEADER_FORMAT, BUNDLE_MAGIC, BUNDLE_VERSION, len(payload), sha256.digest())
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".rbac-bundle-")
+
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(header)
+            fp.write(payload)
+
+        os.rename(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+
+    LOG.info(
+        'Written RBAC definitions bundle "%s" (%s roles, %s role assignments, %s mappings)'
+        % (
+            path,
+            len(index["roles"]),
+            len(index["role_assignments"]),
+            len(index["group_to_role_maps"]),
+        )
+    )
+
+    return sha256.hexdigest()
+
+
+def read_bundle(path):
+    """
+    Read and validate RBAC definitions from a bundle file.
+
+    :param path: Path to the bundle file.
+    :type path: ``str``
+
+    :return: Definitions in the same format as returned by RBACDefinitionsLoader.load().
+    :rtype: ``dict``
+    """
+    with open(path, "rb") as fp:
+        data = fp.read()
+
+    if len(data) < HEADER_SIZE:
+        raise InvalidBundleError('File "%s" is not a valid RBAC definitions bundle' % (path))
+
+    magic, version, length, digest = struct.unpack(HEADER_FORMAT, data[:HEADER_SIZE])
+
+    if magic != BUNDLE_MAGIC:
+        raise InvalidBundleError('File "%s" is not a valid RBAC definitions bundle' % (path))
+
+    if version != BUNDLE_VERSION:
+        raise InvalidBundleError(
+            'Unsupported RBAC definitions bundle version "%s" (expected "%s")'
+            % (version, BUNDLE_VERSION)
+        )
+
+    payload = data[HEADER_SIZE:]
+
+    if len(payload) != length or hashlib.sha256(payload).digest() != digest:
+        raise InvalidBundleError('RBAC definitions bundle "%s" checksum mismatch' % (path))
+
+    payload = json.loads(zlib.decompress(payload).decode("utf-8"))
+
+    result = {}
+    for section_name, (api_cls, name_attribute) in SECTIONS.items():
+        names = payload["index"][section_name]
+        items = payload["sections"][section_name]
+
+        if len(names) != len(items):
+            raise InvalidBundleError('RBAC definitions bundle "%s" index is corrupted' % (path))
+
+        result[section_name] = OrderedDict()
+
+        for name, item in zip(names, items):
+            api = api_cls(**item["definition"])
+            api = api.validate()
+
+            # Note: File path is not part of the definition itself so it's set after validation
+            if item.get("file_path", None) is not None:
+                api.file_path = item["file_path"]
+
+            if getattr(api, name_attribute) != name:
+                raise InvalidBundleError('RBAC definitions bundle "%s" index is corrupted' % (path))
+
+            result[section_name][name] = api
+
+    return result
+
+
+def _api_to_item(api_cls, api):
+    """
+    Return bundle section item for the provided API object.
+
+    Only attributes which are defined in the API class schema are serialized so the bundle doesn't
+    depend on the schema accepting any additional attributes which are set on the object.
+
+    :rtype: ``dict``
+    """
+    properties = api_cls.schema.get("properties", {})
+    definition = dict(
+        [
+            (key, value)
+            for key, value in vars(api).items()
+            if key in properties and key != "file_path"
+        ]
+    )
+
+    return {"definition": definition, "file_path": getattr(api, "file_path", None)}
@@ -0,0 +1,333 @@
+# Copyright 2020 The StackStorm Authors
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module containing process wide cache for permission decisions and user permission snapshots.
+
+The cache is disabled by default and can be enabled using "rbac.cache_enabled" config option.
+
+Entries are evicted when the cache grows over the configured size (least recently used entries
+are evicted first), when they expire (TTL) and when RBAC generation changes. RBAC generation is
+a global counter which is bumped each time RBAC definitions are changed (roles, grants, role
+assignments, group to role mappings) and which invalidates all the cached entries at once.
+
+Entries for particular users are also dropped when a change event is received from another
+process (see st2rbac_backend.invalidation) and all the entries are dropped when the active
+generation of RBAC definitions in the database changes (see st2rbac_backend.generation).
+"""
+
+from __future__ import absolute_import
+
+import time
+import threading
+from collections import OrderedDict
+
+import six
+from oslo_config import cfg
+
+from st2rbac_backend import config as rbac_config  # noqa: F401 pylint: disable=unused-import
+from st2rbac_backend import generation
+
+__all__ = [
+    "LRUCache",
+    "get_generation",
+    "bump_generation",
+    "get_decisions_cache",
+    "get_permissions_snapshots_cache",
+    "get_cache_stats",
+    "check_active_generation",
+    "invalidate_users",
+    "clear_caches",
+]
+
+# Global RBAC generation counter
+_GENERATION = {"value": 0}
+_GENERATION_LOCK = threading.Lock()
+
+# Last seen active generation of RBAC definitions in the database
+_ACTIVE_GENERATION = {"value": None, "checked_at": 0}
+
+_DECISIONS_CACHE = None
+_PERMISSIONS_SNAPSHOTS_CACHE = None
+
+
+class LRUCache(object):
+    """
+    Bounded, thread-safe LRU cache with per entry TTL and generation based invalidation.
+
+    Cached values can be any values (including False) - pass a sentinel as "default" to
+    distinguish a cache miss from a cached falsy value.
+    """
+
+    def __init__(self, max_size, ttl, timer=time.time):
+        """
+        :param max_size: Maximum number of entries.
+        :type max_size: ``int``
+
+        :param ttl: Number of seconds after which an entry expires.
+        :type ttl: ``int``
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._timer = timer
+        self._lock = threading.Lock()
+
+        # Maps key to a (value, expires_at, generation) tuple
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        """
+        Return cached value for the provided key or default if there is no valid entry.
+        """
+        with self._lock:
+            entry = self._data.get(key, None)
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at, generation = entry
+
+            if expires_at <= self._timer() or generation != get_generation():
+                del self._data[key]
+                self.misses += 1
+                self.evictions += 1
+                return default
+
+            # Mark entry as most recently used
+            del self._data[key]
+            self._data[key] = entry
+
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            if key in self._data:
+                del self._data[key]
+
+            self._data[key] = (value, self._timer() + self.ttl, get_generation())
+
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                del self._data[key]
+
+    def delete_matching(self, predicate):
+        """
+        Delete all the entries for which predicate(key, value) returns True.
+
+        :return: Number of deleted entries.
+        :rtype: ``int``
+        """
+        with self._lock:
+            keys = [key for key, entry in six.iteritems(self._data) if predicate(key, entry[0])]
+
+            for key in keys:
+                del self._data[key]
+
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_stats(self):
+        """
+        :rtype: ``dict``
+        """
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+
+def get_generation():
+    """
+    Return current RBAC generation.
+
+    :rtype: ``int``
+    """
+    return _GENERATION["value"]
+
+
+def bump_generation():
+    """
+    Bump RBAC generation which invalidates all the cached entries.
+
+    This function should be called each time RBAC definitions are changed.
+
+    :return: New generation.
+    :rtype: ``int``
+    """
+    with _GENERATION_LOCK:
+        _GENERATION["value"] += 1
+        return _GENERATION["value"]
+
+
+def get_decisions_cache():
+    """
+    Return process wide permission decisions cache or None if caching is disabled.
+
+    :rtype: :class:`LRUCache`
+    """
+    global _DECISIONS_CACHE
+
+    if not cfg.CONF.rbac.cache_enabled:
+        return None
+
+    if _DECISIONS_CACHE is None:
+        _DECISIONS_CACHE = LRUCache(
+            max_size=cfg.CONF.rbac.cache_max_size, ttl=cfg.CONF.rbac.cache_ttl
+        )
+        _start_change_events_watcher()
+
+    check_active_generation()
+    return _DECISIONS_CACHE
+
+
+def get_permissions_snapshots_cache():
+    """
+    Return process wide user permissions snapshots cache or None if caching is disabled.
+
+    :rtype: :class:`LRUCache`
+    """
+    global _PERMISSIONS_SNAPSHOTS_CACHE
+
+    if not cfg.CONF.rbac.cache_enabled:
+        return None
+
+    if _PERMISSIONS_SNAPSHOTS_CACHE is None:
+        _PERMISSIONS_SNAPSHOTS_CACHE = LRUCache(
+            max_size=cfg.CONF.rbac.cache_max_size, ttl=cfg.CONF.rbac.cache_ttl
+        )
+        _start_change_events_watcher()
+
+    check_active_generation()
+    return _PERMISSIONS_SNAPSHOTS_CACHE
+
+
+def get_cache_stats():
+    """
+    Return hit / miss / eviction counters for all the process wide caches.
+
+    :rtype: ``dict``
+    """
+    result = {"generation": get_generation()}
+
+    for name, cache in [
+        ("decisions", _DECISIONS_CACHE),
+        ("permissions_snapshots", _PERMISSIONS_SNAPSHOTS_CACHE),
+    ]:
+        result[name] = cache.get_stats() if cache is not None else None
+
+    return result
+
+
+def check_active_generation(timer=time.time):
+    """
+    Compare active generation of RBAC definitions in the database with the last seen one and
+    invalidate all the cached entries if it has changed.
+
+    The database is checked at most once per "rbac.generation_check_interval" seconds.
+    """
+    interval = cfg.CONF.rbac.generation_check_interval
+
+    if interval <= 0:
+        return
+
+    now = timer()
+
+    if now - _ACTIVE_GENERATION["checked_at"] < interval:
+        return
+
+    _ACTIVE_GENERATION["checked_at"] = now
+    active_generation = generation.get_active_generation()
+
+    if _ACTIVE_GENERATION["value"] not in [None, active_generation]:
+        bump_generation()
+
+    _ACTIVE_GENERATION["value"] = active_generation
+
+
+def invalidate_users(usernames, role_names=None):
+    """
+    Drop cached permission decisions and snapshots for the provided users and for the users whose
+    cached permissions snapshot contains any of the provided roles.
+
+    :param usernames: Names of the users to drop the entries for.
+    :type usernames: ``list`` of ``str``
+
+    :param role_names: Names of the roles to drop the entries for.
+    :type role_names: ``list`` of ``str``
+    """
+    usernames = set(usernames or [])
+    role_names = set(role_names or [])
+
+    def is_affected_snapshot(username, permissions_snapshot):
+        if username in usernames:
+            return True
+
+        if not role_names.isdisjoint(permissions_snapshot.role_names):
+            # Also drop decisions for this user below
+            usernames.add(username)
+            return True
+
+        return False
+
+    if _PERMISSIONS_SNAPSHOTS_CACHE is not None:
+        _PERMISSIONS_SNAPSHOTS_CACHE.delete_matching(is_affected_snapshot)
+
+    if _DECISIONS_CACHE is not None:
+        _DECISIONS_CACHE.delete_matching(lambda key, value: key[0] in usernames)
+
+
+def clear_caches():
+    """
+    Drop all the process wide caches (including the counters).
+    """
+    global _DECISIONS_CACHE
+    global _PERMISSIONS_SNAPSHOTS_CACHE
+
+    _DECISIONS_CACHE = None
+    _PERMISSIONS_SNAPSHOTS_CACHE = None
+
+    _ACTIVE_GENERATION["value"] = None
+    _ACTIVE_GENERATION["checked_at"] = 0
+
+
+def _start_change_events_watcher():
+    if not cfg.CONF.rbac.change_events_enabled:
+        return
+
+    # Note: Imported here to avoid circular import
+    from st2rbac_backend import invalidation
+
+    invalidation.start_watcher()
@@ -18,18 +18,93 @@ A script which applies RBAC definitions and role assignments stored on disk.
 """
 
 from __future__ import absolute_import
+from __future__ import print_function
+
+import os
+import cProfile
+
+from oslo_config import cfg
 
 from st2common import config
+from st2common.config import do_register_cli_opts
 from st2common.script_setup import setup as common_setup
 from st2common.script_setup import teardown as common_teardown
 
+from st2rbac_backend import bundle
+from st2rbac_backend import timings
 from st2rbac_backend.loader import RBACDefinitionsLoader
 from st2rbac_backend.syncer import RBACDefinitionsDBSyncer
+from st2rbac_backend.watch import RBACDefinitionsWatcher
 
 __all__ = ["main"]
 
 
+def _register_cli_opts():
+    cli_opts = [
+        cfg.IntOpt(
+            "parallel",
+            default=None,
+            help="Number of worker processes to parse and validate RBAC definition files in. "
+            'Defaults to the "rbac.definitions_load_workers" config option.',
+        ),
+        cfg.StrOpt(
+            "compile",
+            default=None,
+            help="Compile RBAC definitions on disk into a bundle file at the provided path "
+            "instead of applying them.",
+        ),
+        cfg.StrOpt(
+            "bundle",
+            default=None,
+            help="Apply RBAC definitions from the provided bundle file (see --compile) instead of "
+            "from the definition files on disk.",
+        ),
+        cfg.BoolOpt(
+            "watch",
+            default=False,
+            help="Keep running, watch RBAC definitions directory for changes and apply only the "
+            "definitions which have changed.",
+        ),
+        cfg.FloatOpt(
+            "watch-interval",
+            default=1.0,
+            help="How often (in seconds) to check RBAC definitions directory for changes in the "
+            "watch mode.",
+        ),
+        cfg.FloatOpt(
+            "watch-debounce",
+            default=0.5,
+            help="How long (in seconds) RBAC definitions directory needs to stay unchanged before "
+            "the changes are applied in the watch mode.",
+        ),
+        cfg.BoolOpt(
+            "timings",
+            default=False,
+            help="Print wall time of each phase (file discovery, parsing, validation, database "
+            "diff and writes).",
+        ),
+        cfg.BoolOpt(
+            "count-queries",
+            default=False,
+            help="Print number of database operations of each phase.",
+        ),
+        # Note: "profile" name is already used by the global StackStorm "--profile" option
+        cfg.StrOpt(
+            "profile-output",
+            default=None,
+            help="Profile the run with cProfile and write the stats to the provided file.",
+        ),
+    ]
+    do_register_cli_opts(cli_opts)
+
+
 def setup(argv):
+    _register_cli_opts()
+
+    # Note: Listener needs to be registered before the database connection is established. It only
+    # counts operations while phases are being recorded.
+    timings.register_query_counter()
+
     common_setup(config=config, setup_db=True, register_mq_exchanges=True)
 
 
@@ -37,10 +112,21 @@ def teartown():
     common_teardown()
 
 
-def apply_definitions():
-    loader = RBACDefinitionsLoader()
+def compile_definitions(bundle_path):
+    loader = RBACDefinitionsLoader(parallel=cfg.CONF.parallel)
     result = loader.load()
 
+    return bundle.write_bundle(path=bundle_path, definitions=result)
+
+
+def apply_definitions(bundle_path=None):
+    loader = RBACDefinitionsLoader(parallel=cfg.CONF.parallel)
+
+    if bundle_path:
+        result = loader.load_from_bundle(bundle_path=bundle_path)
+    else:
+        result = loader.load()
+
     role_definition_apis = list(result["roles"].values())
     role_assignment_apis = list(result["role_assignments"].values())
     group_to_role_map_apis = list(result["group_to_role_maps"].values())
@@ -55,7 +141,57 @@ def apply_definitions():
     return result
 
 
+def watch_definitions():
+    # Note: Watcher keeps the loaded definitions in memory and only passes the files which have
+    # changed to the loader
+    loader = RBACDefinitionsLoader(parallel=cfg.CONF.parallel)
+    syncer = RBACDefinitionsDBSyncer()
+
+    watcher = RBACDefinitionsWatcher(
+        loader=loader,
+        syncer=syncer,
+        path=os.path.join(cfg.CONF.system.base_path, "rbac/"),
+        interval=cfg.CONF.watch_interval,
+        debounce=cfg.CONF.watch_debounce,
+    )
+
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+def run():
+    if cfg.CONF.watch:
+        watch_definitions()
+    elif cfg.CONF.compile:
+        compile_definitions(bundle_path=cfg.CONF.compile)
+    else:
+        apply_definitions(bundle_path=cfg.CONF.bundle)
+
+
 def main(argv):
     setup(argv)
-    apply_definitions()
+
+    record_phases = cfg.CONF.timings or cfg.CONF.count_queries
+    profiler = cProfile.Profile() if cfg.CONF.profile_output else None
+
+    if record_phases:
+        timings.start_recording()
+
+    if profiler:
+        profiler.enable()
+
+    try:
+        run()
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(cfg.CONF.profile_output)
+            print('Profile written to "%s"' % (cfg.CONF.profile_output))
+
+        if record_phases:
+            recorder = timings.stop_recording()
+            print(recorder.format_report(count_queries=cfg.CONF.count_queries))
+
     teartown()
@@ -0,0 +1,112 @@
+# Copyright 2020 The StackStorm Authors
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module which registers RBAC backend specific config options.
+
+All the options live under the "[rbac]" section of the StackStorm config.
+"""
+
+from __future__ import absolute_import
+
+from oslo_config import cfg
+
+from st2common.config import do_register_opts
+
+__all__ = ["register_opts"]
+
+
+def register_opts(ignore_errors=False):
+    rbac_opts = [
+        cfg.StrOpt(
+            "permission_grants_lookup",
+            default="query",
+            choices=["query", "aggregation"],
+            help='How to resolve user permission grants. "query" issues a chain of queries '
+            '(role assignments -> roles -> permission grants) and "aggregation" resolves the '
+            "whole chain with a single server-side aggregation (requires MongoDB >= 4.0).",
+        ),
+        cfg.BoolOpt(
+            "cache_enabled",
+            default=False,
+            help="True to enable process wide cache for permission decisions and user "
+            "permission snapshots.",
+        ),
+        cfg.IntOpt(
+            "cache_max_size",
+            default=10000,
+            help="Maximum number of entries in each of the process wide caches. Least recently "
+            "used entries are evicted first.",
+        ),
+        cfg.IntOpt(
+            "cache_ttl",
+            default=60,
+            help="Number of seconds after which a cached permission decision or user permission "
+            "snapshot expires.",
+        ),
+        cfg.BoolOpt(
+            "change_events_enabled",
+            default=False,
+            help="True to publish RBAC change events on the message bus and to drop cache entries "
+            "for the affected users when an event is received. Needs to be enabled on all the "
+            "nodes when process wide cache is used in a multi node deployment.",
+        ),
+        cfg.IntOpt(
+            "generation_check_interval",
+            default=5,
+            help="How often (in seconds) to check the active generation of RBAC definitions in the "
+            "database. Process wide cache is invalidated when the active generation changes. 0 "
+            "to disable the check.",
+        ),
+        cfg.IntOpt(
+            "sync_batch_size",
+            default=1000,
+            help="Maximum number of write operations which are sent to the database in a single "
+            "bulk write request when synchronizing RBAC definitions.",
+        ),
+        cfg.BoolOpt(
+            "group_to_role_map_case_insensitive",
+            default=False,
+            help="True to match remote user groups against group to role mappings "
+            "case-insensitively.",
+        ),
+        cfg.IntOpt(
+            "group_to_role_map_index_max_age",
+            default=60,
+            help="Maximum number of seconds after which the in-process group to role mappings "
+            "index is reloaded even if the mappings don't appear to have changed. This bounds for "
+            "how long mappings which are updated in place by code which bypasses the RBAC service "
+            "are not picked up. 0 to reload the index on each remote group sync.",
+        ),
+        cfg.IntOpt(
+            "definitions_load_workers",
+            default=1,
+            help="Number of worker processes which are used to parse and validate RBAC definition "
+            "files when applying RBAC definitions. 1 to parse the files in the current process.",
+        ),
+        cfg.StrOpt(
+            "definitions_cache_path",
+            default=None,
+            help="Path to the file where parsed and validated RBAC definition files are cached. "
+            "Only files which have changed since the previous run are parsed again. Cache file "
+            "is ignored if it's not owned by the user which applies RBAC definitions or if it's "
+            "writable by other users. If not set, cache is disabled.",
+        ),
+    ]
+
+    do_register_opts(rbac_opts, "rbac", ignore_errors)
+
+
+register_opts(ignore_errors=True)
@@ -0,0 +1,116 @@
+# Copyright 2020 The StackStorm Authors
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module for manipulating the persisted active generation pointer of RBAC definitions.
+
+The pointer is flipped (atomically incremented) by the RBAC definitions syncer once a complete new
+set of definitions has been written to the database. Processes which use process wide cache
+periodically compare it with the last generation they have seen and drop all the cached entries
+when it changes which makes it a cheap global cache invalidation key which works without a
+message bus.
+
+The same document also holds version of group to role mappings which is incremented on each
+mappings write and used to reload in-process mappings index (see st2rbac_backend.mapping_index).
+"""
+
+from __future__ import absolute_import
+
+from collections import namedtuple
+
+from st2common.util import date as date_utils
+
+from st2rbac_backend.models import RBACGenerationDB
+
+__all__ = [
+    "ActiveVersions",
+    "get_active_generation",
+    "get_active_versions",
+    "activate_new_generation",
+    "bump_group_to_role_maps_version",
+]
+
+ACTIVE_GENERATION_NAME = "active"
+
+ActiveVersions = namedtuple("ActiveVersions", ["generation", "group_to_role_maps_version"])
+
+
+def get_active_generation():
+    """
+    Return active generation of RBAC definitions.
+
+    :rtype: ``int``
+    """
+    generation_db = RBACGenerationDB.objects(name=ACTIVE_GENERATION_NAME).only("generation").first()
+
+    if not generation_db:
+        return 0
+
+    return generation_db.generation
+
+
+def get_active_versions():
+    """
+    Return active generation of RBAC definitions and version of group to role mappings using a
+    single query.
+
+    :rtype: :class:`ActiveVersions`
+    """
+    generation_db = (
+        RBACGenerationDB.objects(name=ACTIVE_GENERATION_NAME)
+        .only("generation", "group_to_role_maps_version")
+        .first()
+    )
+
+    if not generation_db:
+        return ActiveVersions(generation=0, group_to_role_maps_version=0)
+
+    return ActiveVersions(
+        generation=generation_db.generation,
+        group_to_role_maps_version=generation_db.group_to_role_maps_version,
+    )
+
+
+def activate_new_generation():
+    """
+    Atomically flip active generation pointer to a new generation.
+
+    :return: New active generation.
+    :rtype: ``int``
+    """
+    generation_db = RBACGenerationDB.objects(name=ACTIVE_GENERATION_NAME).modify(
+        upsert=True,
+        new=True,
+        inc__generation=1,
+        set__updated_at=date_utils.get_datetime_utc_now(),
+    )
+    return generation_db.generation
+
+
+def bump_group_to_role_maps_version():
+    """
+    Atomically increment version of group to role mappings. Needs to be called each time mappings
+    are written to the database.
+
+    :return: New version of group to role mappings.
+    :rtype: ``int``
+    """
+    generation_db = RBACGenerationDB.objects(name=ACTIVE_GENERATION_NAME).modify(
+        upsert=True,
+        new=True,
+        inc__group_to_role_maps_version=1,
+        set__updated_at=date_utils.get_datetime_utc_now(),
+    )
+    return generation_db.group_to_role_maps_version
@@ -0,0 +1,265 @@
+# Copyright 2020 The StackStorm Authors
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module containing cross process invalidation of the process wide RBAC caches.
+
+Each time RBAC definitions are changed (roles, permission grants, role assignments, group to role
+mappings), a compact change event is published on the "st2.rbac" message bus exchange. Event
+contains names of the affected users and roles (or "all" flag) and nothing else.
+
+Processes which use process wide cache (st2api, st2stream, st2auth) subscribe to the exchange and
+drop cached permission snapshots and decisions only for the affected users. Users affected by a
+role change are the ones which have the role assigned in the database or which have the role in
+the cached permissions snapshot.
+
+Publishing and subscribing is disabled by default and can be enabled using the
+"rbac.change_events_enabled" config option.
+"""
+
+from __future__ import absolute_import
+
+import uuid
+import threading
+import contextlib
+
+from kombu import Exchange
+from kombu import Queue
+from kombu.mixins import ConsumerMixin
+from oslo_config import cfg
+
+from st2common import log as logging
+from st2common.persistence.rbac import UserRoleAssignment
+from st2common.transport import publishers
+from st2common.transport import utils as transport_utils
+from st2common.util import concurrency
+
+from st2rbac_backend import cache
+from st2rbac_backend import config as rbac_config  # noqa: F401 pylint: disable=unused-import
+
+__all__ = [
+    "RBAC_CHANGE_XCHG",
+    "RBACChangePublisher",
+    "RBACChangeWatcher",
+    "notify_change",
+    "batched_changes",
+    "handle_change_event",
+    "start_watcher",
+]
+
+LOG = logging.getLogger(__name__)
+
+RBAC_CHANGE_XCHG = Exchange("st2.rbac", type="topic")
+RBAC_CHANGE_ROUTING_KEY = "change"
+
+# Unique identifier of this process, used to skip events which have been published by this process
+# (those have already been applied locally)
+ORIGIN = uuid.uuid4().hex
+
+_LOCAL = threading.local()
+
+_PUBLISHER = None
+_WATCHER = None
+_WATCHER_LOCK = threading.Lock()
+
+
+class RBACChangePublisher(object):
+    """
+    Publisher for RBAC change events.
+    """
+
+    def __init__(self):
+        self._publisher = publishers.PoolPublisher()
+        self._exchange_declared = False
+
+    def publish_change(self, users=None, roles=None, all_users=False):
+        """
+        :param users: Names of the affected users.
+        :type users: ``list`` of ``str``
+
+        :param roles: Names of the affected roles.
+        :type roles: ``list`` of ``str``
+
+        :param all_users: True if the change affects all the users.
+        :type all_users: ``bool``
+        """
+        payload = {
+            "origin": ORIGIN,
+            "users": sorted(users or []),
+            "roles": sorted(roles or []),
+            "all": all_users,
+        }
+
+        if not self._exchange_declared:
+            self._declare_exchange()
+
+        self._publisher.publish(payload, RBAC_CHANGE_XCHG, RBAC_CHANGE_ROUTING_KEY)
+
+    def _declare_exchange(self):
+        # Note: Exchange is not part of the exchanges which are registered by StackStorm services
+        # on start up so we need to declare it ourselves
+        with transport_utils.get_connection() as connection:
+            RBAC_CHANGE_XCHG(connection.default_channel).declare()
+
+        self._exchange_declared = True
+
+
+class RBACChangeWatcher(ConsumerMixin):
+    """
+    Consumer which listens for RBAC change events and invalidates affected process wide cache
+    entries.
+    """
+
+    def __init__(self):
+        self.connection = None
+        self._queue = Queue(
+            "st2.rbac.change.%s" % (ORIGIN),
+            RBAC_CHANGE_XCHG,
+            routing_key="#",
+            auto_delete=True,
+            exclusive=True,
+        )
+        self._thread = None
+
+    def get_consumers(self, Consumer, channel):
+        return [Consumer(queues=[self._queue], accept=["pickle"], callbacks=[self.process_task])]
+
+    def process_task(self, body, message):
+        try:
+            handle_change_event(payload=body)
+        except Exception:
+            LOG.exception("Failed to process RBAC change event: %s" % (body))
+        finally:
+            message.ack()
+
+    def start(self):
+        self.connection = transport_utils.get_connection()
+        self._thread = concurrency.spawn(self.run)
+
+    def stop(self):
+        self.should_stop = True
+
+        if self._thread:
+            concurrency.kill(self._thread)
+            self._thread = None
+
+        if self.connection:
+            self.connection.release()
+            self.connection = None
+
+
+def notify_change(users=None, roles=None, all_users=False):
+    """
+    Notify this and all the other processes that RBAC definitions for the provided users and / or
+    roles have changed.
+
+    Locally cached entries are invalidated right away. If a batch is active (see batched_changes),
+    event is published when the batch ends, otherwise it's published right away.
+    """
+    cache.bump_generation()
+
+    if not cfg.CONF.rbac.change_events_enabled:
+        return
+
+    batch = getattr(_LOCAL, "batch", None)
+
+    if batch is not None:
+        batch["users"].update(users or [])
+        batch["roles"].update(roles or [])
+        batch["all"] = batch["all"] or all_users
+        return
+
+    _publish_change(users=users, roles=roles, all_users=all_users)
+
+
+@contextlib.contextmanager
+def batched_changes():
+    """
+    Context manager which collects all the changes which are made inside it and publishes a single
+    change event on exit. Batches are re-entrant.
+    """
+    if getattr(_LOCAL, "batch", None) is not None:
+        yield _LOCAL.batch
+        return
+
+    batch = {"users": set([]), "roles": set([]), "all": False}
+    _LOCAL.batch = batch
+
+    try:
+        yield batch
+    finally:
+        _LOCAL.batch = None
+
+        if batch["users"] or batch["roles"] or batch["all"]:
+            _publish_change(users=batch["users"], roles=batch["roles"], all_users=batch["all"])
+
+
+def handle_change_event(payload):
+    """
+    Invalidate process wide cache entries for the users which are affected by the provided change
+    event.
+
+    :return: Names of the users cache entries have been dropped for or None if all the entries have
+             been dropped.
+    :rtype: ``set``
+    """
+    if payload.get("origin", None) == ORIGIN:
+        # Already applied locally
+        return set([])
+
+    if payload.get("all", False):
+        cache.bump_generation()
+        return None
+
+    usernames = set(payload.get("users", []))
+    role_names = payload.get("roles", [])
+
+    if role_names:
+        usernames.update(UserRoleAssignment.query(role__in=role_names).distinct("user"))
+
+    cache.invalidate_users(usernames=usernames, role_names=role_names)
+
+    LOG.debug("Invalidated RBAC cache entries for users: %s" % (", ".join(sorted(usernames))))
+    return usernames
+
+
+def start_watcher():
+    """
+    Start RBAC change events watcher for this process (if it hasn't been started yet).
+
+    :rtype: :class:`RBACChangeWatcher`
+    """
+    global _WATCHER
+
+    with _WATCHER_LOCK:
+        if _WATCHER is None:
+            _WATCHER = RBACChangeWatcher()
+            _WATCHER.start()
+
+    return _WATCHER
+
+
+def _publish_change(users=None, roles=None, all_users=False):
+    global _PUBLISHER
+
+    if _PUBLISHER is None:
+        _PUBLISHER = RBACChangePublisher()
+
+    # Note: Failing to publish an event shouldn't fail the RBAC change itself. Cached entries in
+    # other processes still expire after "rbac.cache_ttl" seconds.
+    try:
+        _PUBLISHER.publish_change(users=users, roles=roles, all_users=all_users)
+    except Exception:
+        LOG.exception("Failed to publish RBAC change event")
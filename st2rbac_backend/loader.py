@@ -21,8 +21,12 @@ from __future__ import absolute_import
 
 import os
 import glob
+import json
 import functools
+import itertools
+from concurrent.futures import ProcessPoolExecutor
 
+import yaml
 from oslo_config import cfg
 
 from st2common import log as logging
@@ -32,10 +36,32 @@ from st2common.models.api.rbac import UserRoleAssignmentFileFormatAPI
 from st2common.models.api.rbac import AuthGroupToRoleMapAssignmentFileFormatAPI
 from st2common.util.misc import compare_path_file_name
 
+from st2rbac_backend import bundle
+from st2rbac_backend import config as rbac_config  # noqa: F401 pylint: disable=unused-import
+from st2rbac_backend import timings
+from st2rbac_backend.loader_cache import DefinitionsParseCache
+
+try:
+    from yaml import CSafeLoader as YamlSafeLoader
+except ImportError:
+    from yaml import SafeLoader as YamlSafeLoader
+
 LOG = logging.getLogger(__name__)
 
 __all__ = ["RBACDefinitionsLoader"]
 
+# Meta loader instance used by the worker processes (see _load_file)
+_WORKER_META_LOADER = None
+
+# Maps name of the method which loads a single definition file to the (section of the load()
+# result, name of the attribute which identifies the definition) tuple
+_DEFINITION_FILE_KINDS = {
+    "load_role_definition_from_file": ("roles", "name"),
+    "load_user_role_assignments_from_file": ("role_assignments", "username"),
+    "load_user_role_assignments_from_bulk_file": ("role_assignments", "username"),
+    "load_group_to_role_map_assignment_from_file": ("group_to_role_maps", "group"),
+}
+
 
 class RBACDefinitionsLoader(object):
     """
@@ -43,12 +69,38 @@ class RBACDefinitionsLoader(object):
     disk.
     """
 
-    def __init__(self):
+    def __init__(self, parallel=None, cache_path=None, use_cache=False):
+        """
+        :param parallel: Number of worker processes to parse and validate definition files in.
+                         Defaults to the "rbac.definitions_load_workers" config option.
+        :type parallel: ``int``
+
+        :param cache_path: Path to the parsed definitions cache file. Defaults to the
+                           "rbac.definitions_cache_path" config option.
+        :type cache_path: ``str``
+
+        :param use_cache: True to cache parsed definitions in memory when no cache file is
+                          configured (used when the same loader instance loads definitions
+                          multiple times).
+        :type use_cache: ``bool``
+        """
         base_path = cfg.CONF.system.base_path
 
+        if parallel is None:
+            parallel = cfg.CONF.rbac.definitions_load_workers
+
+        self._parallel = parallel
+
+        cache_path = cache_path or cfg.CONF.rbac.definitions_cache_path
+        if cache_path or use_cache:
+            self._cache = DefinitionsParseCache(path=cache_path)
+        else:
+            self._cache = None
+
         self._rbac_definitions_path = os.path.join(base_path, "rbac/")
         self._role_definitions_path = os.path.join(self._rbac_definitions_path, "roles/")
         self._role_assignments_path = os.path.join(self._rbac_definitions_path, "assignments/")
+        self._bulk_role_assignments_path = os.path.join(self._role_assignments_path, "bulk/")
         self._role_maps_path = os.path.join(self._rbac_definitions_path, "mappings/")
         self._meta_loader = MetaLoader()
 
@@ -64,6 +116,89 @@ class RBACDefinitionsLoader(object):
 
         return result
 
+    def load_definition_files(self, file_paths):
+        """
+        Load and validate the provided definition files.
+
+        Unlike load(), this method doesn't check for duplicate definitions and doesn't skip
+        disabled ones so it can be used to only load the files which have changed since the
+        previous load. Files which are not RBAC definition files (based on the directory they live
+        in and their extension) and files which don't exist (anymore) are ignored.
+
+        :param file_paths: Paths to the files to load.
+        :type file_paths: ``list`` of ``str``
+
+        :return: Dict which maps file path to a list of (section, name, definition) tuples where
+                 section is one of the keys returned by load().
+        :rtype: ``dict``
+        """
+        file_paths_by_load_func_name = {}
+
+        for file_path in file_paths:
+            load_func_name = self._get_load_func_name(file_path=file_path)
+
+            if load_func_name is None:
+                LOG.debug('Ignoring "%s" which is not an RBAC definition file' % (file_path))
+                continue
+
+            if not os.path.isfile(file_path):
+                LOG.debug('Ignoring "%s" which has been removed' % (file_path))
+                continue
+
+            file_paths_by_load_func_name.setdefault(load_func_name, []).append(file_path)
+
+        result = {}
+        for load_func_name, kind_file_paths in file_paths_by_load_func_name.items():
+            section, name_attr = _DEFINITION_FILE_KINDS[load_func_name]
+
+            if load_func_name == "load_user_role_assignments_from_bulk_file":
+                apis_list = [
+                    list(self.load_user_role_assignments_from_bulk_file(file_path=file_path))
+                    for file_path in kind_file_paths
+                ]
+            else:
+                # Note: Only the provided files are loaded so cache entries for the other files
+                # are left untouched
+                apis_list = [
+                    [api]
+                    for api in self._load_files(
+                        load_func_name=load_func_name, file_paths=kind_file_paths, prune=False
+                    )
+                ]
+
+            for file_path, apis in zip(kind_file_paths, apis_list):
+                result[file_path] = [(section, getattr(api, name_attr), api) for api in apis]
+
+        return result
+
+    def get_definition_file_paths(self):
+        """
+        Retrieve a list of paths for all the definition files.
+
+        :rtype: ``list``
+        """
+        with timings.phase("discovery"):
+            file_paths = []
+            file_paths.extend(self._get_role_definitions_file_paths())
+            file_paths.extend(self._get_role_assiginments_file_paths())
+            file_paths.extend(self._get_bulk_role_assignments_file_paths())
+            file_paths.extend(self._get_group_to_role_maps_file_paths())
+
+        return file_paths
+
+    def load_from_bundle(self, bundle_path):
+        """
+        Load all the definitions from a bundle file created using "st2-apply-rbac-definitions
+        --compile" instead of from the definition files on disk.
+
+        :return: Dict with the same keys as returned by load().
+        :rtype: ``dict``
+        """
+        LOG.info('Loading RBAC definitions from bundle "%s"' % (bundle_path))
+
+        with timings.phase("bundle read"):
+            return bundle.read_bundle(path=bundle_path)
+
     def load_role_definitions(self):
         """
         Load all the role definitions.
@@ -71,12 +206,15 @@ class RBACDefinitionsLoader(object):
         :rtype: ``dict``
         """
         LOG.info('Loading role definitions from "%s"' % (self._role_definitions_path))
-        file_paths = self._get_role_definitions_file_paths()
+        with timings.phase("discovery"):
+            file_paths = self._get_role_definitions_file_paths()
+
+        role_definition_apis = self._load_files(
+            load_func_name="load_role_definition_from_file", file_paths=file_paths
+        )
 
         result = {}
-        for file_path in file_paths:
-            LOG.debug("Loading role definition from: %s" % (file_path))
-            role_definition_api = self.load_role_definition_from_file(file_path=file_path)
+        for role_definition_api in role_definition_apis:
             role_name = role_definition_api.name
             enabled = getattr(role_definition_api, "enabled", True)
 
@@ -95,15 +233,30 @@ class RBACDefinitionsLoader(object):
         """
         Load all the user role assignments.
 
+        Assignments are loaded from per-user files and from bulk assignment files in the "bulk/"
+        sub-directory (see load_user_role_assignments_from_bulk_file).
+
         :rtype: ``dict``
         """
         LOG.info('Loading user role assignments from "%s"' % (self._role_assignments_path))
-        file_paths = self._get_role_assiginments_file_paths()
+        with timings.phase("discovery"):
+            file_paths = self._get_role_assiginments_file_paths()
+
+        role_assignment_apis = self._load_files(
+            load_func_name="load_user_role_assignments_from_file", file_paths=file_paths
+        )
+
+        with timings.phase("discovery"):
+            bulk_file_paths = self._get_bulk_role_assignments_file_paths()
+        bulk_role_assignment_apis = itertools.chain.from_iterable(
+            self.load_user_role_assignments_from_bulk_file(file_path=file_path)
+            for file_path in bulk_file_paths
+        )
+
+        role_assignment_apis = itertools.chain(role_assignment_apis, bulk_role_assignment_apis)
 
         result = {}
-        for file_path in file_paths:
-            LOG.debug("Loading user role assignments from: %s" % (file_path))
-            role_assignment_api = self.load_user_role_assignments_from_file(file_path=file_path)
+        for role_assignment_api in role_assignment_apis:
             username = role_assignment_api.username  # pylint: disable=no-member
             enabled = getattr(role_assignment_api, "enabled", True)
 
@@ -125,16 +278,25 @@ class RBACDefinitionsLoader(object):
         :rtype: ``dict``
         """
         LOG.info('Loading group to role map definitions from "%s"' % (self._role_maps_path))
-        file_paths = self._get_group_to_role_maps_file_paths()
+        with timings.phase("discovery"):
+            file_paths = self._get_group_to_role_maps_file_paths()
 
-        result = {}
-        for file_path in file_paths:
-            LOG.debug("Loading group to role mapping from: %s" % (file_path))
-            group_to_role_map_api = self.load_group_to_role_map_assignment_from_file(
-                file_path=file_path
-            )
+        group_to_role_map_apis = self._load_files(
+            load_func_name="load_group_to_role_map_assignment_from_file", file_paths=file_paths
+        )
 
+        result = {}
+        for group_to_role_map_api in group_to_role_map_apis:
             group_name = group_to_role_map_api.group  # pylint: disable=no-member
+
+            if group_name in result:
+                msg = 'Duplicate definition file found for group "%s" ("%s" and "%s")' % (
+                    group_name,
+                    result[group_name].file_path,
+                    group_to_role_map_api.file_path,
+                )
+                raise ValueError(msg)
+
             result[group_name] = group_to_role_map_api
 
         return result
@@ -149,16 +311,7 @@ class RBACDefinitionsLoader(object):
         :return: Role definition.
         :rtype: :class:`RoleDefinitionFileFormatAPI`
         """
-        content = self._meta_loader.load(file_path)
-
-        if not content:
-            msg = 'Role definition file "%s" is empty and invalid' % file_path
-            raise ValueError(msg)
-
-        role_definition_api = RoleDefinitionFileFormatAPI(**content)
-        role_definition_api = role_definition_api.validate()
-
-        return role_definition_api
+        return _load_role_definition_from_file(meta_loader=self._meta_loader, file_path=file_path)
 
     def load_user_role_assignments_from_file(self, file_path):
         """
@@ -170,30 +323,176 @@ class RBACDefinitionsLoader(object):
         :return: User role assignments.
         :rtype: :class:`UserRoleAssignmentFileFormatAPI`
         """
-        content = self._meta_loader.load(file_path)
+        return _load_user_role_assignments_from_file(
+            meta_loader=self._meta_loader, file_path=file_path
+        )
 
-        if not content:
-            msg = 'Role assignment file "%s" is empty and invalid' % file_path
-            raise ValueError(msg)
+    def load_user_role_assignments_from_bulk_file(self, file_path):
+        """
+        Load user role assignments from a bulk assignments file.
 
-        user_role_assignment_api = UserRoleAssignmentFileFormatAPI(**content)
-        user_role_assignment_api.file_path = file_path[file_path.rfind("assignments/") :]
-        user_role_assignment_api = user_role_assignment_api.validate()
+        Bulk file is either a multi-document YAML file (*.yaml) or a JSON Lines file (*.jsonl)
+        where each document / line contains assignments for a single user. Records are parsed
+        and validated one at a time so memory usage doesn't depend on the file size.
+
+        Source of each record is "<file path>#<username>".
+
+        :param file_path: Path to the bulk assignments file.
+        :type file_path: ``str``
+
+        :return: Generator which yields user role assignments.
+        :rtype: ``iterable`` of :class:`UserRoleAssignmentFileFormatAPI`
+        """
+        LOG.debug("Loading bulk user role assignments from: %s" % (file_path))
+        relative_file_path = file_path[file_path.rfind("assignments/") :]
+
+        with open(file_path, "r") as fp:
+            records = timings.timed_iter(
+                "parse", _iter_bulk_file_records(file_path=file_path, fp=fp)
+            )
+
+            for index, content in enumerate(records):
+                if not content:
+                    msg = 'Record %s in role assignment file "%s" is empty and invalid' % (
+                        index + 1,
+                        file_path,
+                    )
+                    raise ValueError(msg)
+
+                user_role_assignment_api = UserRoleAssignmentFileFormatAPI(**content)
+                user_role_assignment_api.file_path = "%s#%s" % (
+                    relative_file_path,
+                    content.get("username", ""),
+                )
+                with timings.phase("validation"):
+                    user_role_assignment_api = user_role_assignment_api.validate()
 
-        return user_role_assignment_api
+                yield user_role_assignment_api
 
     def load_group_to_role_map_assignment_from_file(self, file_path):
-        content = self._meta_loader.load(file_path)
+        return _load_group_to_role_map_assignment_from_file(
+            meta_loader=self._meta_loader, file_path=file_path
+        )
 
-        if not content:
-            msg = 'Group to role map assignment file "%s" is empty and invalid' % (file_path)
-            raise ValueError(msg)
+    def _load_files(self, load_func_name, file_paths, prune=True):
+        """
+        Load and validate the provided files using the provided load method.
 
-        group_to_role_map_api = AuthGroupToRoleMapAssignmentFileFormatAPI(**content)
-        group_to_role_map_api.file_path = file_path[file_path.rfind("mappings/") :]
-        group_to_role_map_api = group_to_role_map_api.validate()
+        If cache is enabled, only files which have changed since they have been cached are parsed.
 
-        return group_to_role_map_api
+        :param prune: True to drop cache entries for the files which are not provided (used when
+                      all the files of this kind are provided).
+        :type prune: ``bool``
+
+        :rtype: ``iterable``
+        """
+        if not self._cache:
+            for result in self._parse_files(load_func_name=load_func_name, file_paths=file_paths):
+                yield result
+
+            return
+
+        results = {}
+        changed_file_paths = []
+        for file_path in file_paths:
+            result = self._cache.get(kind=load_func_name, file_path=file_path)
+
+            if result is None:
+                changed_file_paths.append(file_path)
+            else:
+                results[file_path] = result
+
+        LOG.debug(
+            "Using %s cached RBAC definitions, parsing %s changed files"
+            % (len(results), len(changed_file_paths))
+        )
+
+        file_infos = [self._cache.get_file_info(file_path) for file_path in changed_file_paths]
+        parsed_results = self._parse_files(
+            load_func_name=load_func_name, file_paths=changed_file_paths
+        )
+
+        for file_path, file_info, result in zip(changed_file_paths, file_infos, parsed_results):
+            self._cache.set(
+                kind=load_func_name, file_path=file_path, value=result, file_info=file_info
+            )
+            results[file_path] = result
+
+        if prune:
+            self._cache.prune(kind=load_func_name, file_paths=file_paths)
+
+        self._cache.save()
+
+        for file_path in file_paths:
+            yield results[file_path]
+
+    def _parse_files(self, load_func_name, file_paths):
+        """
+        Parse and validate the provided files using the provided load method.
+
+        If more than one worker process is configured, files are parsed and validated in a process
+        pool. Results are always returned in the same order as the file paths so the callers see
+        the same result (and the same duplicate detection errors) as with serial loading.
+
+        :param load_func_name: Name of the method which loads a single file.
+        :type load_func_name: ``str``
+
+        :param file_paths: Paths to the files to load.
+        :type file_paths: ``list`` of ``str``
+
+        :rtype: ``iterable``
+        """
+        if self._parallel <= 1 or len(file_paths) <= 1:
+            load_func = getattr(self, load_func_name)
+
+            for file_path in file_paths:
+                LOG.debug("Loading RBAC definition from: %s" % (file_path))
+                yield load_func(file_path=file_path)
+
+            return
+
+        workers = min(self._parallel, len(file_paths))
+        chunk_size = max(1, len(file_paths) // (workers * 4))
+
+        LOG.debug("Loading %s RBAC definition files using %s workers" % (len(file_paths), workers))
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                _load_file, [load_func_name] * len(file_paths), file_paths, chunksize=chunk_size
+            )
+
+            # Note: Files are parsed and validated by the workers so only the total time spent
+            # waiting for the results is recorded
+            for result in timings.timed_iter("parse and validation (workers)", results):
+                yield result
+
+    def _get_load_func_name(self, file_path):
+        """
+        Return name of the method which loads the provided definition file or None if the file is
+        not a definition file.
+
+        :rtype: ``str``
+        """
+        directory = os.path.normpath(os.path.dirname(file_path))
+        extension = os.path.splitext(file_path)[1]
+
+        if directory == os.path.normpath(self._bulk_role_assignments_path):
+            if extension in [".yaml", ".jsonl"]:
+                return "load_user_role_assignments_from_bulk_file"
+
+            return None
+
+        if extension != ".yaml":
+            return None
+
+        if directory == os.path.normpath(self._role_definitions_path):
+            return "load_role_definition_from_file"
+        elif directory == os.path.normpath(self._role_assignments_path):
+            return "load_user_role_assignments_from_file"
+        elif directory == os.path.normpath(self._role_maps_path):
+            return "load_group_to_role_map_assignment_from_file"
+
+        return None
 
     def _get_role_definitions_file_paths(self):
         """
@@ -221,6 +520,19 @@ class RBACDefinitionsLoader(object):
         file_paths = sorted(file_paths, key=functools.cmp_to_key(compare_path_file_name))
         return file_paths
 
+    def _get_bulk_role_assignments_file_paths(self):
+        """
+        Retrieve a list of paths for all the bulk user role assignment files.
+
+        :rtype: ``list``
+        """
+        file_paths = []
+        for extension in ["*.yaml", "*.jsonl"]:
+            file_paths.extend(glob.glob(self._bulk_role_assignments_path + extension))
+
+        file_paths = sorted(file_paths, key=functools.cmp_to_key(compare_path_file_name))
+        return file_paths
+
     def _get_group_to_role_maps_file_paths(self):
         """
         Retrieve a list of path for remote group to local role mapping assignment files.
@@ -231,3 +543,86 @@ class RBACDefinitionsLoader(object):
         file_paths = glob.glob(glob_str)
         file_paths = sorted(file_paths, key=functools.cmp_to_key(compare_path_file_name))
         return file_paths
+
+
+def _iter_bulk_file_records(file_path, fp):
+    """
+    Return generator which yields records from the provided bulk file object.
+    """
+    if file_path.endswith(".jsonl"):
+        return (json.loads(line) for line in fp if line.strip())
+
+    return yaml.load_all(fp, Loader=YamlSafeLoader)
+
+
+def _load_role_definition_from_file(meta_loader, file_path):
+    with timings.phase("parse"):
+        content = meta_loader.load(file_path)
+
+    if not content:
+        msg = 'Role definition file "%s" is empty and invalid' % file_path
+        raise ValueError(msg)
+
+    role_definition_api = RoleDefinitionFileFormatAPI(**content)
+    with timings.phase("validation"):
+        role_definition_api = role_definition_api.validate()
+
+    return role_definition_api
+
+
+def _load_user_role_assignments_from_file(meta_loader, file_path):
+    with timings.phase("parse"):
+        content = meta_loader.load(file_path)
+
+    if not content:
+        msg = 'Role assignment file "%s" is empty and invalid' % file_path
+        raise ValueError(msg)
+
+    user_role_assignment_api = UserRoleAssignmentFileFormatAPI(**content)
+    user_role_assignment_api.file_path = file_path[file_path.rfind("assignments/") :]
+    with timings.phase("validation"):
+        user_role_assignment_api = user_role_assignment_api.validate()
+
+    return user_role_assignment_api
+
+
+def _load_group_to_role_map_assignment_from_file(meta_loader, file_path):
+    with timings.phase("parse"):
+        content = meta_loader.load(file_path)
+
+    if not content:
+        msg = 'Group to role map assignment file "%s" is empty and invalid' % (file_path)
+        raise ValueError(msg)
+
+    group_to_role_map_api = AuthGroupToRoleMapAssignmentFileFormatAPI(**content)
+    group_to_role_map_api.file_path = file_path[file_path.rfind("mappings/") :]
+    with timings.phase("validation"):
+        group_to_role_map_api = group_to_role_map_api.validate()
+
+    return group_to_role_map_api
+
+
+# Maps name of the RBACDefinitionsLoader method which loads a single file to the module level
+# function which is used by the worker processes
+_LOAD_FILE_FUNCS = {
+    "load_role_definition_from_file": _load_role_definition_from_file,
+    "load_user_role_assignments_from_file": _load_user_role_assignments_from_file,
+    "load_group_to_role_map_assignment_from_file": _load_group_to_role_map_assignment_from_file,
+}
+
+
+def _load_file(load_func_name, file_path):
+    """
+    Load a single definition file inside a worker process.
+
+    Note: Worker only uses module level functions and all the input is passed in explicitly (no
+    loader instance, config or cache is used) so it works the same way regardless if the worker
+    processes are forked or spawned.
+    """
+    global _WORKER_META_LOADER
+
+    if _WORKER_META_LOADER is None:
+        _WORKER_META_LOADER = MetaLoader()
+
+    load_func = _LOAD_FILE_FUNCS[load_func_name]
+    return load_func(meta_loader=_WORKER_META_LOADER, file_path=file_path)
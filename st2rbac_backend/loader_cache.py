@@ -0,0 +1,256 @@
+# Copyright 2020 The StackStorm Authors
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module containing on-disk cache of parsed RBAC definition files.
+
+Each entry is keyed on the file path and stores file size, modification time and sha256 digest of
+the file content together with the attributes of the parsed and validated file format API object.
+Entry is used if size and modification time haven't changed. If they have, the content digest is
+compared so touched but otherwise unchanged files don't need to be parsed again.
+
+Cache is stored as a single JSON file which is written atomically (written to a temporary file
+and renamed). Cached objects are not validated again when they are read so the cache file is
+ignored if it's not owned by the user which runs the script or if it's writable by other users.
+If no path is provided, cache is only kept in memory (used by the watch mode).
+"""
+
+from __future__ import absolute_import
+
+import os
+import json
+import stat
+import hashlib
+import tempfile
+
+from st2common import log as logging
+from st2common.models.api.rbac import RoleDefinitionFileFormatAPI
+from st2common.models.api.rbac import UserRoleAssignmentFileFormatAPI
+from st2common.models.api.rbac import AuthGroupToRoleMapAssignmentFileFormatAPI
+
+__all__ = ["DefinitionsParseCache"]
+
+LOG = logging.getLogger(__name__)
+
+# Needs to be bumped each time format of the cache file or of the cached objects changes
+CACHE_VERSION = 2
+
+# Maps name of the API class to the class. Only objects of those classes can be cached.
+API_CLASSES = dict(
+    [
+        (api_cls.__name__, api_cls)
+        for api_cls in [
+            RoleDefinitionFileFormatAPI,
+            UserRoleAssignmentFileFormatAPI,
+            AuthGroupToRoleMapAssignmentFileFormatAPI,
+        ]
+    ]
+)
+
+
+class DefinitionsParseCache(object):
+    """
+    On-disk cache of parsed RBAC definition files.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Path to the cache file or None to only keep the cache in memory.
+        :type path: ``str``
+        """
+        self.path = path
+
+        # Maps kind to a dictionary which maps file path to the cache entry
+        self._entries = None
+        self._dirty = False
+
+    def get(self, kind, file_path):
+        """
+        Return cached object for the provided file or None if the file has changed since it has
+        been cached.
+
+        :param kind: Type of the definition (e.g. name of the method which loads the file).
+        :type kind: ``str``
+
+        :param file_path: Path to the definition file.
+        :type file_path: ``str``
+        """
+        entries = self._get_entries().get(kind, {})
+        entry = entries.get(file_path, None)
+
+        if not entry:
+            return None
+
+        file_stat = os.stat(file_path)
+        if entry["size"] == file_stat.st_size and entry["mtime"] == file_stat.st_mtime:
+            return _entry_to_api(entry)
+
+        if entry["sha256"] != _get_file_digest(file_path):
+            return None
+
+        # File has been touched, but content is the same
+        entry["size"] = file_stat.st_size
+        entry["mtime"] = file_stat.st_mtime
+        self._dirty = True
+
+        return _entry_to_api(entry)
+
+    def set(self, kind, file_path, value, file_info):
+        """
+        Store parsed object for the provided file.
+
+        :param value: Parsed and validated API object.
+        :type value: :class:`BaseAPI`
+
+        :param file_info: Information about the file before it has been parsed (see
+                          get_file_info). It's retrieved before parsing so a file which changes
+                          while it's being parsed is parsed again on next run.
+        :type file_info: ``dict``
+        """
+        api_cls_name = value.__class__.__name__
+
+        if API_CLASSES.get(api_cls_name, None) is not value.__class__:
+            raise ValueError('Objects of type "%s" can\'t be cached' % (api_cls_name))
+
+        entry = dict(file_info)
+        entry["type"] = api_cls_name
+        entry["value"] = dict(vars(value))
+
+        self._get_entries().setdefault(kind, {})[file_path] = entry
+        self._dirty = True
+
+    def get_file_info(self, file_path):
+        """
+        Return size, modification time and content digest of the provided file.
+
+        :rtype: ``dict``
+        """
+        file_stat = os.stat(file_path)
+
+        return {
+            "size": file_stat.st_size,
+            "mtime": file_stat.st_mtime,
+            "sha256": _get_file_digest(file_path),
+        }
+
+    def prune(self, kind, file_paths):
+        """
+        Remove entries of the provided type for files which are not in the provided list anymore.
+        """
+        file_paths = set(file_paths)
+        entries = self._get_entries().get(kind, {})
+
+        for file_path in list(entries.keys()):
+            if file_path not in file_paths:
+                del entries[file_path]
+                self._dirty = True
+
+    def save(self):
+        """
+        Atomically write the cache to disk (if it has changed).
+
+        Failing to write the cache is not fatal, cache will simply be re-populated on next run.
+        """
+        if not self._dirty or not self.path:
+            return
+
+        data = {"version": CACHE_VERSION, "entries": self._entries}
+        directory = os.path.dirname(os.path.abspath(self.path))
+
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+
+            # Note: mkstemp creates the file which is only readable and writable by the owner
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".rbac-cache-")
+
+            try:
+                with os.fdopen(fd, "w") as fp:
+                    json.dump(data, fp)
+
+                os.rename(temp_path, self.path)
+            except Exception:
+                os.unlink(temp_path)
+                raise
+        except Exception as e:
+            LOG.warning('Failed to write RBAC definitions cache "%s": %s' % (self.path, str(e)))
+            return
+
+        self._dirty = False
+
+    def _get_entries(self):
+        if self._entries is None:
+            self._entries = self._read()
+
+        return self._entries
+
+    def _read(self):
+        if not self.path or not os.path.isfile(self.path):
+            return {}
+
+        try:
+            with open(self.path, "r") as fp:
+                # Note: Permissions are checked on the opened file so the file can't be replaced
+                # in the mean time
+                file_stat = os.fstat(fp.fileno())
+
+                if file_stat.st_uid != os.getuid():
+                    LOG.warning(
+                        'Ignoring RBAC definitions cache "%s" which is not owned by the current '
+                        "user" % (self.path)
+                    )
+                    return {}
+
+                if file_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+                    LOG.warning(
+                        'Ignoring RBAC definitions cache "%s" which is writable by other users'
+                        % (self.path)
+                    )
+                    return {}
+
+                data = json.load(fp)
+        except Exception as e:
+            LOG.warning('Failed to read RBAC definitions cache "%s": %s' % (self.path, str(e)))
+            return {}
+
+        if not isinstance(data, dict) or data.get("version", None) != CACHE_VERSION:
+            LOG.debug('Ignoring RBAC definitions cache "%s" with a different version' % (self.path))
+            return {}
+
+        return data["entries"]
+
+
+def _entry_to_api(entry):
+    """
+    Re-create API object from the cache entry.
+
+    Note: Object has already been validated before it has been cached so it's not validated again.
+    """
+    api_cls = API_CLASSES.get(entry.get("type", None), None)
+
+    if not api_cls:
+        return None
+
+    return api_cls(**entry["value"])
+
+
+def _get_file_digest(file_path):
+    sha256 = hashlib.sha256()
+
+    with open(file_path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(65536), b""):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
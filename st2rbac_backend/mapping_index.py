@@ -0,0 +1,206 @@
+# Copyright 2020 The StackStorm Authors
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module containing in-process index of group to role mappings.
+
+The mapping table is small and only changes when RBAC definitions are synchronized so instead of
+querying it on each login, remote group sync looks up mappings in an in-process index which maps
+group name to the mappings for that group.
+
+The index is reloaded when any of the following changes:
+
+1. The persisted version of group to role mappings (it's incremented by all the RBACService
+   methods which write mappings, in any process) or the active generation of RBAC definitions
+   (it's flipped by the definitions syncer). Both values are retrieved using a single query (see
+   generation.get_active_versions).
+2. The number of mappings or the highest mapping id in the collection. This catches mappings which
+   are created or deleted by code which writes to the collection directly and bypasses
+   RBACService.
+3. The index is older than "rbac.group_to_role_map_index_max_age" seconds. This bounds for how
+   long mappings which are updated in place by such code are served from a stale index.
+"""
+
+from __future__ import absolute_import
+
+import threading
+import time
+from collections import namedtuple
+
+from oslo_config import cfg
+
+from st2common.models.db.rbac import GroupToRoleMappingDB
+from st2common.persistence.rbac import GroupToRoleMapping
+
+from st2rbac_backend import config as rbac_config  # noqa: F401 pylint: disable=unused-import
+from st2rbac_backend import generation
+
+__all__ = [
+    "GroupToRoleMapEntry",
+    "GroupToRoleMapIndex",
+    "get_group_to_role_map_index",
+    "invalidate",
+]
+
+GroupToRoleMapEntry = namedtuple(
+    "GroupToRoleMapEntry", ["group", "roles", "enabled", "source", "description"]
+)
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+
+class GroupToRoleMapIndex(object):
+    """
+    Index which maps (optionally normalized) group name to the group to role mappings.
+    """
+
+    def __init__(self, mapping_dbs, case_insensitive=False, key=None, built_at=None):
+        """
+        :param mapping_dbs: Group to role mappings to index.
+        :type mapping_dbs: ``list`` of :class:`GroupToRoleMappingDB`
+
+        :param case_insensitive: True to match group names case-insensitively.
+        :type case_insensitive: ``bool``
+
+        :param key: Key which identifies the version of the mappings this index has been built
+                    from.
+
+        :param built_at: Timestamp when the mappings this index has been built from have been
+                         retrieved.
+        :type built_at: ``float``
+        """
+        self.case_insensitive = case_insensitive
+        self.key = key
+        self.built_at = built_at
+
+        # Maps normalized group name to a list of (position, entry) tuples. Position is used to
+        # return entries in the same order as they are stored in the database.
+        self._index = {}
+
+        for position, mapping_db in enumerate(mapping_dbs):
+            entry = GroupToRoleMapEntry(
+                group=mapping_db.group,
+                roles=list(mapping_db.roles),
+                enabled=mapping_db.enabled,
+                source=mapping_db.source,
+                description=mapping_db.description,
+            )
+            group = self._normalize(mapping_db.group)
+            self._index.setdefault(group, []).append((position, entry))
+
+    def get_mappings(self, groups):
+        """
+        Return mappings for the provided groups.
+
+        :param groups: Names of the groups.
+        :type groups: ``list`` of ``str``
+
+        :rtype: ``list`` of :class:`GroupToRoleMapEntry`
+        """
+        result = []
+
+        for group in set([self._normalize(group) for group in groups]):
+            result.extend(self._index.get(group, []))
+
+        return [entry for _, entry in sorted(result, key=lambda item: item[0])]
+
+    def _normalize(self, group):
+        if self.case_insensitive:
+            return group.lower()
+
+        return group
+
+    def __len__(self):
+        return len(self._index)
+
+
+def get_group_to_role_map_index(active_versions=None, timer=time.time):
+    """
+    Return group to role mappings index, reloading it first if mappings have changed.
+
+    :param active_versions: Already retrieved active versions. If not provided, they are retrieved
+                            from the database.
+    :type active_versions: :class:`generation.ActiveVersions`
+
+    :rtype: :class:`GroupToRoleMapIndex`
+    """
+    global _INDEX
+
+    if active_versions is None:
+        active_versions = generation.get_active_versions()
+
+    case_insensitive = cfg.CONF.rbac.group_to_role_map_case_insensitive
+    key = (
+        active_versions.generation,
+        active_versions.group_to_role_maps_version,
+        _get_collection_stamp(),
+        case_insensitive,
+    )
+    now = timer()
+
+    index = _INDEX
+    if index is not None and _is_index_valid(index=index, key=key, now=now):
+        return index
+
+    with _INDEX_LOCK:
+        if _INDEX is None or not _is_index_valid(index=_INDEX, key=key, now=now):
+            _INDEX = GroupToRoleMapIndex(
+                mapping_dbs=GroupToRoleMapping.get_all(),
+                case_insensitive=case_insensitive,
+                key=key,
+                built_at=now,
+            )
+
+        return _INDEX
+
+
+def _is_index_valid(index, key, now):
+    if index.key != key:
+        return False
+
+    return now - index.built_at < cfg.CONF.rbac.group_to_role_map_index_max_age
+
+
+def _get_collection_stamp():
+    """
+    Return (number of mappings, highest mapping id) tuple for the mappings collection.
+
+    Both values are retrieved using a single aggregation. Ids are ObjectIds which increase
+    monotonically so any insert or delete changes the stamp.
+
+    :rtype: ``tuple``
+    """
+    pipeline = [{"$group": {"_id": None, "count": {"$sum": 1}, "max_id": {"$max": "$_id"}}}]
+    result = list(GroupToRoleMappingDB._get_collection().aggregate(pipeline))
+
+    if not result:
+        return (0, None)
+
+    return (result[0]["count"], result[0]["max_id"])
+
+
+def invalidate():
+    """
+    Drop the index so it's reloaded on next use.
+
+    Note: Mapping writes don't need to call this since they increment the persisted mappings
+    version or change the mappings collection stamp. This is only needed when the database is
+    replaced underneath (e.g. in tests).
+    """
+    global _INDEX
+
+    with _INDEX_LOCK:
+        _INDEX = None
@@ -0,0 +1,64 @@
+# Copyright 2020 The StackStorm Authors
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module containing database models which are specific to the RBAC backend.
+"""
+
+from __future__ import absolute_import
+
+import mongoengine as me
+
+from st2common.fields import ComplexDateTimeField
+from st2common.models.db import stormbase
+from st2common.util import date as date_utils
+
+__all__ = ["RBACGenerationDB", "UserRemoteGroupsFingerprintDB"]
+
+
+class RBACGenerationDB(stormbase.StormFoundationDB):
+    """
+    Pointer to the active generation of RBAC definitions.
+
+    Attribute:
+        name: Name of the pointer (there is only a single "active" pointer).
+        generation: Active generation. Incremented each time a new set of RBAC definitions is
+                    activated.
+        group_to_role_maps_version: Version of group to role mappings. Incremented each time
+                                    mappings are written to the database.
+        updated_at: Date when the pointer has been last updated.
+    """
+
+    name = me.StringField(required=True, unique=True)
+    generation = me.IntField(required=True, default=0)
+    group_to_role_maps_version = me.IntField(required=True, default=0)
+    updated_at = ComplexDateTimeField(default=date_utils.get_datetime_utc_now)
+
+
+class UserRemoteGroupsFingerprintDB(stormbase.StormFoundationDB):
+    """
+    Fingerprint of the remote groups and group to role mappings which were used when remote role
+    assignments for a particular user were last synchronized.
+
+    Attribute:
+        user: Name of the user.
+        fingerprint: Fingerprint (hash) of the user groups, matching group to role mappings and
+                     active generation of RBAC definitions.
+        updated_at: Date when the fingerprint has been last updated.
+    """
+
+    user = me.StringField(required=True, unique=True)
+    fingerprint = me.StringField(required=True)
+    updated_at = ComplexDateTimeField(default=date_utils.get_datetime_utc_now)
@@ -0,0 +1,296 @@
+# Copyright 2020 The StackStorm Authors
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module containing request scoped memoization of user permission snapshots and permission
+decisions.
+
+A scope is entered using the "request_scope" context manager (or the "request_scoped" decorator).
+While the scope is active, user permission snapshots and permission check decisions are cached and
+re-used for the lifetime of the scope. Scopes are re-entrant - entering a scope while another one
+is already active re-uses the outer one.
+
+The API enters a scope once per request by wrapping its WSGI application with
+"RequestScopeMiddleware" so all the permission checks performed while handling a request share
+the same memoized values. Outside of a scope, each check is evaluated on its own.
+
+The scope is stored in a thread local. StackStorm services monkey patch the standard library with
+eventlet so each green thread gets its own scope.
+"""
+
+from __future__ import absolute_import
+
+import functools
+import threading
+import contextlib
+
+from st2rbac_backend import cache
+from st2rbac_backend.service import RBACService as rbac_service
+
+__all__ = [
+    "RequestScope",
+    "RequestScopeMiddleware",
+    "request_scope",
+    "request_scoped",
+    "get_current_request_scope",
+    "get_permissions_snapshot_for_user",
+    "get_reusable_permissions_snapshot_for_user",
+    "get_decision_cache_key",
+    "get_memoized_decision",
+    "set_memoized_decision",
+]
+
+_LOCAL = threading.local()
+
+
+class RequestScope(object):
+    """
+    Container for the values which are memoized for the lifetime of a single scope.
+    """
+
+    __slots__ = ["permissions_snapshots", "decisions", "generation"]
+
+    def __init__(self):
+        # Maps username to the compiled UserPermissionsSnapshot
+        self.permissions_snapshots = {}
+
+        # Maps decision cache key (see get_decision_cache_key) to the permission check result
+        self.decisions = {}
+
+        # RBAC generation memoized values belong to
+        self.generation = cache.get_generation()
+
+    def get_permissions_snapshot(self, username):
+        """
+        :return: Memoized permissions snapshot or None if there is no snapshot for this user.
+        :rtype: :class:`UserPermissionsSnapshot`
+        """
+        self._check_generation()
+        return self.permissions_snapshots.get(username, None)
+
+    def set_permissions_snapshot(self, username, permissions_snapshot):
+        self.permissions_snapshots[username] = permissions_snapshot
+
+    def get_decision(self, key):
+        """
+        :return: Memoized decision or None if there is no memoized decision for the provided key.
+        :rtype: ``bool`` or ``None``
+        """
+        self._check_generation()
+        return self.decisions.get(key, None)
+
+    def set_decision(self, key, value):
+        self.decisions[key] = value
+
+    def _check_generation(self):
+        # RBAC definitions have been changed as part of this request, drop memoized values
+        generation = cache.get_generation()
+
+        if generation != self.generation:
+            self.permissions_snapshots = {}
+            self.decisions = {}
+            self.generation = generation
+
+
+class RequestScopeMiddleware(object):
+    """
+    WSGI middleware which runs each request inside a request scope.
+
+    The scope only covers the call to the wrapped application (which is where the API performs
+    permission checks) and not the iteration over the returned response body. This way streaming
+    responses don't keep memoized values around for the lifetime of the connection.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        with request_scope():
+            return self.app(environ, start_response)
+
+
+@contextlib.contextmanager
+def request_scope():
+    """
+    Context manager which enters a new request scope (or re-uses the currently active one).
+
+    :rtype: :class:`RequestScope`
+    """
+    scope = get_current_request_scope()
+
+    if scope is not None:
+        yield scope
+        return
+
+    scope = RequestScope()
+    _LOCAL.scope = scope
+
+    try:
+        yield scope
+    finally:
+        _LOCAL.scope = None
+
+
+def request_scoped(func):
+    """
+    Decorator which runs the decorated function inside a request scope.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with request_scope():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def get_current_request_scope():
+    """
+    Return currently active request scope or None if no scope is active.
+
+    :rtype: :class:`RequestScope`
+    """
+    return getattr(_LOCAL, "scope", None)
+
+
+def get_permissions_snapshot_for_user(user_db):
+    """
+    Retrieve compiled permissions snapshot for the provided user, re-using the one which has
+    already been compiled as part of the currently active request scope (if any) or the one from
+    the process wide cache (if enabled).
+
+    :rtype: :class:`UserPermissionsSnapshot`
+    """
+    scope = get_current_request_scope()
+
+    if scope is None:
+        return _get_permissions_snapshot_for_user(user_db=user_db)
+
+    permissions_snapshot = scope.get_permissions_snapshot(user_db.name)
+
+    if permissions_snapshot is None:
+        permissions_snapshot = _get_permissions_snapshot_for_user(user_db=user_db)
+        scope.set_permissions_snapshot(user_db.name, permissions_snapshot)
+
+    return permissions_snapshot
+
+
+def get_reusable_permissions_snapshot_for_user(user_db):
+    """
+    Retrieve compiled permissions snapshot for the provided user if it can be re-used (a request
+    scope is active or process wide cache is enabled), otherwise return None.
+
+    :rtype: :class:`UserPermissionsSnapshot` or ``None``
+    """
+    if get_current_request_scope() is None and cache.get_permissions_snapshots_cache() is None:
+        return None
+
+    return get_permissions_snapshot_for_user(user_db=user_db)
+
+
+def get_decision_cache_key(user_db, permission_type, resource_db=None):
+    """
+    Return cache key for a permission decision or None if the decision can't be cached.
+
+    Key is a (user, permission type, resource uid, parent pack uid) tuple. Decisions on resources
+    which don't have a uid (or their uid is not known yet because the resource hasn't been
+    persisted) are not cached.
+
+    :rtype: ``tuple`` or ``None``
+    """
+    if resource_db is None:
+        return (user_db.name, permission_type, None, None)
+
+    get_uid = getattr(resource_db, "get_uid", None)
+    resource_uid = get_uid() if get_uid else None
+
+    # Note: Resources which use id as part of the uid and haven't been persisted yet end up with
+    # "None" uid component
+    if not resource_uid or resource_uid.endswith(":None"):
+        return None
+
+    get_pack_uid = getattr(resource_db, "get_pack_uid", None)
+    pack_uid = get_pack_uid() if get_pack_uid else None
+
+    return (user_db.name, permission_type, resource_uid, pack_uid)
+
+
+def get_memoized_decision(key):
+    """
+    Return memoized permission decision from the currently active request scope or from the
+    process wide decisions cache (if enabled).
+
+    :param key: Decision cache key (see get_decision_cache_key).
+    :type key: ``tuple``
+
+    :return: Memoized decision or None if there is no memoized decision for the provided key.
+    :rtype: ``bool`` or ``None``
+    """
+    if key is None:
+        return None
+
+    scope = get_current_request_scope()
+
+    if scope is not None:
+        result = scope.get_decision(key)
+
+        if result is not None:
+            return result
+
+    decisions_cache = cache.get_decisions_cache()
+
+    if decisions_cache is not None:
+        result = decisions_cache.get(key)
+
+        if result is not None and scope is not None:
+            scope.set_decision(key, result)
+
+        return result
+
+    return None
+
+
+def set_memoized_decision(key, value):
+    """
+    Memoize permission decision in the currently active request scope and in the process wide
+    decisions cache (if enabled). Both, allow and deny decisions are memoized.
+    """
+    if key is None:
+        return
+
+    scope = get_current_request_scope()
+
+    if scope is not None:
+        scope.set_decision(key, value)
+
+    decisions_cache = cache.get_decisions_cache()
+
+    if decisions_cache is not None:
+        decisions_cache.set(key, value)
+
+
+def _get_permissions_snapshot_for_user(user_db):
+    permissions_snapshots_cache = cache.get_permissions_snapshots_cache()
+
+    if permissions_snapshots_cache is None:
+        return rbac_service.get_permissions_snapshot_for_user(user_db=user_db)
+
+    permissions_snapshot = permissions_snapshots_cache.get(user_db.name)
+
+    if permissions_snapshot is None:
+        permissions_snapshot = rbac_service.get_permissions_snapshot_for_user(user_db=user_db)
+        permissions_snapshots_cache.set(user_db.name, permissions_snapshot)
+
+    return permissions_snapshot
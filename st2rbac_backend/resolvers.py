@@ -22,14 +22,20 @@ from __future__ import absolute_import
 import sys
 import logging as stdlib_logging
 
+import six
+
+from mongoengine.queryset.visitor import Q
+
 from st2common import log as logging
 from st2common.models.db.pack import PackDB
+from st2common.models.db.stormbase import UIDFieldMixin
 from st2common.models.db.webhook import WebhookDB
 from st2common.models.system.common import ResourceReference
 from st2common.constants.keyvalue import FULL_SYSTEM_SCOPE, FULL_USER_SCOPE
 from st2common.constants.triggers import WEBHOOK_TRIGGER_TYPE
 from st2common.persistence.execution import ActionExecution
 from st2common.rbac.backends.base import BaseRBACPermissionResolver
+from st2rbac_backend import request_scope
 from st2rbac_backend.service import RBACService as rbac_service
 from st2common.rbac.types import PermissionType
 from st2common.rbac.types import ResourceType
@@ -53,6 +59,8 @@ __all__ = [
     "TriggerPermissionsResolver",
     "StreamPermissionsResolver",
     "InquiryPermissionsResolver",
+    "RESOLVER_CLASSES",
+    "register_resolver",
     "get_resolver_for_resource_type",
     "get_resolver_for_permission_type",
 ]
@@ -89,6 +97,51 @@ class PermissionsResolver(BaseRBACPermissionResolver):
         Method for checking user permissions on an existing resource (e.g. get one, edit, delete
         operations).
         """
+        return self._user_has_resource_db_permission(
+            user_db=user_db, resource_db=resource_db, permission_type=permission_type
+        )
+
+    def filter_resource_dbs(self, user_db, resource_dbs, permission_type):
+        """
+        Method for filtering a list of existing resources (e.g. a single page of results of a list
+        endpoint) down to the ones user has the specified permission on.
+
+        All the resources are evaluated against a single user permissions snapshot which means the
+        number of database queries doesn't depend on the number of provided resources.
+
+        :param resource_dbs: Resources to filter.
+        :type resource_dbs: ``list``
+
+        :return: Resources user has the specified permission on (order is preserved).
+        :rtype: ``list``
+        """
+        permissions_snapshot = self._get_permissions_snapshot(user_db=user_db)
+
+        result = []
+        for resource_db in resource_dbs:
+            has_permission = self._user_has_resource_db_permission(
+                user_db=user_db,
+                resource_db=resource_db,
+                permission_type=permission_type,
+                permissions_snapshot=permissions_snapshot,
+            )
+
+            if has_permission:
+                result.append(resource_db)
+
+        return result
+
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
+        """
+        Resolver specific implementation of user_has_resource_db_permission.
+
+        :param permissions_snapshot: Already compiled permissions snapshot for this user (if any).
+        :type permissions_snapshot: :class:`UserPermissionsSnapshot`
+
+        :rtype: ``bool``
+        """
         raise NotImplementedError()
 
     def _user_has_list_permission(self, user_db, permission_type):
@@ -99,21 +152,29 @@ class PermissionsResolver(BaseRBACPermissionResolver):
         assert PermissionType.get_permission_name(permission_type) == "list"
         return self._user_has_global_permission(user_db=user_db, permission_type=permission_type)
 
-    def _user_has_global_permission(self, user_db, permission_type):
+    def _user_has_global_permission(self, user_db, permission_type, permissions_snapshot=None):
         """
         Custom method for checking if user has a particular global permission which doesn't apply
         to a specific resource but it's system-wide aka global permission.
         """
-        log_context = {
-            "user_db": user_db,
-            "permission_type": permission_type,
-            "resolver": self.__class__.__name__,
-        }
+        log_context = None
+        if LOG.isEnabledFor(stdlib_logging.DEBUG):
+            log_context = {
+                "user_db": user_db,
+                "permission_type": permission_type,
+                "resolver": self.__class__.__name__,
+            }
+
         self._log("Checking user permissions", extra=log_context)
 
         # First check the system role permissions
+        if permissions_snapshot is None:
+            permissions_snapshot = self._get_reusable_permissions_snapshot(user_db=user_db)
+
         has_system_role_permission = self._user_has_system_role_permission(
-            user_db=user_db, permission_type=permission_type
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
         if has_system_role_permission:
@@ -124,26 +185,36 @@ class PermissionsResolver(BaseRBACPermissionResolver):
         permission_types = [permission_type]
 
         # Check direct grants
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
-            user_db=user_db, permission_types=permission_types
+        has_permission_grant = self._user_has_permission_grant(
+            user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
+            permission_types=permission_types,
         )
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a direct grant", extra=log_context)
             return True
 
         self._log("No matching grants found", extra=log_context)
         return False
 
-    def _user_has_system_role_permission(self, user_db, permission_type):
+    def _user_has_system_role_permission(self, user_db, permission_type, permissions_snapshot=None):
         """
         Check the user system roles and return True if user has the required permission.
 
+        :param permissions_snapshot: Already compiled permissions snapshot for this user (if any).
+                                     If not provided, user roles are retrieved from the database.
+        :type permissions_snapshot: :class:`UserPermissionsSnapshot`
+
         :rtype: ``bool``
         """
         permission_name = PermissionType.get_permission_name(permission_type)
 
-        user_role_dbs = rbac_service.get_roles_for_user(user_db=user_db)
-        user_role_names = [role_db.name for role_db in user_role_dbs]
+        if permissions_snapshot is not None:
+            user_role_names = permissions_snapshot.role_names
+        else:
+            user_role_names = [
+                role_db.name for role_db in rbac_service.get_roles_for_user(user_db=user_db)
+            ]
 
         if SystemRole.SYSTEM_ADMIN in user_role_names:
             # System admin has all the permissions
@@ -157,6 +228,60 @@ class PermissionsResolver(BaseRBACPermissionResolver):
 
         return False
 
+    def _user_has_permission_grant(
+        self,
+        user_db,
+        permissions_snapshot=None,
+        resource_uid=None,
+        resource_types=None,
+        permission_types=None,
+    ):
+        """
+        Return True if the user has at least one permission grant matching the provided filters.
+
+        If an already compiled permissions snapshot is provided, the lookup is served from memory,
+        otherwise an existence-only database query which stops at the first match is used.
+
+        :rtype: ``bool``
+        """
+        if permissions_snapshot is not None:
+            return permissions_snapshot.has_permission_grant(
+                resource_uid=resource_uid,
+                resource_types=resource_types,
+                permission_types=permission_types,
+            )
+
+        return rbac_service.user_has_any_permission_grant(
+            user_db=user_db,
+            resource_uid=resource_uid,
+            resource_types=resource_types,
+            permission_types=permission_types,
+        )
+
+    def _get_permissions_snapshot(self, user_db):
+        """
+        Retrieve compiled roles and permission grants snapshot for the provided user.
+
+        All the role and grant lookups performed as part of a single permission check are served
+        from this snapshot instead of hitting the database each time. If a request scope is
+        active, the snapshot is shared by all the permission checks performed in that scope.
+
+        :rtype: :class:`UserPermissionsSnapshot`
+        """
+        return request_scope.get_permissions_snapshot_for_user(user_db=user_db)
+
+    def _get_reusable_permissions_snapshot(self, user_db):
+        """
+        Retrieve compiled permissions snapshot for the provided user if it can be re-used by other
+        permission checks (a request scope is active or process wide cache is enabled).
+
+        Otherwise None is returned and a single permission check uses existence-only database
+        queries instead of compiling all the user roles and grants just to discard them afterwards.
+
+        :rtype: :class:`UserPermissionsSnapshot` or ``None``
+        """
+        return request_scope.get_reusable_permissions_snapshot_for_user(user_db=user_db)
+
     def _matches_permission_grant(
         self, resource_db, permission_grant, permission_type, all_permission_type
     ):
@@ -185,7 +310,15 @@ class PermissionsResolver(BaseRBACPermissionResolver):
     def _log(self, message, extra, level=stdlib_logging.DEBUG, **kwargs):
         """
         Custom logger method which prefix message with the class and caller method name.
+
+        Note: This method is called on the hot path of every permission check so it returns
+        immediately (before inspecting the caller frame and formatting the message) if the logger
+        is not enabled for the provided level. Callers should also only build the "extra" log
+        context when DEBUG level is enabled.
         """
+        if not LOG.isEnabledFor(level):
+            return
+
         class_name = self.__class__.__name__
         method_name = sys._getframe().f_back.f_code.co_name
         message_prefix = "%s.%s: " % (class_name, method_name)
@@ -205,21 +338,31 @@ class ContentPackResourcePermissionsResolver(PermissionsResolver):
     # A list of resource-specific permission types which grant / imply "view" permission type
     view_grant_permission_types = []
 
-    def _user_has_resource_permission(self, user_db, pack_uid, resource_uid, permission_type):
-        log_context = {
-            "user_db": user_db,
-            "pack_uid": pack_uid,
-            "resource_uid": resource_uid,
-            "resource_type": self.resource_type,
-            "permission_type": permission_type,
-            "resolver": self.__class__.__name__,
-        }
+    def _user_has_resource_permission(
+        self, user_db, pack_uid, resource_uid, permission_type, permissions_snapshot=None
+    ):
+        log_context = None
+        if LOG.isEnabledFor(stdlib_logging.DEBUG):
+            log_context = {
+                "user_db": user_db,
+                "pack_uid": pack_uid,
+                "resource_uid": resource_uid,
+                "resource_type": self.resource_type,
+                "permission_type": permission_type,
+                "resolver": self.__class__.__name__,
+            }
+
         self._log("Checking user resource permissions", extra=log_context)
 
         # First check the system role permissions
         self._log("Checking grants via system role permissions", extra=log_context)
+        if permissions_snapshot is None:
+            permissions_snapshot = self._get_reusable_permissions_snapshot(user_db=user_db)
+
         has_system_role_permission = self._user_has_system_role_permission(
-            user_db=user_db, permission_type=permission_type
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
         if has_system_role_permission:
@@ -227,52 +370,95 @@ class ContentPackResourcePermissionsResolver(PermissionsResolver):
             return True
 
         # Check custom roles
-        view_permission_type = PermissionType.get_permission_type(
-            resource_type=self.resource_type, permission_name="view"
-        )
-        all_permission_type = PermissionType.get_permission_type(
-            resource_type=self.resource_type, permission_name="all"
-        )
-
-        if permission_type == view_permission_type:
-            # Note: Some permissions such as "create", "modify", "delete" and "execute" also
-            # grant / imply "view" permission
-            permission_types = self.view_grant_permission_types[:] + [permission_type]
-        elif permission_type not in all_permission_type:
-            permission_types = [all_permission_type, permission_type]
-        else:
-            permission_types = [permission_type]
+        permission_types = self._get_grant_permission_types(permission_type=permission_type)
 
         # Check direct grants on the specified resource
         self._log("Checking direct grants on the specified resource", extra=log_context)
         resource_types = [self.resource_type]
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
+        has_permission_grant = self._user_has_permission_grant(
             user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
             resource_uid=resource_uid,
             resource_types=resource_types,
             permission_types=permission_types,
         )
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a direct grant on the action", extra=log_context)
             return True
 
         # Check grants on the parent pack
         self._log("Checking grants on the parent resource", extra=log_context)
         resource_types = [ResourceType.PACK]
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
+        has_permission_grant = self._user_has_permission_grant(
             user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
             resource_uid=pack_uid,
             resource_types=resource_types,
             permission_types=permission_types,
         )
 
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a grant on the action parent pack", extra=log_context)
             return True
 
         self._log("No matching grants found", extra=log_context)
         return False
 
+    def get_query_filter_for_user(self, user_db, permission_type):
+        """
+        Compile user pack-level and resource-level grants into a query filter which only matches
+        resources of this type user has the specified permission on.
+
+        This allows list operations to push permission filtering down to the database instead of
+        retrieving all the resources and filtering them afterwards.
+
+        :return: Query filter. Empty filter if user has access to all the resources.
+        :rtype: :class:`mongoengine.queryset.visitor.Q`
+        """
+        permissions_snapshot = self._get_permissions_snapshot(user_db=user_db)
+        has_system_role_permission = self._user_has_system_role_permission(
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
+        )
+
+        if has_system_role_permission:
+            return Q()
+
+        permission_types = self._get_grant_permission_types(permission_type=permission_type)
+        return _get_query_filter_for_permission_grants(
+            permissions_snapshot=permissions_snapshot,
+            resource_type=self.resource_type,
+            permission_types=permission_types,
+            pack_field="pack",
+            uid_field="uid",
+        )
+
+    def _get_grant_permission_types(self, permission_type):
+        """
+        Return a list of permission types which grant / imply the provided permission type on a
+        resource of this type.
+
+        :rtype: ``list`` of ``str``
+        """
+        view_permission_type = PermissionType.get_permission_type(
+            resource_type=self.resource_type, permission_name="view"
+        )
+        all_permission_type = PermissionType.get_permission_type(
+            resource_type=self.resource_type, permission_name="all"
+        )
+
+        if permission_type == view_permission_type:
+            # Note: Some permissions such as "create", "modify", "delete" and "execute" also
+            # grant / imply "view" permission
+            permission_types = self.view_grant_permission_types[:] + [permission_type]
+        elif permission_type not in all_permission_type:
+            permission_types = [all_permission_type, permission_type]
+        else:
+            permission_types = [permission_type]
+
+        return permission_types
+
 
 class RunnerPermissionsResolver(PermissionsResolver):
     """
@@ -285,18 +471,28 @@ class RunnerPermissionsResolver(PermissionsResolver):
         assert permission_type in [PermissionType.RUNNER_LIST]
         return self._user_has_list_permission(user_db=user_db, permission_type=permission_type)
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
-        log_context = {
-            "user_db": user_db,
-            "resource_db": resource_db,
-            "permission_type": permission_type,
-            "resolver": self.__class__.__name__,
-        }
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
+        log_context = None
+        if LOG.isEnabledFor(stdlib_logging.DEBUG):
+            log_context = {
+                "user_db": user_db,
+                "resource_db": resource_db,
+                "permission_type": permission_type,
+                "resolver": self.__class__.__name__,
+            }
+
         self._log("Checking user resource permissions", extra=log_context)
 
         # First check the system role permissions
+        if permissions_snapshot is None:
+            permissions_snapshot = self._get_reusable_permissions_snapshot(user_db=user_db)
+
         has_system_role_permission = self._user_has_system_role_permission(
-            user_db=user_db, permission_type=permission_type
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
         if has_system_role_permission:
@@ -307,14 +503,15 @@ class RunnerPermissionsResolver(PermissionsResolver):
         resource_uid = resource_db.get_uid()
         resource_types = [ResourceType.RUNNER]
         permission_types = [permission_type]
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
+        has_permission_grant = self._user_has_permission_grant(
             user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
             resource_uid=resource_uid,
             resource_types=resource_types,
             permission_types=permission_types,
         )
 
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a direct grant on the runner type", extra=log_context)
             return True
 
@@ -339,18 +536,28 @@ class PackPermissionsResolver(PermissionsResolver):
                 user_db=user_db, permission_type=permission_type
             )
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
-        log_context = {
-            "user_db": user_db,
-            "resource_db": resource_db,
-            "permission_type": permission_type,
-            "resolver": self.__class__.__name__,
-        }
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
+        log_context = None
+        if LOG.isEnabledFor(stdlib_logging.DEBUG):
+            log_context = {
+                "user_db": user_db,
+                "resource_db": resource_db,
+                "permission_type": permission_type,
+                "resolver": self.__class__.__name__,
+            }
+
         self._log("Checking user resource permissions", extra=log_context)
 
         # First check the system role permissions
+        if permissions_snapshot is None:
+            permissions_snapshot = self._get_reusable_permissions_snapshot(user_db=user_db)
+
         has_system_role_permission = self._user_has_system_role_permission(
-            user_db=user_db, permission_type=permission_type
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
         if has_system_role_permission:
@@ -361,14 +568,15 @@ class PackPermissionsResolver(PermissionsResolver):
         resource_uid = resource_db.get_uid()
         resource_types = [ResourceType.PACK]
         permission_types = [permission_type]
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
+        has_permission_grant = self._user_has_permission_grant(
             user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
             resource_uid=resource_uid,
             resource_types=resource_types,
             permission_types=permission_types,
         )
 
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a direct grant on the pack", extra=log_context)
             return True
 
@@ -388,7 +596,9 @@ class SensorPermissionsResolver(ContentPackResourcePermissionsResolver):
         assert permission_type in [PermissionType.SENSOR_LIST]
         return self._user_has_list_permission(user_db=user_db, permission_type=permission_type)
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
         sensor_uid = resource_db.get_uid()
         pack_uid = resource_db.get_pack_uid()
         return self._user_has_resource_permission(
@@ -396,6 +606,7 @@ class SensorPermissionsResolver(ContentPackResourcePermissionsResolver):
             pack_uid=pack_uid,
             resource_uid=sensor_uid,
             permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
 
@@ -429,7 +640,9 @@ class ActionPermissionsResolver(ContentPackResourcePermissionsResolver):
             permission_type=permission_type,
         )
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
         action_uid = resource_db.get_uid()
         pack_uid = resource_db.get_pack_uid()
         return self._user_has_resource_permission(
@@ -437,6 +650,7 @@ class ActionPermissionsResolver(ContentPackResourcePermissionsResolver):
             pack_uid=pack_uid,
             resource_uid=action_uid,
             permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
 
@@ -484,7 +698,9 @@ class ActionAliasPermissionsResolver(ContentPackResourcePermissionsResolver):
             permission_type=permission_type,
         )
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
         action_alias_uid = resource_db.get_uid()
         pack_uid = resource_db.get_pack_uid()
         return self._user_has_resource_permission(
@@ -492,6 +708,7 @@ class ActionAliasPermissionsResolver(ContentPackResourcePermissionsResolver):
             pack_uid=pack_uid,
             resource_uid=action_alias_uid,
             permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
 
@@ -520,7 +737,13 @@ class RulePermissionsResolver(ContentPackResourcePermissionsResolver):
         :param trigger: "trigger" attribute of the RuleAPI object.
         :type trigger: ``dict``
         """
-        log_context = {"user_db": user_db, "trigger": trigger, "resolver": self.__class__.__name__}
+        log_context = None
+        if LOG.isEnabledFor(stdlib_logging.DEBUG):
+            log_context = {
+                "user_db": user_db,
+                "trigger": trigger,
+                "resolver": self.__class__.__name__,
+            }
 
         trigger_type = trigger["type"]
         trigger_parameters = trigger.get("parameters", {})
@@ -568,7 +791,9 @@ class RulePermissionsResolver(ContentPackResourcePermissionsResolver):
             permission_type=permission_type,
         )
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
         rule_uid = resource_db.get_uid()
         pack_uid = resource_db.get_pack_uid()
         return self._user_has_resource_permission(
@@ -576,6 +801,7 @@ class RulePermissionsResolver(ContentPackResourcePermissionsResolver):
             pack_uid=pack_uid,
             resource_uid=rule_uid,
             permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
 
@@ -591,18 +817,28 @@ class RuleEnforcementPermissionsResolver(PermissionsResolver):
         permission_type = PermissionType.RULE_LIST
         return self._user_has_list_permission(user_db=user_db, permission_type=permission_type)
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
-        log_context = {
-            "user_db": user_db,
-            "resource_db": resource_db,
-            "permission_type": permission_type,
-            "resolver": self.__class__.__name__,
-        }
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
+        log_context = None
+        if LOG.isEnabledFor(stdlib_logging.DEBUG):
+            log_context = {
+                "user_db": user_db,
+                "resource_db": resource_db,
+                "permission_type": permission_type,
+                "resolver": self.__class__.__name__,
+            }
+
         self._log("Checking user resource permissions", extra=log_context)
 
         # First check the system role permissions
+        if permissions_snapshot is None:
+            permissions_snapshot = self._get_reusable_permissions_snapshot(user_db=user_db)
+
         has_system_role_permission = self._user_has_system_role_permission(
-            user_db=user_db, permission_type=permission_type
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
         if has_system_role_permission:
@@ -648,27 +884,29 @@ class RuleEnforcementPermissionsResolver(PermissionsResolver):
 
         # Check grants on the pack of the rule to which enforcement belongs to
         resource_types = [ResourceType.PACK]
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
+        has_permission_grant = self._user_has_permission_grant(
             user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
             resource_uid=rule_pack_uid,
             resource_types=resource_types,
             permission_types=permission_types,
         )
 
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a grant on the enforcement rule parent pack", extra=log_context)
             return True
 
         # Check grants on the rule the enforcement belongs to
         resource_types = [ResourceType.RULE]
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
+        has_permission_grant = self._user_has_permission_grant(
             user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
             resource_uid=rule_uid,
             resource_types=resource_types,
             permission_types=permission_types,
         )
 
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a grant on the enforcement's rule.", extra=log_context)
             return True
 
@@ -705,18 +943,28 @@ class KeyValuePermissionsResolver(PermissionsResolver):
         # By default, user has access to their own user scoped KVPs, thus user has list permission.
         return True
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
-        log_context = {
-            "user_db": user_db,
-            "resource_db": resource_db,
-            "permission_type": permission_type,
-            "resolver": self.__class__.__name__,
-        }
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
+        log_context = None
+        if LOG.isEnabledFor(stdlib_logging.DEBUG):
+            log_context = {
+                "user_db": user_db,
+                "resource_db": resource_db,
+                "permission_type": permission_type,
+                "resolver": self.__class__.__name__,
+            }
+
         self._log("Checking user resource permissions", extra=log_context)
 
         # First check the system role permissions
+        if permissions_snapshot is None:
+            permissions_snapshot = self._get_reusable_permissions_snapshot(user_db=user_db)
+
         has_system_role_permission = self._user_has_system_role_permission(
-            user_db=user_db, permission_type=permission_type
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
         if resource_db.scope == FULL_SYSTEM_SCOPE and has_system_role_permission:
@@ -772,14 +1020,15 @@ class KeyValuePermissionsResolver(PermissionsResolver):
         else:
             permission_types = [self.all_permission_type, permission_type]
 
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
+        has_permission_grant = self._user_has_permission_grant(
             user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
             resource_uid=resource_db.get_uid(),
             resource_types=[self.resource_type],
             permission_types=permission_types,
         )
 
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a direct grant on the key value pair", extra=log_context)
             return True
 
@@ -802,18 +1051,28 @@ class ExecutionPermissionsResolver(PermissionsResolver):
         ]
         return self._user_has_list_permission(user_db=user_db, permission_type=permission_type)
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
-        log_context = {
-            "user_db": user_db,
-            "resource_db": resource_db,
-            "permission_type": permission_type,
-            "resolver": self.__class__.__name__,
-        }
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
+        log_context = None
+        if LOG.isEnabledFor(stdlib_logging.DEBUG):
+            log_context = {
+                "user_db": user_db,
+                "resource_db": resource_db,
+                "permission_type": permission_type,
+                "resolver": self.__class__.__name__,
+            }
+
         self._log("Checking user resource permissions", extra=log_context)
 
         # First check the system role permissions
+        if permissions_snapshot is None:
+            permissions_snapshot = self._get_reusable_permissions_snapshot(user_db=user_db)
+
         has_system_role_permission = self._user_has_system_role_permission(
-            user_db=user_db, permission_type=permission_type
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
         if has_system_role_permission:
@@ -829,49 +1088,90 @@ class ExecutionPermissionsResolver(PermissionsResolver):
         action_uid = action["uid"]
         action_pack_uid = pack_db.get_uid()
 
-        # Note: "action_execute" also grants / implies "execution_re_run" and "execution_stop"
-        if permission_type == PermissionType.EXECUTION_VIEW:
-            action_permission_type = PermissionType.ACTION_VIEW
-        elif permission_type in [PermissionType.EXECUTION_RE_RUN, PermissionType.EXECUTION_STOP]:
-            action_permission_type = PermissionType.ACTION_EXECUTE
-        elif permission_type == PermissionType.EXECUTION_ALL:
-            action_permission_type = PermissionType.ACTION_ALL
-        elif permission_type == PermissionType.EXECUTION_VIEWS_FILTERS_LIST:
-            action_permission_type = PermissionType.EXECUTION_VIEWS_FILTERS_LIST
-        else:
-            raise ValueError("Invalid permission type: %s" % (permission_type))
+        action_permission_type = self._get_action_permission_type(permission_type=permission_type)
 
         # Check grants on the pack of the action to which execution belongs to
         resource_types = [ResourceType.PACK]
         permission_types = [PermissionType.ACTION_ALL, action_permission_type]
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
+        has_permission_grant = self._user_has_permission_grant(
             user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
             resource_uid=action_pack_uid,
             resource_types=resource_types,
             permission_types=permission_types,
         )
 
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a grant on the execution action parent pack", extra=log_context)
             return True
 
         # Check grants on the action the execution belongs to
         resource_types = [ResourceType.ACTION]
         permission_types = [PermissionType.ACTION_ALL, action_permission_type]
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
+        has_permission_grant = self._user_has_permission_grant(
             user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
             resource_uid=action_uid,
             resource_types=resource_types,
             permission_types=permission_types,
         )
 
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a grant on the execution action", extra=log_context)
             return True
 
         self._log("No matching grants found", extra=log_context)
         return False
 
+    def get_query_filter_for_user(self, user_db, permission_type):
+        """
+        Compile user grants on the action packs and actions into a query filter which only matches
+        executions user has the specified permission on.
+
+        :return: Query filter. Empty filter if user has access to all the executions.
+        :rtype: :class:`mongoengine.queryset.visitor.Q`
+        """
+        permissions_snapshot = self._get_permissions_snapshot(user_db=user_db)
+        has_system_role_permission = self._user_has_system_role_permission(
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
+        )
+
+        if has_system_role_permission:
+            return Q()
+
+        action_permission_type = self._get_action_permission_type(permission_type=permission_type)
+        permission_types = [PermissionType.ACTION_ALL, action_permission_type]
+        return _get_query_filter_for_permission_grants(
+            permissions_snapshot=permissions_snapshot,
+            resource_type=ResourceType.ACTION,
+            permission_types=permission_types,
+            pack_field="action__pack",
+            uid_field="action__uid",
+        )
+
+    def _get_action_permission_type(self, permission_type):
+        """
+        Return action permission type which grants / implies the provided execution permission
+        type.
+
+        :rtype: ``str``
+        """
+        # Note: "action_execute" also grants / implies "execution_re_run" and "execution_stop"
+        if permission_type == PermissionType.EXECUTION_VIEW:
+            action_permission_type = PermissionType.ACTION_VIEW
+        elif permission_type in [PermissionType.EXECUTION_RE_RUN, PermissionType.EXECUTION_STOP]:
+            action_permission_type = PermissionType.ACTION_EXECUTE
+        elif permission_type == PermissionType.EXECUTION_ALL:
+            action_permission_type = PermissionType.ACTION_ALL
+        elif permission_type == PermissionType.EXECUTION_VIEWS_FILTERS_LIST:
+            action_permission_type = PermissionType.EXECUTION_VIEWS_FILTERS_LIST
+        else:
+            raise ValueError("Invalid permission type: %s" % (permission_type))
+
+        return action_permission_type
+
 
 class WebhookPermissionsResolver(PermissionsResolver):
 
@@ -881,18 +1181,28 @@ class WebhookPermissionsResolver(PermissionsResolver):
         assert permission_type in [PermissionType.WEBHOOK_LIST]
         return self._user_has_list_permission(user_db=user_db, permission_type=permission_type)
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
-        log_context = {
-            "user_db": user_db,
-            "resource_db": resource_db,
-            "permission_type": permission_type,
-            "resolver": self.__class__.__name__,
-        }
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
+        log_context = None
+        if LOG.isEnabledFor(stdlib_logging.DEBUG):
+            log_context = {
+                "user_db": user_db,
+                "resource_db": resource_db,
+                "permission_type": permission_type,
+                "resolver": self.__class__.__name__,
+            }
+
         self._log("Checking user resource permissions", extra=log_context)
 
         # First check the system role permissions
+        if permissions_snapshot is None:
+            permissions_snapshot = self._get_reusable_permissions_snapshot(user_db=user_db)
+
         has_system_role_permission = self._user_has_system_role_permission(
-            user_db=user_db, permission_type=permission_type
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
         if has_system_role_permission:
@@ -905,14 +1215,15 @@ class WebhookPermissionsResolver(PermissionsResolver):
         # Check direct grants on the webhook
         resource_types = [ResourceType.WEBHOOK]
         permission_types = [PermissionType.WEBHOOK_ALL, permission_type]
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
+        has_permission_grant = self._user_has_permission_grant(
             user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
             resource_uid=webhook_uid,
             resource_types=resource_types,
             permission_types=permission_types,
         )
 
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a grant on the webhook", extra=log_context)
             return True
 
@@ -931,18 +1242,28 @@ class TimerPermissionsResolver(PermissionsResolver):
         assert permission_type in [PermissionType.TIMER_LIST]
         return self._user_has_list_permission(user_db=user_db, permission_type=permission_type)
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
-        log_context = {
-            "user_db": user_db,
-            "resource_db": resource_db,
-            "permission_type": permission_type,
-            "resolver": self.__class__.__name__,
-        }
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
+        log_context = None
+        if LOG.isEnabledFor(stdlib_logging.DEBUG):
+            log_context = {
+                "user_db": user_db,
+                "resource_db": resource_db,
+                "permission_type": permission_type,
+                "resolver": self.__class__.__name__,
+            }
+
         self._log("Checking user resource permissions", extra=log_context)
 
         # First check the system role permissions
+        if permissions_snapshot is None:
+            permissions_snapshot = self._get_reusable_permissions_snapshot(user_db=user_db)
+
         has_system_role_permission = self._user_has_system_role_permission(
-            user_db=user_db, permission_type=permission_type
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
         if has_system_role_permission:
@@ -955,14 +1276,15 @@ class TimerPermissionsResolver(PermissionsResolver):
         # Check direct grants on the webhook
         resource_types = [ResourceType.TIMER]
         permission_types = [PermissionType.TIMER_ALL, permission_type]
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
+        has_permission_grant = self._user_has_permission_grant(
             user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
             resource_uid=timer_uid,
             resource_types=resource_types,
             permission_types=permission_types,
         )
 
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a grant on the timer", extra=log_context)
             return True
 
@@ -985,18 +1307,28 @@ class ApiKeyPermissionResolver(PermissionsResolver):
         assert permission_type in [PermissionType.API_KEY_CREATE]
         return self._user_has_global_permission(user_db=user_db, permission_type=permission_type)
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
-        log_context = {
-            "user_db": user_db,
-            "resource_db": resource_db,
-            "permission_type": permission_type,
-            "resolver": self.__class__.__name__,
-        }
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
+        log_context = None
+        if LOG.isEnabledFor(stdlib_logging.DEBUG):
+            log_context = {
+                "user_db": user_db,
+                "resource_db": resource_db,
+                "permission_type": permission_type,
+                "resolver": self.__class__.__name__,
+            }
+
         self._log("Checking user resource permissions", extra=log_context)
 
         # First check the system role permissions
+        if permissions_snapshot is None:
+            permissions_snapshot = self._get_reusable_permissions_snapshot(user_db=user_db)
+
         has_system_role_permission = self._user_has_system_role_permission(
-            user_db=user_db, permission_type=permission_type
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
         if has_system_role_permission:
@@ -1009,14 +1341,15 @@ class ApiKeyPermissionResolver(PermissionsResolver):
         # Check direct grants on the webhook
         resource_types = [ResourceType.API_KEY]
         permission_types = [PermissionType.API_KEY_ALL, permission_type]
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
+        has_permission_grant = self._user_has_permission_grant(
             user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
             resource_uid=api_key_uid,
             resource_types=resource_types,
             permission_types=permission_types,
         )
 
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a grant on the api key", extra=log_context)
             return True
 
@@ -1035,18 +1368,28 @@ class TracePermissionsResolver(PermissionsResolver):
         assert permission_type in [PermissionType.TRACE_LIST]
         return self._user_has_list_permission(user_db=user_db, permission_type=permission_type)
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
-        log_context = {
-            "user_db": user_db,
-            "resource_db": resource_db,
-            "permission_type": permission_type,
-            "resolver": self.__class__.__name__,
-        }
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
+        log_context = None
+        if LOG.isEnabledFor(stdlib_logging.DEBUG):
+            log_context = {
+                "user_db": user_db,
+                "resource_db": resource_db,
+                "permission_type": permission_type,
+                "resolver": self.__class__.__name__,
+            }
+
         self._log("Checking user resource permissions", extra=log_context)
 
         # First check the system role permissions
+        if permissions_snapshot is None:
+            permissions_snapshot = self._get_reusable_permissions_snapshot(user_db=user_db)
+
         has_system_role_permission = self._user_has_system_role_permission(
-            user_db=user_db, permission_type=permission_type
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
         if has_system_role_permission:
@@ -1059,14 +1402,15 @@ class TracePermissionsResolver(PermissionsResolver):
         # Check direct grants on the webhook
         resource_types = [ResourceType.TRACE]
         permission_types = [PermissionType.TRACE_ALL, permission_type]
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
+        has_permission_grant = self._user_has_permission_grant(
             user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
             resource_uid=trace_uid,
             resource_types=resource_types,
             permission_types=permission_types,
         )
 
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a grant on the trace", extra=log_context)
             return True
 
@@ -1085,18 +1429,28 @@ class TriggerPermissionsResolver(PermissionsResolver):
         assert permission_type in [PermissionType.TRIGGER_LIST]
         return self._user_has_list_permission(user_db=user_db, permission_type=permission_type)
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
-        log_context = {
-            "user_db": user_db,
-            "resource_db": resource_db,
-            "permission_type": permission_type,
-            "resolver": self.__class__.__name__,
-        }
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
+        log_context = None
+        if LOG.isEnabledFor(stdlib_logging.DEBUG):
+            log_context = {
+                "user_db": user_db,
+                "resource_db": resource_db,
+                "permission_type": permission_type,
+                "resolver": self.__class__.__name__,
+            }
+
         self._log("Checking user resource permissions", extra=log_context)
 
         # First check the system role permissions
+        if permissions_snapshot is None:
+            permissions_snapshot = self._get_reusable_permissions_snapshot(user_db=user_db)
+
         has_system_role_permission = self._user_has_system_role_permission(
-            user_db=user_db, permission_type=permission_type
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
         if has_system_role_permission:
@@ -1109,14 +1463,15 @@ class TriggerPermissionsResolver(PermissionsResolver):
         # Check direct grants on the webhook
         resource_types = [ResourceType.TRIGGER]
         permission_types = [PermissionType.TRIGGER_ALL, permission_type]
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
+        has_permission_grant = self._user_has_permission_grant(
             user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
             resource_uid=timer_uid,
             resource_types=resource_types,
             permission_types=permission_types,
         )
 
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a grant on the timer", extra=log_context)
             return True
 
@@ -1135,18 +1490,28 @@ class PolicyTypePermissionsResolver(PermissionsResolver):
         assert permission_type in [PermissionType.POLICY_TYPE_LIST]
         return self._user_has_list_permission(user_db=user_db, permission_type=permission_type)
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
-        log_context = {
-            "user_db": user_db,
-            "resource_db": resource_db,
-            "permission_type": permission_type,
-            "resolver": self.__class__.__name__,
-        }
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
+        log_context = None
+        if LOG.isEnabledFor(stdlib_logging.DEBUG):
+            log_context = {
+                "user_db": user_db,
+                "resource_db": resource_db,
+                "permission_type": permission_type,
+                "resolver": self.__class__.__name__,
+            }
+
         self._log("Checking user resource permissions", extra=log_context)
 
         # First check the system role permissions
+        if permissions_snapshot is None:
+            permissions_snapshot = self._get_reusable_permissions_snapshot(user_db=user_db)
+
         has_system_role_permission = self._user_has_system_role_permission(
-            user_db=user_db, permission_type=permission_type
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
         if has_system_role_permission:
@@ -1159,14 +1524,15 @@ class PolicyTypePermissionsResolver(PermissionsResolver):
         # Check direct grants on the webhook
         resource_types = [ResourceType.POLICY_TYPE]
         permission_types = [PermissionType.POLICY_TYPE_ALL, permission_type]
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
+        has_permission_grant = self._user_has_permission_grant(
             user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
             resource_uid=policy_type_uid,
             resource_types=resource_types,
             permission_types=permission_types,
         )
 
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a grant on the policy type", extra=log_context)
             return True
 
@@ -1203,7 +1569,9 @@ class PolicyPermissionsResolver(ContentPackResourcePermissionsResolver):
             permission_type=permission_type,
         )
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
         policy_uid = resource_db.get_uid()
         pack_uid = resource_db.get_pack_uid()
         return self._user_has_resource_permission(
@@ -1211,6 +1579,7 @@ class PolicyPermissionsResolver(ContentPackResourcePermissionsResolver):
             pack_uid=pack_uid,
             resource_uid=policy_uid,
             permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
 
@@ -1236,16 +1605,18 @@ class InquiryPermissionsResolver(PermissionsResolver):
         assert permission_type in [PermissionType.INQUIRY_LIST, PermissionType.INQUIRY_ALL]
         return self._user_has_list_permission(user_db=user_db, permission_type=permission_type)
 
-    def user_has_resource_db_permission(self, user_db, resource_db, permission_type):
+    def _user_has_resource_db_permission(
+        self, user_db, resource_db, permission_type, permissions_snapshot=None
+    ):
         """
         Method for checking user permissions on an existing resource (e.g. get one, edit, delete
         operations).
 
         NOTE:
         Because we're borrowing the ActionExecutionDB model, the resource_db parameter is
-        effectively ignored. All other filters are passed to get_all_permission_grants_for_user.
-        Since all Inquiry permission types are global, this will still correctly return a list of
-        grants.
+        effectively ignored. All other filters are passed to the user permissions snapshot grant
+        lookup. Since all Inquiry permission types are global, this will still correctly find the
+        matching grants.
         """
 
         permission_types = [
@@ -1256,17 +1627,25 @@ class InquiryPermissionsResolver(PermissionsResolver):
 
         assert permission_type in permission_types
 
-        log_context = {
-            "user_db": user_db,
-            "resource_db": resource_db,
-            "permission_type": permission_type,
-            "resolver": self.__class__.__name__,
-        }
+        log_context = None
+        if LOG.isEnabledFor(stdlib_logging.DEBUG):
+            log_context = {
+                "user_db": user_db,
+                "resource_db": resource_db,
+                "permission_type": permission_type,
+                "resolver": self.__class__.__name__,
+            }
+
         self._log("Checking user resource permissions", extra=log_context)
 
         # First check the system role permissions
+        if permissions_snapshot is None:
+            permissions_snapshot = self._get_reusable_permissions_snapshot(user_db=user_db)
+
         has_system_role_permission = self._user_has_system_role_permission(
-            user_db=user_db, permission_type=permission_type
+            user_db=user_db,
+            permission_type=permission_type,
+            permissions_snapshot=permissions_snapshot,
         )
 
         if has_system_role_permission:
@@ -1275,11 +1654,14 @@ class InquiryPermissionsResolver(PermissionsResolver):
 
         # Check for explicit Inquiry grants first
         resource_types = [ResourceType.INQUIRY]
-        permission_grants = rbac_service.get_all_permission_grants_for_user(
-            user_db=user_db, resource_types=resource_types, permission_types=permission_types
+        has_permission_grant = self._user_has_permission_grant(
+            user_db=user_db,
+            permissions_snapshot=permissions_snapshot,
+            resource_types=resource_types,
+            permission_types=permission_types,
         )
 
-        if len(permission_grants) >= 1:
+        if has_permission_grant:
             self._log("Found a grant on the inquiry", extra=log_context)
             return True
 
@@ -1299,15 +1681,18 @@ class InquiryPermissionsResolver(PermissionsResolver):
             # Check grants on the pack of the workflow that the Inquiry was generated from
             resource_types = [ResourceType.PACK]
             permission_types = [PermissionType.ACTION_ALL, PermissionType.ACTION_EXECUTE]
-            permission_grants = rbac_service.get_all_permission_grants_for_user(
+            has_permission_grant = self._user_has_permission_grant(
                 user_db=user_db,
+                permissions_snapshot=permissions_snapshot,
                 resource_uid=wf_action_pack_uid,
                 resource_types=resource_types,
                 permission_types=permission_types,
             )
 
-            if len(permission_grants) >= 1:
-                log_context["wf_action_pack_uid"] = wf_action_pack_uid
+            if has_permission_grant:
+                if log_context is not None:
+                    log_context["wf_action_pack_uid"] = wf_action_pack_uid
+
                 self._log(
                     "Found a grant on the parent pack for an inquiry workflow", extra=log_context
                 )
@@ -1316,15 +1701,18 @@ class InquiryPermissionsResolver(PermissionsResolver):
             # Check grants on the workflow that the Inquiry was generated from
             resource_types = [ResourceType.ACTION]
             permission_types = [PermissionType.ACTION_ALL, PermissionType.ACTION_EXECUTE]
-            permission_grants = rbac_service.get_all_permission_grants_for_user(
+            has_permission_grant = self._user_has_permission_grant(
                 user_db=user_db,
+                permissions_snapshot=permissions_snapshot,
                 resource_uid=wf_action_uid,
                 resource_types=resource_types,
                 permission_types=permission_types,
             )
 
-            if len(permission_grants) >= 1:
-                log_context["wf_action_uid"] = wf_action_uid
+            if has_permission_grant:
+                if log_context is not None:
+                    log_context["wf_action_uid"] = wf_action_uid
+
                 self._log("Found a grant on the inquiry workflow", extra=log_context)
                 return True
 
@@ -1332,52 +1720,124 @@ class InquiryPermissionsResolver(PermissionsResolver):
         return False
 
 
+def _get_query_filter_for_permission_grants(
+    permissions_snapshot, resource_type, permission_types, pack_field, uid_field
+):
+    """
+    Compile user pack-level and resource-level permission grants into a query filter.
+
+    :param resource_type: Resource type of the resource-level grants to include.
+    :type resource_type: ``str``
+
+    :param pack_field: Name of the field holding the resource pack ref (e.g. "pack").
+    :type pack_field: ``str``
+
+    :param uid_field: Name of the field holding the resource uid (e.g. "uid").
+    :type uid_field: ``str``
+
+    :rtype: :class:`mongoengine.queryset.visitor.Q`
+    """
+    pack_grants = permissions_snapshot.get_permission_grants(
+        resource_types=[ResourceType.PACK], permission_types=permission_types
+    )
+    resource_grants = permissions_snapshot.get_permission_grants(
+        resource_types=[resource_type], permission_types=permission_types
+    )
+
+    pack_uid_prefix = ResourceType.PACK + UIDFieldMixin.UID_SEPARATOR
+    pack_refs = set([])
+    for permission_grant in pack_grants:
+        if permission_grant.resource_uid and permission_grant.resource_uid.startswith(
+            pack_uid_prefix
+        ):
+            pack_refs.add(permission_grant.resource_uid[len(pack_uid_prefix) :])
+
+    resource_uids = set([permission_grant.resource_uid for permission_grant in resource_grants])
+    resource_uids.discard(None)
+
+    query_filter = None
+
+    if pack_refs:
+        query_filter = Q(**{"%s__in" % (pack_field): sorted(pack_refs)})
+
+    if resource_uids:
+        resource_filter = Q(**{"%s__in" % (uid_field): sorted(resource_uids)})
+        query_filter = resource_filter if query_filter is None else query_filter | resource_filter
+
+    if query_filter is None:
+        # No matching grants, filter which doesn't match anything
+        query_filter = Q(id__in=[])
+
+    return query_filter
+
+
+# Maps resource type to the resolver class which contains permission resolving logic for it
+RESOLVER_CLASSES = {
+    ResourceType.RUNNER: RunnerPermissionsResolver,
+    ResourceType.PACK: PackPermissionsResolver,
+    ResourceType.SENSOR: SensorPermissionsResolver,
+    ResourceType.ACTION: ActionPermissionsResolver,
+    ResourceType.ACTION_ALIAS: ActionAliasPermissionsResolver,
+    ResourceType.RULE: RulePermissionsResolver,
+    ResourceType.EXECUTION: ExecutionPermissionsResolver,
+    ResourceType.KEY_VALUE_PAIR: KeyValuePermissionsResolver,
+    ResourceType.WEBHOOK: WebhookPermissionsResolver,
+    ResourceType.TIMER: TimerPermissionsResolver,
+    ResourceType.API_KEY: ApiKeyPermissionResolver,
+    ResourceType.RULE_ENFORCEMENT: RuleEnforcementPermissionsResolver,
+    ResourceType.TRACE: TracePermissionsResolver,
+    ResourceType.TRIGGER: TriggerPermissionsResolver,
+    ResourceType.POLICY_TYPE: PolicyTypePermissionsResolver,
+    ResourceType.POLICY: PolicyPermissionsResolver,
+    ResourceType.STREAM: StreamPermissionsResolver,
+    ResourceType.INQUIRY: InquiryPermissionsResolver,
+}
+
+# Shared resolver instances keyed by resource type and by permission type. Resolvers are
+# stateless so a single instance per resource type is shared by all the permission checks.
+_RESOLVERS_BY_RESOURCE_TYPE = {}
+_RESOLVERS_BY_PERMISSION_TYPE = {}
+
+
+def register_resolver(resource_type, resolver_cls):
+    """
+    Register resolver class for the provided resource type.
+
+    This method can be used by plugins to add resolvers for additional resource types or to
+    override resolvers for the existing ones.
+
+    :param resource_type: Resource type this resolver handles.
+    :type resource_type: ``str``
+
+    :param resolver_cls: Resolver class.
+    :type resolver_cls: :class:`PermissionsResolver`
+
+    :return: Registered resolver instance.
+    :rtype: Instance of :class:`PermissionsResolver`
+    """
+    resolver_instance = resolver_cls()
+
+    RESOLVER_CLASSES[resource_type] = resolver_cls
+    _RESOLVERS_BY_RESOURCE_TYPE[resource_type] = resolver_instance
+
+    for permission_type in PermissionType.get_valid_values():
+        if PermissionType.get_resource_type(permission_type=permission_type) == resource_type:
+            _RESOLVERS_BY_PERMISSION_TYPE[permission_type] = resolver_instance
+
+    return resolver_instance
+
+
 def get_resolver_for_resource_type(resource_type):
     """
     Return resolver instance for the provided resource type.
 
     :rtype: Instance of :class:`PermissionsResolver`
     """
-    if resource_type == ResourceType.RUNNER:
-        resolver_cls = RunnerPermissionsResolver
-    elif resource_type == ResourceType.PACK:
-        resolver_cls = PackPermissionsResolver
-    elif resource_type == ResourceType.SENSOR:
-        resolver_cls = SensorPermissionsResolver
-    elif resource_type == ResourceType.ACTION:
-        resolver_cls = ActionPermissionsResolver
-    elif resource_type == ResourceType.ACTION_ALIAS:
-        resolver_cls = ActionAliasPermissionsResolver
-    elif resource_type == ResourceType.RULE:
-        resolver_cls = RulePermissionsResolver
-    elif resource_type == ResourceType.EXECUTION:
-        resolver_cls = ExecutionPermissionsResolver
-    elif resource_type == ResourceType.KEY_VALUE_PAIR:
-        resolver_cls = KeyValuePermissionsResolver
-    elif resource_type == ResourceType.WEBHOOK:
-        resolver_cls = WebhookPermissionsResolver
-    elif resource_type == ResourceType.TIMER:
-        resolver_cls = TimerPermissionsResolver
-    elif resource_type == ResourceType.API_KEY:
-        resolver_cls = ApiKeyPermissionResolver
-    elif resource_type == ResourceType.RULE_ENFORCEMENT:
-        resolver_cls = RuleEnforcementPermissionsResolver
-    elif resource_type == ResourceType.TRACE:
-        resolver_cls = TracePermissionsResolver
-    elif resource_type == ResourceType.TRIGGER:
-        resolver_cls = TriggerPermissionsResolver
-    elif resource_type == ResourceType.POLICY_TYPE:
-        resolver_cls = PolicyTypePermissionsResolver
-    elif resource_type == ResourceType.POLICY:
-        resolver_cls = PolicyPermissionsResolver
-    elif resource_type == ResourceType.STREAM:
-        resolver_cls = StreamPermissionsResolver
-    elif resource_type == ResourceType.INQUIRY:
-        resolver_cls = InquiryPermissionsResolver
-    else:
+    resolver_instance = _RESOLVERS_BY_RESOURCE_TYPE.get(resource_type, None)
+
+    if not resolver_instance:
         raise ValueError("Unsupported resource: %s" % (resource_type))
 
-    resolver_instance = resolver_cls()
     return resolver_instance
 
 
@@ -1387,6 +1847,18 @@ def get_resolver_for_permission_type(permission_type):
 
     :rtype: Instance of :class:`PermissionsResolver`
     """
-    resource_type = PermissionType.get_resource_type(permission_type=permission_type)
-    resolver_instance = get_resolver_for_resource_type(resource_type=resource_type)
+    resolver_instance = _RESOLVERS_BY_PERMISSION_TYPE.get(permission_type, None)
+
+    if not resolver_instance:
+        resource_type = PermissionType.get_resource_type(permission_type=permission_type)
+        resolver_instance = get_resolver_for_resource_type(resource_type=resource_type)
+
     return resolver_instance
+
+
+def _register_default_resolvers():
+    for resource_type, resolver_cls in six.iteritems(RESOLVER_CLASSES.copy()):
+        register_resolver(resource_type=resource_type, resolver_cls=resolver_cls)
+
+
+_register_default_resolvers()
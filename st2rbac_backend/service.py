@@ -19,8 +19,17 @@ Module containing utility RBAC service related functions.
 
 from __future__ import absolute_import
 
+from itertools import chain
+
+from oslo_config import cfg
 from mongoengine.queryset.visitor import Q
 from mongoengine import NotUniqueError
+from bson import ObjectId
+from pymongo import DeleteMany
+from pymongo import InsertOne
+from pymongo import ReplaceOne
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 from st2common.rbac.types import PermissionType
 from st2common.rbac.types import ResourceType
@@ -36,6 +45,12 @@ from st2common.models.db.rbac import GroupToRoleMappingDB
 from st2common.exceptions.db import StackStormDBObjectConflictError
 from st2common.rbac.backends.base import BaseRBACService
 
+from st2rbac_backend import config as rbac_config  # noqa: F401 pylint: disable=unused-import
+from st2rbac_backend import generation
+from st2rbac_backend import invalidation
+from st2rbac_backend.models import UserRemoteGroupsFingerprintDB
+from st2rbac_backend.snapshot import PermissionGrantEntry
+from st2rbac_backend.snapshot import UserPermissionsSnapshot
 
 __all__ = ["RBACService"]
 
@@ -160,8 +175,122 @@ class RBACService(BaseRBACService):
 
         role_db = RoleDB(name=name, description=description)
         role_db = Role.add_or_update(role_db)
+
+        invalidation.notify_change(roles=[name])
         return role_db
 
+    @staticmethod
+    def create_roles_with_grants(role_definitions):
+        """
+        Create multiple roles together with their permission grants using bulk writes.
+
+        All the permission grants are inserted with a single bulk insert and then all the roles
+        are inserted (each one already referencing all of its grants) with another bulk insert.
+
+        :param role_definitions: A list of role definition dictionaries with "name",
+                                 "description" and "permission_grants" keys. Each permission
+                                 grant is a dictionary with "resource_uid", "resource_type" and
+                                 "permission_types" keys.
+        :type role_definitions: ``list`` of ``dict``
+
+        :return: Created roles (in the same order as the provided definitions).
+        :rtype: ``list`` of :class:`RoleDB`
+        """
+        for role_definition in role_definitions:
+            if role_definition["name"] in SystemRole.get_valid_values():
+                raise ValueError('"%s" role name is blacklisted' % (role_definition["name"]))
+
+        if not role_definitions:
+            return []
+
+        role_permission_grant_dbs = _insert_permission_grants(role_definitions=role_definitions)
+
+        role_dbs = [
+            RoleDB(
+                name=role_definition["name"],
+                description=role_definition.get("description", None),
+                permission_grants=[
+                    str(permission_grant_db.id) for permission_grant_db in permission_grant_dbs
+                ],
+            )
+            for role_definition, permission_grant_dbs in zip(
+                role_definitions, role_permission_grant_dbs
+            )
+        ]
+        role_ids = RoleDB.objects.insert(role_dbs, load_bulk=False)
+
+        for role_db, role_id in zip(role_dbs, role_ids):
+            role_db.id = role_id
+
+        invalidation.notify_change(roles=[role_db.name for role_db in role_dbs])
+        return role_dbs
+
+    @staticmethod
+    def update_roles_with_grants(role_dbs, role_definitions):
+        """
+        Replace description and permission grants of multiple existing roles.
+
+        New permission grants are inserted first, then each role document is updated to reference
+        the new grants (a single atomic write per role, all sent in one bulk write) and only then
+        the old permission grants are removed. This means a role never disappears or ends up
+        without grants while it's being updated.
+
+        :param role_dbs: Roles to update.
+        :type role_dbs: ``list`` of :class:`RoleDB`
+
+        :param role_definitions: New role definitions (in the same order as roles), see
+                                 create_roles_with_grants for the format.
+        :type role_definitions: ``list`` of ``dict``
+
+        :return: Updated roles.
+        :rtype: ``list`` of :class:`RoleDB`
+        """
+        if not role_dbs:
+            return []
+
+        role_permission_grant_dbs = _insert_permission_grants(role_definitions=role_definitions)
+
+        updated_role_dbs = []
+        operations = []
+        old_permission_grant_ids = []
+
+        for role_db, role_definition, permission_grant_dbs in zip(
+            role_dbs, role_definitions, role_permission_grant_dbs
+        ):
+            permission_grant_ids = [
+                str(permission_grant_db.id) for permission_grant_db in permission_grant_dbs
+            ]
+            description = role_definition.get("description", None)
+
+            operations.append(
+                UpdateOne(
+                    {"_id": role_db.id},
+                    {
+                        "$set": {
+                            "description": description,
+                            "permission_grants": permission_grant_ids,
+                        }
+                    },
+                )
+            )
+            old_permission_grant_ids.extend(role_db.permission_grants)
+
+            updated_role_dbs.append(
+                RoleDB(
+                    id=role_db.id,
+                    name=role_db.name,
+                    description=description,
+                    system=role_db.system,
+                    permission_grants=permission_grant_ids,
+                )
+            )
+
+        RoleDB._get_collection().bulk_write(operations, ordered=False)
+        PermissionGrant.query(id__in=old_permission_grant_ids).delete()
+
+        invalidation.notify_change(roles=[role_db.name for role_db in role_dbs])
+        return updated_role_dbs
+
     @staticmethod
     def delete_role(name):
         """ "
@@ -172,6 +301,8 @@ class RBACService(BaseRBACService):
 
         role_db = Role.get(name=name)
         result = Role.delete(role_db)
+
+        invalidation.notify_change(roles=[name])
         return result
 
     @staticmethod
@@ -223,8 +354,119 @@ class RBACService(BaseRBACService):
                 user=user_db.name, role=role_db.name, source=source, description=description
             ).first()
 
+        invalidation.notify_change(users=[user_db.name])
         return role_assignment_db
 
+    @staticmethod
+    def bulk_write_role_assignments(
+        role_assignment_dbs_to_create, role_assignment_dbs_to_delete, batch_size=1000
+    ):
+        """
+        Create and delete multiple role assignments using unordered bulk writes.
+
+        Assignments are deleted by id. Ids of the created assignments are set on the provided
+        objects.
+
+        :param role_assignment_dbs_to_create: Role assignments to create.
+        :type role_assignment_dbs_to_create: ``list`` of :class:`UserRoleAssignmentDB`
+
+        :param role_assignment_dbs_to_delete: Role assignments to delete.
+        :type role_assignment_dbs_to_delete: ``list`` of :class:`UserRoleAssignmentDB`
+
+        :param batch_size: Maximum number of operations in a single bulk write.
+        :type batch_size: ``int``
+        """
+        collection = UserRoleAssignmentDB._get_collection()
+
+        role_assignment_ids_to_delete = [
+            role_assignment_db.id for role_assignment_db in role_assignment_dbs_to_delete
+        ]
+        for index in range(0, len(role_assignment_ids_to_delete), batch_size):
+            ids = role_assignment_ids_to_delete[index : index + batch_size]
+            collection.bulk_write([DeleteMany({"_id": {"$in": ids}})], ordered=False)
+
+        for index in range(0, len(role_assignment_dbs_to_create), batch_size):
+            role_assignment_dbs = role_assignment_dbs_to_create[index : index + batch_size]
+            operations = []
+
+            for role_assignment_db in role_assignment_dbs:
+                role_assignment_db.id = ObjectId()
+                role_assignment_db.validate()
+                operations.append(InsertOne(role_assignment_db.to_mongo().to_dict()))
+
+            collection.bulk_write(operations, ordered=False)
+
+        usernames = set(
+            [
+                role_assignment_db.user
+                for role_assignment_db in chain(
+                    role_assignment_dbs_to_create, role_assignment_dbs_to_delete
+                )
+            ]
+        )
+
+        if usernames:
+            invalidation.notify_change(users=usernames)
+
+    @staticmethod
+    def bulk_upsert_role_assignments(role_assignment_dbs):
+        """
+        Create multiple role assignments using a single unordered bulk upsert.
+
+        Assignments are matched on (user, role, source) and assignments which already exist are
+        left untouched.
+
+        :param role_assignment_dbs: Role assignments to create.
+        :type role_assignment_dbs: ``list`` of :class:`UserRoleAssignmentDB`
+
+        :return: Role assignments which have actually been created (with id set).
+        :rtype: ``list`` of :class:`UserRoleAssignmentDB`
+        """
+        if not role_assignment_dbs:
+            return []
+
+        operations = []
+        for role_assignment_db in role_assignment_dbs:
+            role_assignment_db.validate()
+            doc = role_assignment_db.to_mongo().to_dict()
+            doc.pop("_id", None)
+
+            query = {
+                "user": role_assignment_db.user,
+                "role": role_assignment_db.role,
+                "source": role_assignment_db.source,
+            }
+            operations.append(UpdateOne(query, {"$setOnInsert": doc}, upsert=True))
+
+        collection = UserRoleAssignmentDB._get_collection()
+
+        try:
+            result = collection.bulk_write(operations, ordered=False)
+            upserted_ids = result.upserted_ids
+        except BulkWriteError as e:
+            # Assignment has been created concurrently (e.g. two simultaneous logins of the same
+            # user), all the other errors are fatal
+            errors = e.details.get("writeErrors", [])
+            if [error for error in errors if error.get("code", None) != 11000]:
+                raise e
+
+            upserted_ids = dict(
+                [(item["index"], item["_id"]) for item in e.details.get("upserted", [])]
+            )
+
+        created_role_assignment_dbs = []
+        for index, role_assignment_id in sorted(upserted_ids.items()):
+            role_assignment_db = role_assignment_dbs[index]
+            role_assignment_db.id = role_assignment_id
+            created_role_assignment_dbs.append(role_assignment_db)
+
+        if created_role_assignment_dbs:
+            invalidation.notify_change(
+                users=set([role_assignment_db.user for role_assignment_db in role_assignment_dbs])
+            )
+
+        return created_role_assignment_dbs
+
     @staticmethod
     def revoke_role_from_user(role_db, user_db):
         """
@@ -241,6 +483,11 @@ class RBACService(BaseRBACService):
         for role_assignment_db in role_assignment_dbs:
             UserRoleAssignment.delete(role_assignment_db)
 
+        # Make sure remote role assignments are re-created on the next remote groups sync
+        UserRemoteGroupsFingerprintDB.objects(user=user_db.name).delete()
+
+        invalidation.notify_change(users=[user_db.name])
+
     @staticmethod
     def get_all_permission_grants_for_user(
         user_db, resource_uid=None, resource_types=None, permission_types=None
@@ -255,11 +502,25 @@ class RBACService(BaseRBACService):
         The result is a union of all the permission grants assigned to the roles which are assigned
         to the user.
 
+        Depending on the "rbac.permission_grants_lookup" config option, the grants are either
+        resolved using a chain of queries or using a single server-side aggregation.
+
         :rtype: ``list`` or :class:`PermissionGrantDB`
         """
+        if cfg.CONF.rbac.permission_grants_lookup == "aggregation":
+            pipeline = _get_user_permission_grants_pipeline(
+                user_db=user_db,
+                resource_uid=resource_uid,
+                resource_types=resource_types,
+                permission_types=permission_types,
+            )
+            cursor = UserRoleAssignmentDB._get_collection().aggregate(pipeline)
+            permission_grant_dbs = [PermissionGrantDB._from_son(doc) for doc in cursor]
+            return permission_grant_dbs
+
         role_names = UserRoleAssignment.query(user=user_db.name).only("role").scalar("role")
         permission_grant_ids = Role.query(name__in=role_names).scalar("permission_grants")
-        permission_grant_ids = sum(permission_grant_ids, [])
+        permission_grant_ids = list(chain.from_iterable(permission_grant_ids))
 
         permission_grants_filters = {}
         permission_grants_filters["id__in"] = permission_grant_ids
@@ -276,6 +537,119 @@ class RBACService(BaseRBACService):
         permission_grant_dbs = PermissionGrant.query(**permission_grants_filters)
         return permission_grant_dbs
 
+    @staticmethod
+    def user_has_any_permission_grant(
+        user_db, resource_uid=None, resource_types=None, permission_types=None
+    ):
+        """
+        Return True if the user has at least one permission grant matching the provided filters.
+
+        Filters follow the same semantics as the ones in get_all_permission_grants_for_user, but
+        instead of retrieving and hydrating all the matching grants, the lookup stops at the first
+        match and only retrieves the grant id.
+
+        :rtype: ``bool``
+        """
+        if cfg.CONF.rbac.permission_grants_lookup == "aggregation":
+            pipeline = _get_user_permission_grants_pipeline(
+                user_db=user_db,
+                resource_uid=resource_uid,
+                resource_types=resource_types,
+                permission_types=permission_types,
+            )
+            pipeline.extend([{"$limit": 1}, {"$project": {"_id": 1}}])
+            cursor = UserRoleAssignmentDB._get_collection().aggregate(pipeline)
+            return bool(list(cursor))
+
+        role_names = UserRoleAssignment.query(user=user_db.name).only("role").scalar("role")
+        permission_grant_ids = Role.query(name__in=role_names).scalar("permission_grants")
+        permission_grant_ids = list(chain.from_iterable(permission_grant_ids))
+
+        if not permission_grant_ids:
+            return False
+
+        permission_grants_filters = {}
+        permission_grants_filters["id__in"] = permission_grant_ids
+
+        if resource_uid:
+            permission_grants_filters["resource_uid"] = resource_uid
+
+        if resource_types:
+            permission_grants_filters["resource_type__in"] = resource_types
+
+        if permission_types:
+            permission_grants_filters["permission_types__in"] = permission_types
+
+        permission_grant = (
+            PermissionGrantDB.objects(**permission_grants_filters)
+            .only("id")
+            .limit(1)
+            .as_pymongo()
+            .first()
+        )
+        return permission_grant is not None
+
+    @staticmethod
+    def get_permissions_snapshot_for_user(user_db):
+        """
+        Retrieve a compiled snapshot of all the roles and permission grants for a particular user.
+
+        The snapshot is built with a single pass over the role assignment -> role -> permission
+        grant chain and can then answer any number of role and permission grant lookups in memory.
+
+        :param user_db: User to retrieve the snapshot for.
+        :type user_db: :class:`UserDB`
+
+        :rtype: :class:`UserPermissionsSnapshot`
+        """
+        if cfg.CONF.rbac.permission_grants_lookup == "aggregation":
+            pipeline = _get_user_roles_with_permission_grants_pipeline(user_db=user_db)
+            cursor = UserRoleAssignmentDB._get_collection().aggregate(pipeline)
+
+            existing_role_names = []
+            permission_grants = {}
+            for role_doc in cursor:
+                existing_role_names.append(role_doc["name"])
+
+                for permission_grant_doc in role_doc["permission_grants"]:
+                    permission_grant = _to_permission_grant_entry(permission_grant_doc)
+                    permission_grants[permission_grant.id] = permission_grant
+
+            snapshot = UserPermissionsSnapshot(
+                username=user_db.name,
+                role_names=existing_role_names,
+                permission_grants=list(permission_grants.values()),
+            )
+            return snapshot
+
+        role_names = UserRoleAssignment.query(user=user_db.name).only("role").scalar("role")
+        role_names = list(set(role_names))
+
+        role_docs = RoleDB.objects(name__in=role_names).only("name", "permission_grants")
+        role_docs = role_docs.as_pymongo()
+
+        existing_role_names = []
+        permission_grant_ids = []
+        for role_doc in role_docs:
+            existing_role_names.append(role_doc["name"])
+            permission_grant_ids.extend(role_doc.get("permission_grants", []))
+
+        permission_grants = []
+        if permission_grant_ids:
+            permission_grant_docs = PermissionGrantDB.objects(id__in=permission_grant_ids).only(
+                "resource_uid", "resource_type", "permission_types"
+            )
+
+            for permission_grant_doc in permission_grant_docs.as_pymongo():
+                permission_grants.append(_to_permission_grant_entry(permission_grant_doc))
+
+        snapshot = UserPermissionsSnapshot(
+            username=user_db.name,
+            role_names=existing_role_names,
+            permission_grants=permission_grants,
+        )
+        return snapshot
+
     @staticmethod
     def create_permission_grant_for_resource_db(role_db, resource_db, permission_types):
         """
@@ -321,6 +695,7 @@ class RBACService(BaseRBACService):
         # Add assignment to the role
         role_db.update(push__permission_grants=str(permission_grant_db.id))
 
+        invalidation.notify_change(roles=[role_db.name])
         return permission_grant_db
 
     @staticmethod
@@ -348,6 +723,7 @@ class RBACService(BaseRBACService):
         # Remove assignment from a role
         role_db.update(pull__permission_grants=str(permission_grant_db.id))
 
+        invalidation.notify_change(roles=[role_db.name])
         return permission_grant_db
 
     @staticmethod
@@ -363,8 +739,68 @@ class RBACService(BaseRBACService):
 
         group_to_role_map_db = GroupToRoleMapping.add_or_update(group_to_role_map_db)
 
+        generation.bump_group_to_role_maps_version()
+        invalidation.notify_change(roles=roles)
         return group_to_role_map_db
 
+    @staticmethod
+    def bulk_write_group_to_role_maps(
+        group_to_role_map_dbs_to_create,
+        group_to_role_map_dbs_to_update,
+        group_to_role_map_dbs_to_delete,
+    ):
+        """
+        Create, update and delete multiple group to role mappings using a single unordered bulk
+        write.
+
+        Mappings to update are replaced by id. Ids of the created mappings are set on the
+        provided objects.
+
+        :param group_to_role_map_dbs_to_create: Mappings to create.
+        :type group_to_role_map_dbs_to_create: ``list`` of :class:`GroupToRoleMappingDB`
+
+        :param group_to_role_map_dbs_to_update: Mappings to update (need to have id set).
+        :type group_to_role_map_dbs_to_update: ``list`` of :class:`GroupToRoleMappingDB`
+
+        :param group_to_role_map_dbs_to_delete: Mappings to delete.
+        :type group_to_role_map_dbs_to_delete: ``list`` of :class:`GroupToRoleMappingDB`
+        """
+        operations = []
+
+        if group_to_role_map_dbs_to_delete:
+            ids = [
+                group_to_role_map_db.id for group_to_role_map_db in group_to_role_map_dbs_to_delete
+            ]
+            operations.append(DeleteMany({"_id": {"$in": ids}}))
+
+        for group_to_role_map_db in group_to_role_map_dbs_to_update:
+            group_to_role_map_db.validate()
+            doc = group_to_role_map_db.to_mongo().to_dict()
+            operations.append(ReplaceOne({"_id": group_to_role_map_db.id}, doc))
+
+        for group_to_role_map_db in group_to_role_map_dbs_to_create:
+            group_to_role_map_db.id = ObjectId()
+            group_to_role_map_db.validate()
+            operations.append(InsertOne(group_to_role_map_db.to_mongo().to_dict()))
+
+        if not operations:
+            return
+
+        GroupToRoleMappingDB._get_collection().bulk_write(operations, ordered=False)
+        generation.bump_group_to_role_maps_version()
+
+        role_names = chain.from_iterable(
+            [
+                group_to_role_map_db.roles
+                for group_to_role_map_db in chain(
+                    group_to_role_map_dbs_to_create,
+                    group_to_role_map_dbs_to_update,
+                    group_to_role_map_dbs_to_delete,
+                )
+            ]
+        )
+        invalidation.notify_change(roles=set(role_names))
+
     @staticmethod
     def validate_roles_exists(role_names):
         """
@@ -383,6 +819,171 @@ class RBACService(BaseRBACService):
                 raise ValueError('Role "%s" doesn\'t exist in the database' % (role_name))
 
 
+def _insert_permission_grants(role_definitions):
+    """
+    Insert permission grants for the provided role definitions using a single bulk insert.
+
+    :return: Inserted permission grants for each role definition.
+    :rtype: ``list`` of ``list`` of :class:`PermissionGrantDB`
+    """
+    role_permission_grant_dbs = []
+    for role_definition in role_definitions:
+        permission_grant_dbs = [
+            PermissionGrantDB(
+                resource_uid=permission_grant.get("resource_uid", None),
+                resource_type=permission_grant.get("resource_type", None),
+                permission_types=permission_grant["permission_types"],
+            )
+            for permission_grant in role_definition.get("permission_grants", [])
+        ]
+        role_permission_grant_dbs.append(permission_grant_dbs)
+
+    all_permission_grant_dbs = list(chain.from_iterable(role_permission_grant_dbs))
+
+    if all_permission_grant_dbs:
+        permission_grant_ids = PermissionGrantDB.objects.insert(
+            all_permission_grant_dbs, load_bulk=False
+        )
+
+        for permission_grant_db, permission_grant_id in zip(
+            all_permission_grant_dbs, permission_grant_ids
+        ):
+            permission_grant_db.id = permission_grant_id
+
+    return role_permission_grant_dbs
+
+
+def _get_permission_grant_filters(resource_uid=None, resource_types=None, permission_types=None):
+    """
+    Return raw MongoDB filter for the PermissionGrantDB collection which matches the filters used
+    by get_all_permission_grants_for_user.
+
+    :rtype: ``dict``
+    """
+    filters = {}
+
+    if resource_uid:
+        filters["resource_uid"] = resource_uid
+
+    if resource_types:
+        filters["resource_type"] = {"$in": list(resource_types)}
+
+    if permission_types:
+        filters["permission_types"] = {"$in": list(permission_types)}
+
+    return filters
+
+
+def _get_user_roles_pipeline(user_db):
+    """
+    Return aggregation pipeline stages which resolve all the (de-duplicated) roles assigned to the
+    provided user. Pipeline runs against the UserRoleAssignmentDB collection and results in one
+    document per role (under the "role" key).
+
+    :rtype: ``list``
+    """
+    pipeline = [
+        {"$match": {"user": user_db.name}},
+        {"$group": {"_id": "$role"}},
+        {
+            "$lookup": {
+                "from": RoleDB._get_collection_name(),
+                "localField": "_id",
+                "foreignField": "name",
+                "as": "role",
+            }
+        },
+        {"$unwind": "$role"},
+    ]
+    return pipeline
+
+
+def _get_user_permission_grants_pipeline(
+    user_db, resource_uid=None, resource_types=None, permission_types=None
+):
+    """
+    Return aggregation pipeline which resolves user -> role assignments -> roles -> permission
+    grants on the server side and results in one raw PermissionGrantDB document per matching grant.
+
+    :rtype: ``list``
+    """
+    pipeline = _get_user_roles_pipeline(user_db=user_db)
+    pipeline.extend(
+        [
+            {"$unwind": "$role.permission_grants"},
+            # Note: Roles reference grants using string ids, but grant primary keys are ObjectIds
+            {"$group": {"_id": {"$toObjectId": "$role.permission_grants"}}},
+            {
+                "$lookup": {
+                    "from": PermissionGrantDB._get_collection_name(),
+                    "localField": "_id",
+                    "foreignField": "_id",
+                    "as": "permission_grant",
+                }
+            },
+            {"$unwind": "$permission_grant"},
+            {"$replaceRoot": {"newRoot": "$permission_grant"}},
+        ]
+    )
+
+    filters = _get_permission_grant_filters(
+        resource_uid=resource_uid, resource_types=resource_types, permission_types=permission_types
+    )
+
+    if filters:
+        pipeline.append({"$match": filters})
+
+    return pipeline
+
+
+def _get_user_roles_with_permission_grants_pipeline(user_db):
+    """
+    Return aggregation pipeline which results in one document per role assigned to the provided
+    user. Each document contains role name and raw documents of all the role permission grants.
+
+    :rtype: ``list``
+    """
+    pipeline = _get_user_roles_pipeline(user_db=user_db)
+    pipeline.extend(
+        [
+            {
+                "$project": {
+                    "_id": 0,
+                    "name": "$role.name",
+                    "permission_grant_ids": {
+                        "$map": {
+                            "input": {"$ifNull": ["$role.permission_grants", []]},
+                            "as": "permission_grant_id",
+                            "in": {"$toObjectId": "$$permission_grant_id"},
+                        }
+                    },
+                }
+            },
+            {
+                "$lookup": {
+                    "from": PermissionGrantDB._get_collection_name(),
+                    "localField": "permission_grant_ids",
+                    "foreignField": "_id",
+                    "as": "permission_grants",
+                }
+            },
+        ]
+    )
+    return pipeline
+
+
+def _to_permission_grant_entry(permission_grant_doc):
+    """
+    Convert raw PermissionGrantDB document into a read-only PermissionGrantEntry.
+    """
+    return PermissionGrantEntry(
+        id=str(permission_grant_doc["_id"]),
+        resource_uid=permission_grant_doc.get("resource_uid", None),
+        resource_type=permission_grant_doc.get("resource_type", None),
+        permission_types=frozenset(permission_grant_doc.get("permission_types", [])),
+    )
+
+
 def _validate_resource_type(resource_db):
     """
     Validate that the permissions can be manipulated for the provided resource type.
@@ -0,0 +1,161 @@
+# Copyright 2020 The StackStorm Authors
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module containing compiled, in-memory representation of the user roles and permission grants.
+"""
+
+from __future__ import absolute_import
+
+from collections import defaultdict
+from collections import namedtuple
+
+__all__ = ["PermissionGrantEntry", "UserPermissionsSnapshot"]
+
+
+# Lightweight read-only representation of a single PermissionGrantDB document
+PermissionGrantEntry = namedtuple(
+    "PermissionGrantEntry", ["id", "resource_uid", "resource_type", "permission_types"]
+)
+
+
+class UserPermissionsSnapshot(object):
+    """
+    Immutable snapshot of all the roles and permission grants assigned to a particular user.
+
+    The snapshot is compiled once (see RBACService.get_permissions_snapshot_for_user) and then
+    answers any number of role and permission grant lookups in memory. Lookups follow the same
+    matching semantics as RBACService.get_all_permission_grants_for_user.
+    """
+
+    __slots__ = [
+        "username",
+        "role_names",
+        "permission_grants",
+        "_grants_by_resource_uid",
+        "_grants_by_permission_type",
+    ]
+
+    def __init__(self, username, role_names, permission_grants):
+        """
+        :param username: Name of the user this snapshot belongs to.
+        :type username: ``str``
+
+        :param role_names: Names of all the roles assigned to the user.
+        :type role_names: ``list`` of ``str``
+
+        :param permission_grants: All the permission grants assigned to the user roles.
+        :type permission_grants: ``list`` of :class:`PermissionGrantEntry`
+        """
+        grants_by_resource_uid = defaultdict(list)
+        grants_by_permission_type = defaultdict(list)
+
+        for permission_grant in permission_grants:
+            grants_by_resource_uid[permission_grant.resource_uid].append(permission_grant)
+
+            for permission_type in permission_grant.permission_types:
+                grants_by_permission_type[permission_type].append(permission_grant)
+
+        self.username = username
+        self.role_names = frozenset(role_names)
+        self.permission_grants = tuple(permission_grants)
+        self._grants_by_resource_uid = dict(
+            [(key, tuple(value)) for key, value in grants_by_resource_uid.items()]
+        )
+        self._grants_by_permission_type = dict(
+            [(key, tuple(value)) for key, value in grants_by_permission_type.items()]
+        )
+
+    def has_role(self, role):
+        """
+        :param role: Role name to check for.
+        :type role: ``str``
+
+        :rtype: ``bool``
+        """
+        return role in self.role_names
+
+    def get_permission_grants(self, resource_uid=None, resource_types=None, permission_types=None):
+        """
+        Retrieve all the permission grants matching the provided filters.
+
+        :rtype: ``list`` of :class:`PermissionGrantEntry`
+        """
+        return list(
+            self._iter_permission_grants(
+                resource_uid=resource_uid,
+                resource_types=resource_types,
+                permission_types=permission_types,
+            )
+        )
+
+    def has_permission_grant(self, resource_uid=None, resource_types=None, permission_types=None):
+        """
+        Return True if at least one permission grant matches the provided filters.
+
+        :rtype: ``bool``
+        """
+        for _ in self._iter_permission_grants(
+            resource_uid=resource_uid,
+            resource_types=resource_types,
+            permission_types=permission_types,
+        ):
+            return True
+
+        return False
+
+    def _iter_permission_grants(
+        self, resource_uid=None, resource_types=None, permission_types=None
+    ):
+        # Note: Filters are only applied when they are provided (truthy), same as in
+        # RBACService.get_all_permission_grants_for_user
+        if resource_uid:
+            candidates = self._grants_by_resource_uid.get(resource_uid, ())
+        elif permission_types:
+            candidates = self._get_grants_for_permission_types(permission_types=permission_types)
+        else:
+            candidates = self.permission_grants
+
+        for permission_grant in candidates:
+            if resource_uid and permission_grant.resource_uid != resource_uid:
+                continue
+
+            if resource_types and permission_grant.resource_type not in resource_types:
+                continue
+
+            if permission_types and not permission_grant.permission_types.intersection(
+                permission_types
+            ):
+                continue
+
+            yield permission_grant
+
+    def _get_grants_for_permission_types(self, permission_types):
+        seen_ids = set([])
+
+        for permission_type in permission_types:
+            for permission_grant in self._grants_by_permission_type.get(permission_type, ()):
+                if permission_grant.id in seen_ids:
+                    continue
+
+                seen_ids.add(permission_grant.id)
+                yield permission_grant
+
+    def __repr__(self):
+        return "<UserPermissionsSnapshot username=%s,roles=%s,permission_grants=%s>" % (
+            self.username,
+            sorted(self.role_names),
+            len(self.permission_grants),
+        )
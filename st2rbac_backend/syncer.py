@@ -19,36 +19,137 @@ Module for syncing RBAC definitions in the database with the ones from the files
 
 from __future__ import absolute_import
 
-import six
+import json
+import hashlib
 
 from itertools import chain
 
-if six.PY3:
-    from itertools import zip_longest as izip_longest  # pylint: disable=no-name-in-module
-else:
-    from itertools import izip_longest  # pylint: disable=no-name-in-module
-
 from collections import defaultdict
+from collections import OrderedDict
 
-from mongoengine.queryset.visitor import Q
+from oslo_config import cfg
 
 from st2common import log as logging
 from st2common.models.db.auth import UserDB
 from st2common.models.db.rbac import UserRoleAssignmentDB
-from st2common.persistence.auth import User
+from st2common.models.db.rbac import GroupToRoleMappingDB
 from st2common.persistence.rbac import Role
 from st2common.persistence.rbac import UserRoleAssignment
 from st2common.persistence.rbac import PermissionGrant
-from st2common.persistence.rbac import GroupToRoleMapping
 from st2common.rbac.backends.base import BaseRBACRemoteGroupToRoleSyncer
+from st2common.util import date as date_utils
 from st2common.util.uid import parse_uid
 
+from st2rbac_backend import generation
+from st2rbac_backend import invalidation
+from st2rbac_backend import mapping_index
+from st2rbac_backend import timings
+from st2rbac_backend.models import UserRemoteGroupsFingerprintDB
 from st2rbac_backend.service import RBACService as rbac_service
 
 
 LOG = logging.getLogger(__name__)
 
-__all__ = ["RBACDefinitionsDBSyncer", "RBACRemoteGroupToRoleSyncer"]
+__all__ = [
+    "RBACDefinitionsDBSyncer",
+    "RBACRemoteGroupToRoleSyncer",
+    "get_role_definition_hash",
+    "has_changes",
+]
+
+
+def get_role_definition_hash(name, description, permission_grants):
+    """
+    Return stable content hash of a role definition.
+
+    The same hash is computed for the role definition loaded from disk and for the role which is
+    stored in the database and it doesn't depend on the order of permission grants and permission
+    types.
+
+    :param permission_grants: A list of permission grant dictionaries with "resource_uid" and
+                              "permission_types" keys.
+    :type permission_grants: ``list`` of ``dict``
+
+    :rtype: ``str``
+    """
+    permission_grants = [
+        [
+            permission_grant.get("resource_uid", None),
+            sorted(permission_grant.get("permission_types", None) or []),
+        ]
+        for permission_grant in permission_grants
+    ]
+    definition = {
+        "name": name,
+        "description": description,
+        "permission_grants": sorted(permission_grants, key=lambda item: json.dumps(item)),
+    }
+
+    definition = json.dumps(definition, sort_keys=True)
+    return hashlib.sha256(definition.encode("utf-8")).hexdigest()
+
+
+def _get_group_to_role_map_key(group_to_role_map_db):
+    return (
+        group_to_role_map_db.group,
+        list(group_to_role_map_db.roles),
+        group_to_role_map_db.enabled,
+        group_to_role_map_db.description,
+        group_to_role_map_db.source,
+    )
+
+
+def has_changes(result):
+    """
+    Return True if the provided sync result contains at least one created, updated or removed
+    role, role assignment or group to role mapping.
+
+    :param result: Result as returned by RBACDefinitionsDBSyncer.sync (it can also only contain
+                   some of the "roles", "role_assignments" and "group_to_role_maps" keys).
+    :type result: ``dict``
+
+    :rtype: ``bool``
+    """
+    roles_result = result.get("roles", None) or []
+    role_assignments_result = result.get("role_assignments", None) or {}
+    group_to_role_maps_result = result.get("group_to_role_maps", None) or []
+
+    if any(roles_result) or any(group_to_role_maps_result):
+        return True
+
+    for user_result in role_assignments_result.values():
+        # Result for each user is a (role assignments to create, role assignments to delete) tuple
+        if user_result[0] or user_result[1]:
+            return True
+
+    return False
+
+
+def _get_remote_groups_fingerprint(groups, mapping_dbs, existing_role_names):
+    """
+    Return fingerprint of the user groups, group to role mappings for those groups and the mapped
+    roles which exist in the database.
+
+    Existing roles are part of the fingerprint so assignments for the mapped roles which didn't
+    exist during the previous sync are created once the roles are created.
+
+    :param existing_role_names: Names of the mapped roles which exist in the database.
+    :type existing_role_names: ``list`` of ``str``
+
+    :rtype: ``str``
+    """
+    mappings = [
+        [mapping_db.group, list(mapping_db.roles), mapping_db.enabled, mapping_db.source]
+        for mapping_db in mapping_dbs
+    ]
+    data = {
+        "groups": sorted(groups),
+        "mappings": sorted(mappings, key=lambda item: json.dumps(item)),
+        "existing_roles": sorted(existing_role_names),
+    }
+
+    data = json.dumps(data, sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
 
 
 class RBACDefinitionsDBSyncer(object):
@@ -56,12 +157,23 @@ class RBACDefinitionsDBSyncer(object):
     A class which makes sure that the role definitions and user role assignments in the database
     match ones specified in the role definition files.
 
-    The class works by simply deleting all the obsolete roles (either removed or updated) and
-    creating new roles (either new roles or one which have been updated).
+    The class works by diffing the definitions on disk against the ones in the database. Roles
+    are compared using a content hash of their definition (see get_role_definition_hash):
 
-    Note #1: Our current datastore doesn't support transactions or similar which means that with
-    the current data model there is a short time frame during sync when the definitions inside the
-    DB are out of sync with the ones in the file.
+    * roles which have been removed are deleted together with their permission grants
+    * roles which definition has changed are swapped in place using
+      rbac_service.update_roles_with_grants (new grants are inserted first, then the role
+      document is updated with a single atomic write and only then the old grants are removed)
+    * new roles are created
+    * roles which definition hasn't changed are skipped
+
+    User role assignments and group to role mappings are diffed the same way and only the changes
+    are written.
+
+    Note #1: Our current datastore doesn't support transactions or similar which means that sync
+    is not atomic as a whole. While it runs, some of the changes can already be visible while the
+    others are not written yet (e.g. a new role exists, but it's not assigned yet). An updated
+    role itself is never missing or without grants since it's updated in place.
 
     Note #2: The operation of this class is idempotent meaning that if it's ran multiple time with
     the same dataset, the end result / outcome will be the same.
@@ -74,11 +186,21 @@ class RBACDefinitionsDBSyncer(object):
         """
         result = {}
 
-        result["roles"] = self.sync_roles(role_definition_apis)
-        result["role_assignments"] = self.sync_users_role_assignments(role_assignment_apis)
-        result["group_to_role_maps"] = self.sync_group_to_role_maps(  # pylint: disable=E1111
-            group_to_role_map_apis
-        )
+        # Note: All the changes are published as a single RBAC change event
+        with invalidation.batched_changes():
+            result["roles"] = self.sync_roles(role_definition_apis)
+            result["role_assignments"] = self.sync_users_role_assignments(role_assignment_apis)
+            result["group_to_role_maps"] = self.sync_group_to_role_maps(group_to_role_map_apis)
+
+            # Flip active generation pointer now that the complete set of definitions has been
+            # written. Generation is only flipped if something has actually changed since the flip
+            # invalidates caches in all the processes.
+            with timings.phase("generation: write"):
+                if has_changes(result):
+                    result["generation"] = generation.activate_new_generation()
+                else:
+                    LOG.debug("RBAC definitions haven't changed, keeping the active generation")
+                    result["generation"] = generation.get_active_generation()
 
         return result
 
@@ -97,39 +219,63 @@ class RBACDefinitionsDBSyncer(object):
         """
         LOG.info("Synchronizing roles...")
 
-        # Retrieve all the roles currently in the DB
-        role_dbs = rbac_service.get_all_roles(exclude_system=True)
+        with timings.phase("roles: db diff"):
+            # Retrieve all the roles currently in the DB
+            role_dbs = list(rbac_service.get_all_roles(exclude_system=True))
+            role_db_hashes = self._get_role_db_hashes(role_dbs=role_dbs)
+
+        role_api_hashes = dict(
+            [
+                (
+                    role_definition_api.name,
+                    get_role_definition_hash(
+                        name=role_definition_api.name,
+                        description=getattr(role_definition_api, "description", None),
+                        permission_grants=getattr(role_definition_api, "permission_grants", []),
+                    ),
+                )
+                for role_definition_api in role_definition_apis
+            ]
+        )
 
-        role_db_names = [role_db.name for role_db in role_dbs]
-        role_db_names = set(role_db_names)
-        role_api_names = [role_definition_api.name for role_definition_api in role_definition_apis]
-        role_api_names = set(role_api_names)
+        role_db_names = set(role_db_hashes.keys())
+        role_api_names = set(role_api_hashes.keys())
 
         # A list of new roles which should be added to the database
         new_role_names = role_api_names.difference(role_db_names)
 
-        # A list of roles which need to be updated in the database
-        updated_role_names = role_db_names.intersection(role_api_names)
+        # A list of roles which definition has changed and which need to be updated in the database
+        existing_role_names = role_db_names.intersection(role_api_names)
+        updated_role_names = set(
+            [name for name in existing_role_names if role_db_hashes[name] != role_api_hashes[name]]
+        )
+        unchanged_role_names = existing_role_names - updated_role_names
 
         # A list of roles which should be removed from the database
         removed_role_names = role_db_names - role_api_names
 
         LOG.debug("New roles: %r" % (new_role_names))
         LOG.debug("Updated roles: %r" % (updated_role_names))
+        LOG.debug("Unchanged roles: %r" % (unchanged_role_names))
         LOG.debug("Removed roles: %r" % (removed_role_names))
 
         # Build a list of roles to delete
-        role_names_to_delete = updated_role_names.union(removed_role_names)
-        role_dbs_to_delete = [
-            role_db for role_db in role_dbs if role_db.name in role_names_to_delete
-        ]
+        role_dbs_to_delete = [role_db for role_db in role_dbs if role_db.name in removed_role_names]
+
+        # Build a list of roles to update
+        role_dbs_to_update = [role_db for role_db in role_dbs if role_db.name in updated_role_names]
+        role_apis = dict(
+            [
+                (role_definition_api.name, role_definition_api)
+                for role_definition_api in role_definition_apis
+            ]
+        )
 
         # Build a list of roles to create
-        role_names_to_create = new_role_names.union(updated_role_names)
         role_apis_to_create = [
             role_definition_api
             for role_definition_api in role_definition_apis
-            if role_definition_api.name in role_names_to_create
+            if role_definition_api.name in new_role_names
         ]
 
         ########
@@ -142,7 +288,8 @@ class RBACDefinitionsDBSyncer(object):
             role_ids_to_delete.append(role_db.id)
 
         LOG.debug("Deleting %s stale roles" % (len(role_ids_to_delete)))
-        Role.query(id__in=role_ids_to_delete, system=False).delete()
+        with timings.phase("roles: delete"):
+            Role.query(id__in=role_ids_to_delete, system=False).delete()
         LOG.debug("Deleted %s stale roles" % (len(role_ids_to_delete)))
 
         # Remove associated permission grants
@@ -151,50 +298,134 @@ class RBACDefinitionsDBSyncer(object):
             permission_grant_ids_to_delete.extend(role_db.permission_grants)
 
         LOG.debug("Deleting %s stale permission grants" % (len(permission_grant_ids_to_delete)))
-        PermissionGrant.query(id__in=permission_grant_ids_to_delete).delete()
+        with timings.phase("roles: delete"):
+            PermissionGrant.query(id__in=permission_grant_ids_to_delete).delete()
         LOG.debug("Deleted %s stale permission grants" % (len(permission_grant_ids_to_delete)))
 
+        if role_dbs_to_delete:
+            invalidation.notify_change(roles=[role_db.name for role_db in role_dbs_to_delete])
+
         ########
-        # 2. Add new / updated roles to the DB
+        # 2. Swap definitions of the updated roles in place
         ########
 
-        LOG.debug("Creating %s new roles" % (len(role_apis_to_create)))
-
-        # Create new roles
-        created_role_dbs = []
-        for role_api in role_apis_to_create:
-            role_db = rbac_service.create_role(name=role_api.name, description=role_api.description)
+        # Note: Role document is updated with a single atomic write after the new grants have been
+        # inserted so concurrent requests see either the old or the new definition
+        LOG.debug("Updating %s changed roles" % (len(role_dbs_to_update)))
+
+        with timings.phase("roles: update"):
+            updated_role_dbs = rbac_service.update_roles_with_grants(
+                role_dbs=role_dbs_to_update,
+                role_definitions=[
+                    self._get_role_definition(role_api=role_apis[role_db.name])
+                    for role_db in role_dbs_to_update
+                ],
+            )
 
-            # Create associated permission grants
-            permission_grants = getattr(role_api, "permission_grants", [])
-            for permission_grant in permission_grants:
-                resource_uid = permission_grant.get("resource_uid", None)
+        ########
+        # 3. Add new roles to the DB
+        ########
 
-                if resource_uid:
-                    resource_type, _ = parse_uid(resource_uid)
-                else:
-                    resource_type = None
-
-                permission_types = permission_grant["permission_types"]
-                assignment_db = rbac_service.create_permission_grant(
-                    role_db=role_db,
-                    resource_uid=resource_uid,
-                    resource_type=resource_type,
-                    permission_types=permission_types,
-                )
+        LOG.debug("Creating %s new roles" % (len(role_apis_to_create)))
 
-                role_db.permission_grants.append(str(assignment_db.id))
-            created_role_dbs.append(role_db)
+        # Create new roles and associated permission grants
+        role_definitions = [
+            self._get_role_definition(role_api=role_api) for role_api in role_apis_to_create
+        ]
+        with timings.phase("roles: create"):
+            created_role_dbs = rbac_service.create_roles_with_grants(
+                role_definitions=role_definitions
+            )
 
         LOG.debug("Created %s new roles" % (len(created_role_dbs)))
         LOG.info(
-            "Roles synchronized (%s created, %s updated, %s removed)"
-            % (len(new_role_names), len(updated_role_names), len(removed_role_names))
+            "Roles synchronized (%s created, %s changed, %s unchanged, %s removed)"
+            % (
+                len(new_role_names),
+                len(updated_role_names),
+                len(unchanged_role_names),
+                len(removed_role_names),
+            )
         )
 
-        return [created_role_dbs, role_dbs_to_delete]
+        # Note: For backward compatibility, updated roles are reported both as created (new
+        # version) and as deleted (previous version)
+        return [created_role_dbs + updated_role_dbs, role_dbs_to_delete + role_dbs_to_update]
+
+    def _get_role_definition(self, role_api):
+        """
+        Convert role definition API object to a role definition dictionary which is accepted by
+        the RBACService bulk methods.
+
+        :rtype: ``dict``
+        """
+        permission_grants = []
+
+        for permission_grant in getattr(role_api, "permission_grants", []):
+            resource_uid = permission_grant.get("resource_uid", None)
+
+            if resource_uid:
+                resource_type, _ = parse_uid(resource_uid)
+            else:
+                resource_type = None
+
+            permission_grants.append(
+                {
+                    "resource_uid": resource_uid,
+                    "resource_type": resource_type,
+                    "permission_types": permission_grant["permission_types"],
+                }
+            )
+
+        return {
+            "name": role_api.name,
+            "description": role_api.description,
+            "permission_grants": permission_grants,
+        }
+
+    def _get_role_db_hashes(self, role_dbs):
+        """
+        Compute definition hashes for the provided roles.
+
+        :rtype: ``dict``
+        """
+        permission_grant_ids = list(
+            chain.from_iterable([role_db.permission_grants for role_db in role_dbs])
+        )
+        permission_grant_dbs = PermissionGrant.query(id__in=permission_grant_ids)
+        permission_grant_dbs = dict(
+            [
+                (str(permission_grant_db.id), permission_grant_db)
+                for permission_grant_db in permission_grant_dbs
+            ]
+        )
+
+        result = {}
+        for role_db in role_dbs:
+            permission_grant_ids = [str(grant_id) for grant_id in role_db.permission_grants]
+
+            # Note: Role which references grants which don't exist in the database has no hash
+            # which means it's treated as changed and re-created
+            if not all([grant_id in permission_grant_dbs for grant_id in permission_grant_ids]):
+                result[role_db.name] = None
+                continue
+
+            permission_grants = [
+                {
+                    "resource_uid": permission_grant_dbs[grant_id].resource_uid,
+                    "permission_types": permission_grant_dbs[grant_id].permission_types,
+                }
+                for grant_id in permission_grant_ids
+            ]
+            result[role_db.name] = get_role_definition_hash(
+                name=role_db.name,
+                description=role_db.description,
+                permission_grants=permission_grants,
+            )
+
+        return result
 
-    def sync_users_role_assignments(self, role_assignment_apis):
+    def sync_users_role_assignments(self, role_assignment_apis, usernames=None):
         """
         Synchronize role assignments for all the users in the database.
 
@@ -202,6 +433,10 @@ class RBACDefinitionsDBSyncer(object):
                                       from the files.
         :type role_assignment_apis: ``list`` of :class:`UserRoleAssignmentFileFormatAPI`
 
+        :param usernames: If provided, only assignments for those users are synchronized. Other
+                          users and their assignments are left untouched.
+        :type usernames: ``list`` of ``str``
+
         :return: Dictionary with created and removed role assignments for each user.
         :rtype: ``dict``
         """
@@ -209,181 +444,320 @@ class RBACDefinitionsDBSyncer(object):
 
         LOG.info("Synchronizing users role assignments...")
 
+        batch_size = cfg.CONF.rbac.sync_batch_size
+
         # Note: We exclude remote assignments because sync tool is not supposed to manipulate
         # remote assignments
         role_assignment_dbs = rbac_service.get_all_role_assignments(include_remote=False)
+        user_dbs = UserDB.objects
+
+        if usernames is not None:
+            usernames = set(usernames)
+            role_assignment_apis = [
+                role_assignment_api
+                for role_assignment_api in role_assignment_apis
+                if role_assignment_api.username in usernames
+            ]
+            role_assignment_dbs = role_assignment_dbs.filter(user__in=list(usernames))
+            user_dbs = user_dbs.filter(name__in=list(usernames))
 
-        user_dbs = User.get_all()
+        # Verify all the referenced roles exist before making any changes
+        self._validate_role_assignment_roles_exist(role_assignment_apis=role_assignment_apis)
 
-        username_to_user_db_map = dict([(user_db.name, user_db) for user_db in user_dbs])
         username_to_role_assignment_apis_map = defaultdict(list)
-        username_to_role_assignment_dbs_map = defaultdict(list)
 
         for role_assignment_api in role_assignment_apis:
             username = role_assignment_api.username
             username_to_role_assignment_apis_map[username].append(role_assignment_api)
 
-        for role_assignment_db in role_assignment_dbs:
-            username = role_assignment_db.user
-            username_to_role_assignment_dbs_map[username].append(role_assignment_db)
-
         # Note: We process assignments for all the users (ones specified in the assignment files
         # and ones which are in the database). We want to make sure assignments are correctly
         # deleted from the database for users which existing in the database, but have no
         # assignment file on disk and for assignments for users which don't exist in the database.
-        all_usernames = (
-            list(username_to_user_db_map.keys())
-            + list(username_to_role_assignment_apis_map.keys())
-            + list(username_to_role_assignment_dbs_map.keys())
+        # Only user names are retrieved here, assignments are retrieved, compared and written in
+        # batches of users so the number of documents held in memory is bounded by the batch size.
+        with timings.phase("role assignments: db diff"):
+            all_usernames = set(username_to_role_assignment_apis_map.keys())
+            all_usernames.update(role_assignment_dbs.distinct("user"))
+            all_usernames.update(user_dbs.no_cache().batch_size(batch_size).scalar("name"))
+            all_usernames = sorted(all_usernames)
+
+        results = {}
+        created_count = 0
+        removed_count = 0
+
+        for index in range(0, len(all_usernames), batch_size):
+            usernames_batch = all_usernames[index : index + batch_size]
+
+            with timings.phase("role assignments: db diff"):
+                result = self._sync_users_role_assignments_batch(
+                    usernames=usernames_batch,
+                    username_to_role_assignment_apis_map=username_to_role_assignment_apis_map,
+                    role_assignment_dbs=role_assignment_dbs,
+                )
+
+            role_assignment_dbs_to_create = []
+            role_assignment_dbs_to_delete = []
+
+            for user_result in result.values():
+                role_assignment_dbs_to_create.extend(user_result[0])
+                role_assignment_dbs_to_delete.extend(user_result[1])
+
+            results.update(result)
+
+            # Apply the diff for this batch of users using a small number of bulk writes
+            with timings.phase("role assignments: write"):
+                rbac_service.bulk_write_role_assignments(
+                    role_assignment_dbs_to_create=role_assignment_dbs_to_create,
+                    role_assignment_dbs_to_delete=role_assignment_dbs_to_delete,
+                    batch_size=batch_size,
+                )
+
+            created_count += len(role_assignment_dbs_to_create)
+            removed_count += len(role_assignment_dbs_to_delete)
+
+        LOG.info(
+            "User role assignments synchronized (%s created, %s removed)"
+            % (created_count, removed_count)
         )
-        all_usernames = list(set(all_usernames))
+        return results
+
+    def _sync_users_role_assignments_batch(
+        self, usernames, username_to_role_assignment_apis_map, role_assignment_dbs
+    ):
+        """
+        Compute role assignments changes for a batch of users.
+
+        :param usernames: Names of the users in this batch.
+        :type usernames: ``list`` of ``str``
+
+        :param username_to_role_assignment_apis_map: Maps user name to the assignments loaded
+                                                     from the files.
+        :type username_to_role_assignment_apis_map: ``dict``
+
+        :param role_assignment_dbs: Queryset for the local role assignments which are being
+                                    synchronized.
+        :type role_assignment_dbs: :class:`mongoengine.queryset.QuerySet`
+
+        :return: Dictionary with role assignments to create and to delete for each user.
+        :rtype: ``dict``
+        """
+        username_to_role_assignment_dbs_map = defaultdict(list)
+
+        for role_assignment_db in role_assignment_dbs.filter(user__in=usernames).no_cache():
+            username = role_assignment_db.user
+            username_to_role_assignment_dbs_map[username].append(role_assignment_db)
+
+        existing_usernames = set(UserDB.objects(name__in=usernames).scalar("name"))
 
         results = {}
-        for username in all_usernames:
-            user_db = username_to_user_db_map.get(username, None)
-
-            if not user_db:
-                # Note: We allow assignments to be created for the users which don't exist in the
-                # DB yet because user creation in StackStorm is lazy (we only create UserDB) object
-                # when user first logs in.
-                user_db = UserDB(name=username)
+
+        for username in usernames:
+            # Note: Only user name is needed to sync the assignments so we don't retrieve UserDB
+            # objects from the database
+            user_db = UserDB(name=username)
+
+            if username not in existing_usernames:
+                # Note: We allow assignments to be created for the users which don't exist in
+                # the DB yet because user creation in StackStorm is lazy (we only create
+                # UserDB) object when user first logs in.
                 LOG.debug(
                     ('User "%s" doesn\'t exist in the DB, creating assignment anyway' % (username))
                 )
 
             role_assignment_apis = username_to_role_assignment_apis_map.get(username, [])
-            role_assignment_dbs = username_to_role_assignment_dbs_map.get(username, [])
+            user_role_assignment_dbs = username_to_role_assignment_dbs_map.get(username, [])
 
             # Additional safety assert to ensure we don't accidentally manipulate remote
             # assignments
-            for role_assignment_db in role_assignment_dbs:
+            for role_assignment_db in user_role_assignment_dbs:
                 assert role_assignment_db.is_remote is False
 
-            result = self._sync_user_role_assignments(
+            results[username] = self._sync_user_role_assignments(
                 user_db=user_db,
-                role_assignment_dbs=role_assignment_dbs,
+                role_assignment_dbs=user_role_assignment_dbs,
                 role_assignment_apis=role_assignment_apis,
             )
 
-            results[username] = result
-
-        LOG.info("User role assignments synchronized")
         return results
 
     def sync_group_to_role_maps(self, group_to_role_map_apis):
+        """
+        Synchronize group to role mappings in the database with the ones from disk.
+
+        Mappings are compared on (group, roles, enabled, description, source) and only the
+        changes are written to the database using a single bulk write.
+
+        :return: Created, updated and removed mappings.
+        :rtype: ``list``
+
+        :raises: ValueError if more than one mapping is defined for the same group.
+        """
         LOG.info("Synchronizing group to role maps...")
 
-        # Retrieve all the mappings currently in the db
-        group_to_role_map_dbs = rbac_service.get_all_group_to_role_maps()
+        with timings.phase("group to role maps: db diff"):
+            # Retrieve all the mappings currently in the db
+            group_to_role_map_dbs = list(rbac_service.get_all_group_to_role_maps())
+            group_to_existing_map_db = dict([(db.group, db) for db in group_to_role_map_dbs])
 
-        # 1. Delete all the existing mappings in the db
-        group_to_role_map_to_delete = []
-        for group_to_role_map_db in group_to_role_map_dbs:
-            group_to_role_map_to_delete.append(group_to_role_map_db.id)
+        group_to_role_map_dbs_to_create = []
+        group_to_role_map_dbs_to_update = []
 
-        GroupToRoleMapping.query(id__in=group_to_role_map_to_delete).delete()
+        # Maps group name to the file the mapping for that group is defined in
+        groups = {}
 
-        # 2. Insert all mappings read from disk
         for group_to_role_map_api in group_to_role_map_apis:
-            source = getattr(group_to_role_map_api, "file_path", None)
-            rbac_service.create_group_to_role_map(
+            group_to_role_map_db = GroupToRoleMappingDB(
                 group=group_to_role_map_api.group,
                 roles=group_to_role_map_api.roles,
                 description=group_to_role_map_api.description,
                 enabled=group_to_role_map_api.enabled,
-                source=source,
+                source=getattr(group_to_role_map_api, "file_path", None),
             )
 
-        LOG.info("Group to role map definitions synchronized.")
+            # Note: Nothing is written if there are duplicates, otherwise both mappings would end
+            # up in the create / update lists and the last write would silently win
+            if group_to_role_map_db.group in groups:
+                msg = 'Duplicate definition file found for group "%s" ("%s" and "%s")' % (
+                    group_to_role_map_db.group,
+                    groups[group_to_role_map_db.group],
+                    group_to_role_map_db.source,
+                )
+                raise ValueError(msg)
 
-    def _sync_user_role_assignments(self, user_db, role_assignment_dbs, role_assignment_apis):
-        """
-        Synchronize role assignments for a particular user.
+            groups[group_to_role_map_db.group] = group_to_role_map_db.source
 
-        :param user_db: User to synchronize the assignments for.
-        :type user_db: :class:`UserDB`
+            existing_group_to_role_map_db = group_to_existing_map_db.get(
+                group_to_role_map_db.group, None
+            )
 
-        :param role_assignment_dbs: Existing user role assignments.
-        :type role_assignment_dbs: ``list`` of :class:`UserRoleAssignmentDB`
+            if not existing_group_to_role_map_db:
+                group_to_role_map_dbs_to_create.append(group_to_role_map_db)
+                continue
 
-        :param role_assignment_apis: List of user role assignments to apply.
-        :param role_assignment_apis: ``list`` of :class:`UserRoleAssignmentFileFormatAPI`
+            existing_key = _get_group_to_role_map_key(existing_group_to_role_map_db)
 
-        :rtype: ``tuple``
-        """
-        db_roles = set([(entry.role, entry.source) for entry in role_assignment_dbs])
+            if existing_key != _get_group_to_role_map_key(group_to_role_map_db):
+                group_to_role_map_db.id = existing_group_to_role_map_db.id
+                group_to_role_map_dbs_to_update.append(group_to_role_map_db)
 
-        api_roles = [
-            list(izip_longest(entry.roles, [], fillvalue=entry.file_path))
-            for entry in role_assignment_apis
+        group_to_role_map_dbs_to_delete = [
+            db for db in group_to_role_map_dbs if db.group not in groups
         ]
 
-        api_roles = set(list(chain.from_iterable(api_roles)))
-
-        # A list of new assignments which should be added to the database
-        new_roles = api_roles.difference(db_roles)
+        with timings.phase("group to role maps: write"):
+            rbac_service.bulk_write_group_to_role_maps(
+                group_to_role_map_dbs_to_create=group_to_role_map_dbs_to_create,
+                group_to_role_map_dbs_to_update=group_to_role_map_dbs_to_update,
+                group_to_role_map_dbs_to_delete=group_to_role_map_dbs_to_delete,
+            )
 
-        # A list of assignments which need to be updated in the database
-        updated_roles = db_roles.intersection(api_roles)
+        LOG.info(
+            "Group to role map definitions synchronized (%s created, %s updated, %s removed)."
+            % (
+                len(group_to_role_map_dbs_to_create),
+                len(group_to_role_map_dbs_to_update),
+                len(group_to_role_map_dbs_to_delete),
+            )
+        )
 
-        # A list of assignments which should be removed from the database
-        removed_roles = db_roles - api_roles
+        return [
+            group_to_role_map_dbs_to_create,
+            group_to_role_map_dbs_to_update,
+            group_to_role_map_dbs_to_delete,
+        ]
 
-        LOG.debug('New assignments for user "%s": %r' % (user_db.name, new_roles))
-        LOG.debug('Updated assignments for user "%s": %r' % (user_db.name, updated_roles))
-        LOG.debug('Removed assignments for user "%s": %r' % (user_db.name, removed_roles))
+    def _validate_role_assignment_roles_exist(self, role_assignment_apis):
+        """
+        Verify that all the roles which are referenced in the provided assignments exist.
 
-        # Build a list of role assignments to delete
-        roles_to_delete = updated_roles.union(removed_roles)
+        :raises: ValueError
+        """
+        role_names = set(
+            chain.from_iterable(
+                [role_assignment_api.roles for role_assignment_api in role_assignment_apis]
+            )
+        )
+        existing_role_names = set(
+            [role_db.name for role_db in Role.query(name__in=list(role_names)).only("name")]
+        )
 
-        role_assignment_dbs_to_delete = [
-            role_assignment_db
-            for role_assignment_db in role_assignment_dbs
-            if (role_assignment_db.role, role_assignment_db.source) in roles_to_delete
-        ]
+        for role_assignment_api in role_assignment_apis:
+            for role_name in role_assignment_api.roles:
+                if role_name not in existing_role_names:
+                    msg = 'Role "%s" referenced in assignment file "%s" doesn\'t exist'
+                    raise ValueError(msg % (role_name, role_assignment_api.file_path))
 
-        for role_name, assignment_source in roles_to_delete:
-            queryset_filter = (
-                Q(user=user_db.name)
-                & Q(role=role_name)
-                & Q(source=assignment_source)
-                & (Q(is_remote=False) | Q(is_remote__exists=False))
-            )
+    def _sync_user_role_assignments(self, user_db, role_assignment_dbs, role_assignment_apis):
+        """
+        Compute role assignments changes for a particular user.
 
-            UserRoleAssignmentDB.objects(queryset_filter).delete()
+        Note: This method doesn't write anything to the database, changes for all the users are
+        applied at once by the caller.
 
-            LOG.debug(
-                'Removed role "%s" from "%s" for user "%s".'
-                % (role_name, assignment_source, user_db.name)
-            )
+        :param user_db: User to synchronize the assignments for.
+        :type user_db: :class:`UserDB`
 
-        # Build a list of roles assignments to create
-        roles_to_create = new_roles.union(updated_roles)
-        created_role_assignment_dbs = []
+        :param role_assignment_dbs: Existing user role assignments.
+        :type role_assignment_dbs: ``list`` of :class:`UserRoleAssignmentDB`
 
-        for role_name, assignment_source in roles_to_create:
-            role_db = Role.get(name=role_name)
-            if not role_db:
-                msg = 'Role "%s" referenced in assignment file "%s" doesn\'t exist'
-                raise ValueError(msg % (role_name, assignment_source))
+        :param role_assignment_apis: List of user role assignments to apply.
+        :param role_assignment_apis: ``list`` of :class:`UserRoleAssignmentFileFormatAPI`
 
-            role_assignment_api = [
-                r for r in role_assignment_apis if r.file_path == assignment_source
-            ][0]
+        :return: Role assignments to create and role assignments to delete.
+        :rtype: ``tuple``
+        """
+        # Maps (role, source) to the assignment description
+        api_roles = {}
+        for role_assignment_api in role_assignment_apis:
             description = getattr(role_assignment_api, "description", None)
 
-            assignment_db = rbac_service.assign_role_to_user(
-                role_db=role_db, user_db=user_db, source=assignment_source, description=description
-            )
+            for role_name in role_assignment_api.roles:
+                key = (role_name, role_assignment_api.file_path)
+                api_roles.setdefault(key, description)
 
-            created_role_assignment_dbs.append(assignment_db)
+        role_assignment_dbs_to_delete = []
+        existing_roles = set([])
 
-            LOG.debug(
-                'Assigned role "%s" from "%s" for user "%s".'
-                % (role_name, assignment_source, user_db.name)
+        for role_assignment_db in role_assignment_dbs:
+            key = (role_assignment_db.role, role_assignment_db.source)
+
+            # Assignments which have been removed, which description has changed and duplicated
+            # assignments are removed
+            if (
+                key not in api_roles
+                or key in existing_roles
+                or role_assignment_db.description != api_roles[key]
+            ):
+                role_assignment_dbs_to_delete.append(role_assignment_db)
+                continue
+
+            existing_roles.add(key)
+
+        role_assignment_dbs_to_create = []
+        for (role_name, assignment_source), description in sorted(api_roles.items()):
+            if (role_name, assignment_source) in existing_roles:
+                continue
+
+            role_assignment_db = UserRoleAssignmentDB(
+                user=user_db.name,
+                role=role_name,
+                source=assignment_source,
+                description=description,
+                is_remote=False,
             )
+            role_assignment_dbs_to_create.append(role_assignment_db)
 
-        return (created_role_assignment_dbs, role_assignment_dbs_to_delete)
+        LOG.debug(
+            'New assignments for user "%s": %r'
+            % (user_db.name, [(r.role, r.source) for r in role_assignment_dbs_to_create])
+        )
+        LOG.debug(
+            'Removed assignments for user "%s": %r'
+            % (user_db.name, [(r.role, r.source) for r in role_assignment_dbs_to_delete])
+        )
+
+        return (role_assignment_dbs_to_create, role_assignment_dbs_to_delete)
 
 
 class RBACRemoteGroupToRoleSyncer(BaseRBACRemoteGroupToRoleSyncer):
@@ -403,6 +777,11 @@ class RBACRemoteGroupToRoleSyncer(BaseRBACRemoteGroupToRoleSyncer):
         :return: A list of mappings which have been created.
         :rtype: ``list`` of :class:`UserRoleAssignmentDB`
         """
+        # Note: All the changes are published as a single RBAC change event
+        with invalidation.batched_changes():
+            return self._sync(user_db=user_db, groups=groups)
+
+    def _sync(self, user_db, groups):
         groups = list(set(groups))
 
         extra = {"user_db": user_db, "groups": groups}
@@ -410,88 +789,111 @@ class RBACRemoteGroupToRoleSyncer(BaseRBACRemoteGroupToRoleSyncer):
             'Synchronizing remote role assignments for user "%s"' % (str(user_db)), extra=extra
         )
 
-        # 1. Retrieve group to role mappings for the provided groups
-        all_mapping_dbs = GroupToRoleMapping.query(group__in=groups)
+        # 1. Retrieve group to role mappings for the provided groups from the in-process index
+        index = mapping_index.get_group_to_role_map_index()
+        all_mapping_dbs = index.get_mappings(groups=groups)
+        # Note: Assignments for the mappings which are disabled are removed
         enabled_mapping_dbs = [mapping_db for mapping_db in all_mapping_dbs if mapping_db.enabled]
-        disabled_mapping_dbs = [
-            mapping_db for mapping_db in all_mapping_dbs if not mapping_db.enabled
-        ]
 
         if not all_mapping_dbs:
             LOG.debug('No group to role mappings found for user "%s"' % (str(user_db)), extra=extra)
 
-        # 2. Remove all the existing remote role assignments
+        # Resolve all the mapped roles with a single query
+        role_names = list(
+            set(chain.from_iterable([mapping_db.roles for mapping_db in enabled_mapping_dbs]))
+        )
+        if role_names:
+            existing_role_names = set(
+                [role_db.name for role_db in Role.query(name__in=role_names).only("name")]
+            )
+        else:
+            existing_role_names = set([])
+
+        # 2. Short-circuit if neither the groups, the mappings nor the mapped roles which exist
+        # have changed since the last sync
+        fingerprint = _get_remote_groups_fingerprint(
+            groups=groups,
+            mapping_dbs=all_mapping_dbs,
+            existing_role_names=existing_role_names,
+        )
+        fingerprint_db = UserRemoteGroupsFingerprintDB.objects(user=user_db.name).first()
+
+        if fingerprint_db and fingerprint_db.fingerprint == fingerprint:
+            LOG.debug(
+                'Groups and mappings for user "%s" haven\'t changed, skipping sync'
+                % (str(user_db)),
+                extra=extra,
+            )
+            return ([], [])
+
+        # 3. Remove remote role assignments which don't match any enabled mapping anymore
         remote_assignment_dbs = UserRoleAssignment.query(user=user_db.name, is_remote=True)
 
-        existing_role_names = [assignment_db.role for assignment_db in remote_assignment_dbs]
-        existing_role_names = set(existing_role_names)
-        current_role_names = set([])
+        # Maps (role, source) of the desired remote assignments to the mapping which grants it
+        mapping_dbs_by_assignment = OrderedDict()
+        for mapping_db in enabled_mapping_dbs:
+            for role_name in mapping_db.roles:
+                mapping_dbs_by_assignment.setdefault((role_name, mapping_db.source), mapping_db)
 
-        for mapping_db in all_mapping_dbs:
-            for role in mapping_db.roles:
-                current_role_names.add(role)
+        existing_assignments = set([])
+        role_assignment_dbs_to_delete = []
 
-        # A list of new role assignments which should be added to the database
-        new_role_names = current_role_names.difference(existing_role_names)
+        for role_assignment_db in remote_assignment_dbs:
+            key = (role_assignment_db.role, role_assignment_db.source)
 
-        # A list of role assignments which need to be updated in the database
-        updated_role_names = existing_role_names.intersection(current_role_names)
+            if key not in mapping_dbs_by_assignment or key in existing_assignments:
+                role_assignment_dbs_to_delete.append(role_assignment_db)
+                continue
 
-        # A list of role assignments which should be removed from the database
-        removed_role_names = existing_role_names - new_role_names
+            existing_assignments.add(key)
 
-        # Also remove any assignments for mappings which are disabled in the database
-        for mapping_db in disabled_mapping_dbs:
-            for role in mapping_db.roles:
-                removed_role_names.add(role)
+        LOG.debug(
+            "Removed role assignments: %r"
+            % ([(r.role, r.source) for r in role_assignment_dbs_to_delete])
+        )
 
-        LOG.debug("New role assignments: %r" % (new_role_names))
-        LOG.debug("Updated role assignments: %r" % (updated_role_names))
-        LOG.debug("Removed role assignments: %r" % (removed_role_names))
+        if role_assignment_dbs_to_delete:
+            role_assignment_ids = [
+                role_assignment_db.id for role_assignment_db in role_assignment_dbs_to_delete
+            ]
+            UserRoleAssignment.query(id__in=role_assignment_ids).delete()
+            invalidation.notify_change(users=[user_db.name])
 
-        # Build a list of role assignments to delete
-        role_names_to_delete = updated_role_names.union(removed_role_names)
-        role_assignment_dbs_to_delete = [
-            role_assignment_db
-            for role_assignment_db in remote_assignment_dbs
-            if role_assignment_db.role in role_names_to_delete
+        # 4. Create missing role assignments for all the current groups
+        assignments_to_create = [
+            key for key in mapping_dbs_by_assignment.keys() if key not in existing_assignments
         ]
 
-        UserRoleAssignment.query(
-            user=user_db.name, role__in=role_names_to_delete, is_remote=True
-        ).delete()
+        role_assignment_dbs_to_create = []
+        for role_name, source in assignments_to_create:
+            mapping_db = mapping_dbs_by_assignment[(role_name, source)]
+
+            if role_name not in existing_role_names:
+                # Gracefully skip assignment for role which doesn't exist in the db
+                extra["mapping_db"] = mapping_db
+                LOG.info(
+                    'Role with name "%s" for mapping "%s" not found, skipping assignment.'
+                    % (role_name, str(mapping_db)),
+                    extra=extra,
+                )
+                continue
 
-        # 3. Create role assignments for all the current groups
-        created_assignments_dbs = []
-        for mapping_db in enabled_mapping_dbs:
-            extra["mapping_db"] = mapping_db
+            description = (
+                "Automatic role assignment based on the remote user membership in "
+                'group "%s"' % (mapping_db.group)
+            )
+            role_assignment_db = UserRoleAssignmentDB(
+                user=user_db.name,
+                role=role_name,
+                source=source,
+                description=description,
+                is_remote=True,
+            )
+            role_assignment_dbs_to_create.append(role_assignment_db)
 
-            for role_name in mapping_db.roles:
-                role_db = rbac_service.get_role_by_name(name=role_name)
-
-                if not role_db:
-                    # Gracefully skip assignment for role which doesn't exist in the db
-                    LOG.info(
-                        'Role with name "%s" for mapping "%s" not found, skipping assignment.'
-                        % (role_name, str(mapping_db)),
-                        extra=extra,
-                    )
-                    continue
-
-                description = (
-                    "Automatic role assignment based on the remote user membership in "
-                    'group "%s"' % (mapping_db.group)
-                )
-                assignment_db = rbac_service.assign_role_to_user(
-                    role_db=role_db,
-                    user_db=user_db,
-                    description=description,
-                    is_remote=True,
-                    source=mapping_db.source,
-                    ignore_already_exists_error=True,
-                )
-                assert assignment_db.is_remote is True
-                created_assignments_dbs.append(assignment_db)
+        created_assignments_dbs = rbac_service.bulk_upsert_role_assignments(
+            role_assignment_dbs=role_assignment_dbs_to_create
+        )
 
         LOG.debug(
             'Created %s new remote role assignments for user "%s"'
@@ -499,4 +901,11 @@ class RBACRemoteGroupToRoleSyncer(BaseRBACRemoteGroupToRoleSyncer):
             extra=extra,
         )
 
+        # 5. Store fingerprint so subsequent syncs with the same groups and mappings are no-op
+        UserRemoteGroupsFingerprintDB.objects(user=user_db.name).update_one(
+            upsert=True,
+            set__fingerprint=fingerprint,
+            set__updated_at=date_utils.get_datetime_utc_now(),
+        )
+
         return (created_assignments_dbs, role_assignment_dbs_to_delete)
@@ -0,0 +1,186 @@
+# Copyright 2020 The StackStorm Authors
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module for recording wall time and number of database operations of the RBAC definitions apply
+phases (file discovery, parsing, validation, database diff and writes).
+
+Phases are only recorded while a recorder is active (see start_recording), otherwise phase()
+is a cheap no-op. Nested phases are all recorded, so time and operations of the inner phase are
+also included in the outer one.
+"""
+
+from __future__ import absolute_import
+
+import time
+import contextlib
+from collections import OrderedDict
+
+from pymongo import monitoring
+
+__all__ = [
+    "PhaseRecorder",
+    "phase",
+    "timed_iter",
+    "start_recording",
+    "stop_recording",
+    "register_query_counter",
+]
+
+_RECORDER = None
+_QUERY_COUNTER_REGISTERED = False
+
+
+class PhaseRecorder(object):
+    """
+    Class which records wall time and number of database operations for each phase.
+    """
+
+    def __init__(self, timer=time.time):
+        self._timer = timer
+
+        # Maps phase name to a dict with "time", "calls" and "queries" keys
+        self.phases = OrderedDict()
+        self._active_phases = []
+
+    def start_phase(self, name):
+        self.phases.setdefault(name, {"time": 0.0, "calls": 0, "queries": 0})
+        self._active_phases.append((name, self._timer()))
+
+    def stop_phase(self):
+        name, start_time = self._active_phases.pop()
+
+        stats = self.phases[name]
+        stats["time"] += self._timer() - start_time
+        stats["calls"] += 1
+
+    def count_query(self):
+        for name in set([name for name, _ in self._active_phases]):
+            self.phases[name]["queries"] += 1
+
+    def format_report(self, count_queries=False):
+        """
+        Return human readable report of all the recorded phases.
+
+        :rtype: ``str``
+        """
+        name_width = max([len(name) for name in self.phases.keys()] + [len("Phase")])
+
+        header = "%s  %12s" % ("Phase".ljust(name_width), "Time (s)")
+        if count_queries:
+            header += "  %10s" % ("Queries")
+
+        lines = [header]
+        for name, stats in self.phases.items():
+            line = "%s  %12.4f" % (name.ljust(name_width), stats["time"])
+            if count_queries:
+                line += "  %10s" % (stats["queries"])
+
+            lines.append(line)
+
+        return "\n".join(lines)
+
+
+class QueryCounter(monitoring.CommandListener):
+    """
+    pymongo command listener which attributes each database command to the active phases.
+    """
+
+    def started(self, event):
+        recorder = _RECORDER
+
+        if recorder is not None:
+            recorder.count_query()
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    Context manager which records wall time and number of database operations of the wrapped
+    block under the provided phase name.
+    """
+    recorder = _RECORDER
+
+    if recorder is None:
+        yield
+        return
+
+    recorder.start_phase(name)
+    try:
+        yield
+    finally:
+        recorder.stop_phase()
+
+
+def timed_iter(name, iterable):
+    """
+    Wrap the provided iterable and record time spent retrieving each item under the provided
+    phase name.
+    """
+    iterator = iter(iterable)
+
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+
+        yield item
+
+
+def start_recording(recorder=None):
+    """
+    Start recording phases.
+
+    :rtype: :class:`PhaseRecorder`
+    """
+    global _RECORDER
+
+    _RECORDER = recorder or PhaseRecorder()
+    return _RECORDER
+
+
+def stop_recording():
+    """
+    Stop recording phases.
+
+    :return: Recorder with the recorded phases.
+    :rtype: :class:`PhaseRecorder`
+    """
+    global _RECORDER
+
+    recorder = _RECORDER
+    _RECORDER = None
+    return recorder
+
+
+def register_query_counter():
+    """
+    Register pymongo command listener which counts database operations.
+
+    Note: Listener needs to be registered before the database connection is established.
+    """
+    global _QUERY_COUNTER_REGISTERED
+
+    if not _QUERY_COUNTER_REGISTERED:
+        monitoring.register(QueryCounter())
+        _QUERY_COUNTER_REGISTERED = True
@@ -32,6 +32,7 @@ from st2common.util import action_db as action_utils
 from st2common.rbac.backends import get_rbac_backend
 from st2common.rbac.backends.base import BaseRBACUtils
 
+from st2rbac_backend import request_scope
 from st2rbac_backend.service import RBACService as rbac_service
 
 __all__ = ["RBACUtils"]
@@ -198,12 +199,13 @@ class RBACUtils(BaseRBACUtils):
 
         :rtype: ``bool``
         """
-        is_system_admin = RBACUtils.user_is_system_admin(user_db=user_db)
-        if is_system_admin:
+        if not cfg.CONF.rbac.enable:
             return True
 
-        is_admin = RBACUtils.user_has_role(user_db=user_db, role=SystemRole.ADMIN)
-        if is_admin:
+        # Note: We retrieve user roles only once and check for both of the roles
+        user_role_names = RBACUtils._get_user_role_names(user_db=user_db)
+
+        if SystemRole.SYSTEM_ADMIN in user_role_names or SystemRole.ADMIN in user_role_names:
             return True
 
         return False
@@ -236,9 +238,7 @@ class RBACUtils(BaseRBACUtils):
         if not cfg.CONF.rbac.enable:
             return True
 
-        user_role_dbs = rbac_service.get_roles_for_user(user_db=user_db)
-        user_role_names = [role_db.name for role_db in user_role_dbs]
-
+        user_role_names = RBACUtils._get_user_role_names(user_db=user_db)
         return role in user_role_names
 
     @staticmethod
@@ -249,8 +249,7 @@ class RBACUtils(BaseRBACUtils):
 
         :rtype: ``bool``
         """
-        user_role_dbs = rbac_service.get_roles_for_user(user_db=user_db)
-        user_role_names = [role_db.name for role_db in user_role_dbs]
+        user_role_names = RBACUtils._get_user_role_names(user_db=user_db)
 
         if (
             SystemRole.SYSTEM_ADMIN in user_role_names
@@ -269,11 +268,21 @@ class RBACUtils(BaseRBACUtils):
         if not cfg.CONF.rbac.enable:
             return True
 
+        cache_key = request_scope.get_decision_cache_key(
+            user_db=user_db, permission_type=permission_type
+        )
+        result = request_scope.get_memoized_decision(cache_key)
+
+        if result is not None:
+            return result
+
         # TODO Verify permission type for the provided resource type
         rbac_backend = get_rbac_backend()
 
         resolver = rbac_backend.get_resolver_for_permission_type(permission_type=permission_type)
         result = resolver.user_has_permission(user_db=user_db, permission_type=permission_type)
+
+        request_scope.set_memoized_decision(cache_key, result)
         return result
 
     @staticmethod
@@ -301,6 +310,14 @@ class RBACUtils(BaseRBACUtils):
         if not cfg.CONF.rbac.enable:
             return True
 
+        cache_key = request_scope.get_decision_cache_key(
+            user_db=user_db, permission_type=permission_type, resource_db=resource_db
+        )
+        result = request_scope.get_memoized_decision(cache_key)
+
+        if result is not None:
+            return result
+
         # TODO Verify permission type for the provided resource type
         rbac_backend = get_rbac_backend()
 
@@ -308,6 +325,8 @@ class RBACUtils(BaseRBACUtils):
         result = resolver.user_has_resource_db_permission(
             user_db=user_db, resource_db=resource_db, permission_type=permission_type
         )
+
+        request_scope.set_memoized_decision(cache_key, result)
         return result
 
     @staticmethod
@@ -359,3 +378,21 @@ class RBACUtils(BaseRBACUtils):
             return True
 
         return False
+
+    @staticmethod
+    def _get_user_role_names(user_db):
+        """
+        Retrieve names of all the roles assigned to the provided user.
+
+        If a request scope is active, role names are served from the user permissions snapshot
+        which is shared by all the checks performed inside that scope.
+
+        :rtype: ``list`` or ``frozenset`` of ``str``
+        """
+        if request_scope.get_current_request_scope() is not None:
+            permissions_snapshot = request_scope.get_permissions_snapshot_for_user(user_db=user_db)
+            return permissions_snapshot.role_names
+
+        user_role_dbs = rbac_service.get_roles_for_user(user_db=user_db)
+        user_role_names = [role_db.name for role_db in user_role_dbs]
+        return user_role_names
@@ -0,0 +1,428 @@
+# Copyright 2020 The StackStorm Authors
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module containing the watch mode of st2-apply-rbac-definitions.
+
+In the watch mode, RBAC definitions directory is polled for changes. Once a burst of changes
+settles down, only the files which have changed since the last successful apply are parsed again
+and merged into the in-memory definitions, and only the definitions which have changed are
+synchronized with the database.
+
+If applying the changes fails (e.g. a definition file is invalid), it's retried with an
+exponential backoff until it succeeds or the directory changes again.
+"""
+
+from __future__ import absolute_import
+
+import os
+import time
+
+from st2common import log as logging
+
+from st2rbac_backend import generation
+from st2rbac_backend import invalidation
+from st2rbac_backend.syncer import has_changes
+
+__all__ = ["RBACDefinitionsWatcher"]
+
+LOG = logging.getLogger(__name__)
+
+# Section of the definitions -> name of the definition used in the error messages
+DEFINITION_TYPE_NAMES = {
+    "roles": "role",
+    "role_assignments": "user",
+    "group_to_role_maps": "group",
+}
+
+
+class RBACDefinitionsWatcher(object):
+    """
+    Class which watches RBAC definitions directory and applies changes to the database.
+    """
+
+    def __init__(
+        self,
+        loader,
+        syncer,
+        path,
+        interval=1.0,
+        debounce=0.5,
+        max_retry_interval=60.0,
+        sleep=time.sleep,
+    ):
+        """
+        :param loader: Loader used to load the definitions.
+        :type loader: :class:`RBACDefinitionsLoader`
+
+        :param syncer: Syncer used to apply the changes.
+        :type syncer: :class:`RBACDefinitionsDBSyncer`
+
+        :param path: Path to the RBAC definitions directory.
+        :type path: ``str``
+
+        :param interval: How often (in seconds) to check the directory for changes.
+        :type interval: ``float``
+
+        :param debounce: How long (in seconds) the directory needs to stay unchanged before the
+                         changes are applied.
+        :type debounce: ``float``
+
+        :param max_retry_interval: Maximum time (in seconds) between retries of a failed apply.
+        :type max_retry_interval: ``float``
+        """
+        self._loader = loader
+        self._syncer = syncer
+        self._path = path
+        self._interval = interval
+        self._debounce = debounce
+        self._max_retry_polls = max(1, int(max_retry_interval / interval))
+        self._sleep = sleep
+
+        # Last successfully applied directory snapshot
+        self._snapshot = None
+
+        # Maps file path to a list of (section, name, definition) tuples for all the loaded files
+        self._files = None
+
+        # Enabled definitions (same structure as returned by RBACDefinitionsLoader.load())
+        self._definitions = None
+
+        # Maps section to a dict which maps definition name to the file which defines it
+        self._owners = None
+
+        # Snapshot which has failed to apply and number of polls until it's retried
+        self._failed_snapshot = None
+        self._retry_polls = 0
+        self._retry_polls_left = 0
+
+        self._running = False
+
+    def run(self):
+        """
+        Apply all the definitions and then keep applying the changes until stop() is called.
+
+        If applying the definitions fails (e.g. a definition file is invalid), the error is logged
+        once and the apply is retried with an exponential backoff (capped at max_retry_interval)
+        until it succeeds. A new change in the directory is applied right away.
+        """
+        self._running = True
+
+        snapshot = self._get_snapshot()
+        self._apply_snapshot(snapshot)
+
+        while self._running:
+            self._sleep(self._interval)
+
+            snapshot = self._get_snapshot()
+            if snapshot == self._snapshot:
+                continue
+
+            if snapshot == self._failed_snapshot:
+                self._retry_polls_left -= 1
+
+                if self._retry_polls_left <= 0:
+                    self._apply_snapshot(snapshot)
+
+                continue
+
+            # Wait for a burst of changes to settle down
+            while self._running:
+                self._sleep(self._debounce)
+
+                new_snapshot = self._get_snapshot()
+                if new_snapshot == snapshot:
+                    break
+
+                snapshot = new_snapshot
+
+            self._apply_snapshot(snapshot)
+
+    def stop(self):
+        self._running = False
+
+    def apply(self, changed_file_paths=None):
+        """
+        Load the definitions and synchronize the ones which have changed since the last run with
+        the database.
+
+        :param changed_file_paths: Paths to the files which have been added, changed or removed
+                                   since the last run. If not provided, all the files are loaded.
+        :type changed_file_paths: ``list`` of ``str``
+
+        :return: Sync result or None if nothing has changed.
+        :rtype: ``dict``
+        """
+        if self._files is None or changed_file_paths is None:
+            return self._apply_all()
+
+        # Note: Removed files are not returned by the loader
+        loaded_files = self._loader.load_definition_files(changed_file_paths)
+
+        files = dict(self._files)
+        definitions = dict([(key, dict(value)) for key, value in self._definitions.items()])
+        owners = dict([(key, dict(value)) for key, value in self._owners.items()])
+        previous_definitions = self._definitions
+
+        # 1. Remove definitions from the changed files
+        changed_keys = set([])
+        for file_path in changed_file_paths:
+            for section, name, _ in files.pop(file_path, []):
+                del owners[section][name]
+                definitions[section].pop(name, None)
+                changed_keys.add((section, name))
+
+        # 2. Add definitions from the changed files
+        for file_path in changed_file_paths:
+            if file_path not in loaded_files:
+                continue
+
+            files[file_path] = loaded_files[file_path]
+            _add_file_definitions(
+                definitions=definitions,
+                owners=owners,
+                file_path=file_path,
+                entries=loaded_files[file_path],
+            )
+            changed_keys.update([(section, name) for section, name, _ in loaded_files[file_path]])
+
+        roles_changed = _get_changed_names(
+            previous_definitions, definitions, changed_keys, section="roles"
+        )
+        usernames = _get_changed_names(
+            previous_definitions, definitions, changed_keys, section="role_assignments"
+        )
+        mappings_changed = _get_changed_names(
+            previous_definitions, definitions, changed_keys, section="group_to_role_maps"
+        )
+
+        role_definition_apis = list(definitions["roles"].values())
+        role_assignment_apis = list(definitions["role_assignments"].values())
+        group_to_role_map_apis = list(definitions["group_to_role_maps"].values())
+
+        # Note: Assignments which reference a changed role are also re-synchronized so the
+        # references are validated again (e.g. role has been removed, but it's still assigned)
+        if roles_changed:
+            usernames.update(
+                [
+                    role_assignment_api.username
+                    for role_assignment_api in role_assignment_apis
+                    if roles_changed.intersection(role_assignment_api.roles)
+                ]
+            )
+
+        if not roles_changed and not usernames and not mappings_changed:
+            LOG.debug("RBAC definitions haven't changed")
+            self._set_state(files=files, definitions=definitions, owners=owners)
+            return None
+
+        LOG.info(
+            "Applying RBAC definitions changes (%s changed files, %s roles, %s users, %s mappings "
+            "changed)"
+            % (len(changed_file_paths), len(roles_changed), len(usernames), len(mappings_changed))
+        )
+
+        result = {}
+
+        with invalidation.batched_changes():
+            if roles_changed:
+                result["roles"] = self._syncer.sync_roles(role_definition_apis)
+
+            if usernames:
+                result["role_assignments"] = self._syncer.sync_users_role_assignments(
+                    role_assignment_apis, usernames=usernames
+                )
+
+            if mappings_changed:
+                result["group_to_role_maps"] = self._syncer.sync_group_to_role_maps(
+                    group_to_role_map_apis
+                )
+
+            # Note: Generation flip invalidates caches in all the processes so it's only flipped
+            # if the sync has actually written something
+            if has_changes(result):
+                result["generation"] = generation.activate_new_generation()
+            else:
+                result["generation"] = generation.get_active_generation()
+
+        self._set_state(files=files, definitions=definitions, owners=owners)
+        return result
+
+    def _apply_all(self):
+        """
+        Load all the definition files and synchronize all the definitions with the database.
+
+        :rtype: ``dict``
+        """
+        files = self._loader.load_definition_files(self._loader.get_definition_file_paths())
+
+        definitions = dict([(section, {}) for section in DEFINITION_TYPE_NAMES.keys()])
+        owners = dict([(section, {}) for section in DEFINITION_TYPE_NAMES.keys()])
+
+        for file_path, entries in files.items():
+            _add_file_definitions(
+                definitions=definitions, owners=owners, file_path=file_path, entries=entries
+            )
+
+        result = self._syncer.sync(
+            role_definition_apis=list(definitions["roles"].values()),
+            role_assignment_apis=list(definitions["role_assignments"].values()),
+            group_to_role_map_apis=list(definitions["group_to_role_maps"].values()),
+        )
+
+        self._set_state(files=files, definitions=definitions, owners=owners)
+        return result
+
+    def _set_state(self, files, definitions, owners):
+        # Note: State is only updated once the changes have been applied so a failed apply is
+        # retried against the last successfully applied definitions
+        self._files = files
+        self._definitions = definitions
+        self._owners = owners
+
+    def _apply_snapshot(self, snapshot):
+        """
+        Apply the changes between the last applied and the provided directory snapshot and mark
+        the provided snapshot as applied if it succeeds.
+
+        :rtype: ``bool``
+        """
+        changed_file_paths = _get_changed_file_paths(self._snapshot, snapshot)
+
+        try:
+            self.apply(changed_file_paths=changed_file_paths)
+        except Exception as e:
+            # Note: Invalid definitions shouldn't kill the watcher. Snapshot is not marked as
+            # applied so apply is retried until it succeeds (e.g. the definitions are fixed or a
+            # transient database error goes away). Full error is only logged once per snapshot.
+            if snapshot != self._failed_snapshot:
+                LOG.exception("Failed to apply RBAC definitions")
+                self._failed_snapshot = snapshot
+                self._retry_polls = 1
+            else:
+                self._retry_polls = min(self._retry_polls * 2, self._max_retry_polls)
+                LOG.debug("Retry of failed RBAC definitions apply has failed again: %s" % (e))
+
+            self._retry_polls_left = self._retry_polls
+            LOG.warning(
+                "Retrying to apply RBAC definitions in %s seconds"
+                % (self._retry_polls * self._interval)
+            )
+            return False
+
+        self._snapshot = snapshot
+        self._failed_snapshot = None
+        self._retry_polls = 0
+        self._retry_polls_left = 0
+        return True
+
+    def _get_snapshot(self):
+        """
+        Return size and modification time of all the files in the definitions directory.
+
+        :rtype: ``dict``
+        """
+        snapshot = {}
+
+        for root, _, file_names in os.walk(self._path):
+            for file_name in file_names:
+                file_path = os.path.join(root, file_name)
+
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    # File has been removed in the mean time
+                    continue
+
+                snapshot[file_path] = (stat.st_size, stat.st_mtime)
+
+        return snapshot
+
+
+def _get_changed_file_paths(previous_snapshot, snapshot):
+    """
+    Return paths to the files which have been added, removed or changed between the provided
+    directory snapshots or None if there is no previous snapshot.
+
+    :rtype: ``list``
+    """
+    if previous_snapshot is None:
+        return None
+
+    file_paths = set(previous_snapshot.keys()).union(snapshot.keys())
+    return sorted(
+        [
+            file_path
+            for file_path in file_paths
+            if previous_snapshot.get(file_path, None) != snapshot.get(file_path, None)
+        ]
+    )
+
+
+def _add_file_definitions(definitions, owners, file_path, entries):
+    """
+    Add definitions from a single file to the provided definitions and owners dicts.
+
+    Disabled roles and role assignments are tracked as owned by the file, but they are not added
+    to the definitions (same as with RBACDefinitionsLoader.load()).
+    """
+    for section, name, api in entries:
+        # Note: Definitions from the changed files have already been removed so an existing owner
+        # means the definition is also defined in another file (or twice in the same bulk file)
+        owner_file_path = owners[section].get(name, None)
+
+        if owner_file_path is not None:
+            msg = 'Duplicate definition file found for %s "%s" ("%s" and "%s")' % (
+                DEFINITION_TYPE_NAMES[section],
+                name,
+                owner_file_path,
+                file_path,
+            )
+            raise ValueError(msg)
+
+        owners[section][name] = file_path
+
+        if section != "group_to_role_maps" and not getattr(api, "enabled", True):
+            LOG.debug('Skipping disabled %s "%s"' % (DEFINITION_TYPE_NAMES[section], name))
+            continue
+
+        definitions[section][name] = api
+
+
+def _get_changed_names(previous_definitions, definitions, changed_keys, section):
+    """
+    Return names of the definitions in the provided section which have been added, removed or
+    changed.
+
+    Only the definitions from the changed files (changed_keys) are compared.
+
+    :rtype: ``set``
+    """
+    result = set([])
+
+    for key_section, name in changed_keys:
+        if key_section != section:
+            continue
+
+        previous_api = previous_definitions[section].get(name, None)
+        api = definitions[section].get(name, None)
+
+        if previous_api is None and api is None:
+            continue
+
+        if previous_api is None or api is None or vars(previous_api) != vars(api):
+            result.add(name)
+
+    return result
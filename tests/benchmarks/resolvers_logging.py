@@ -0,0 +1,135 @@
+# Copyright 2020 The StackStorm Authors.
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Micro benchmark which measures per permission check overhead of the resolver debug logging.
+
+The benchmark doesn't talk to the database - permission checks are served from an in-memory user
+permissions snapshot so the numbers only reflect the resolver code path itself.
+
+It compares three modes:
+
+- "legacy" - pre-optimization PermissionsResolver._log implementation (always inspects the caller
+  frame and formats the message, even if DEBUG level is disabled), DEBUG disabled
+- "disabled" - current implementation, DEBUG disabled (production setup)
+- "enabled" - current implementation, DEBUG enabled (log records are discarded)
+
+Usage:
+
+    python -m tests.benchmarks.resolvers_logging [--iterations 100000]
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import sys
+import argparse
+import timeit
+import logging as stdlib_logging
+
+from st2common.models.db.auth import UserDB
+from st2common.models.db.pack import PackDB
+from st2common.rbac.types import PermissionType
+from st2common.rbac.types import ResourceType
+
+from st2rbac_backend import resolvers
+from st2rbac_backend.snapshot import PermissionGrantEntry
+from st2rbac_backend.snapshot import UserPermissionsSnapshot
+
+__all__ = ["main"]
+
+
+def _legacy_log(self, message, extra, level=stdlib_logging.DEBUG, **kwargs):
+    class_name = self.__class__.__name__
+    method_name = sys._getframe().f_back.f_code.co_name
+    message_prefix = "%s.%s: " % (class_name, method_name)
+    message = message_prefix + message
+
+    resolvers.LOG.log(level, message, extra=extra, **kwargs)
+
+
+class BenchmarkPackPermissionsResolver(resolvers.PackPermissionsResolver):
+    def __init__(self, permissions_snapshot):
+        super(BenchmarkPackPermissionsResolver, self).__init__()
+        self._permissions_snapshot = permissions_snapshot
+
+    def _get_permissions_snapshot(self, user_db):
+        return self._permissions_snapshot
+
+
+def _get_resolver():
+    pack_db = PackDB(ref="benchmark")
+    permission_grant = PermissionGrantEntry(
+        id="1",
+        resource_uid=pack_db.get_uid(),
+        resource_type=ResourceType.PACK,
+        permission_types=frozenset([PermissionType.PACK_VIEW]),
+    )
+    permissions_snapshot = UserPermissionsSnapshot(
+        username="benchmark", role_names=["benchmark"], permission_grants=[permission_grant]
+    )
+    resolver = BenchmarkPackPermissionsResolver(permissions_snapshot=permissions_snapshot)
+    return resolver, pack_db
+
+
+def _run(mode, iterations):
+    resolver, pack_db = _get_resolver()
+    user_db = UserDB(name="benchmark")
+
+    original_log = resolvers.PermissionsResolver._log
+    original_level = resolvers.LOG.level
+    original_handlers = resolvers.LOG.handlers[:]
+    original_propagate = resolvers.LOG.propagate
+
+    if mode == "legacy":
+        resolvers.PermissionsResolver._log = _legacy_log
+
+    resolvers.LOG.setLevel(stdlib_logging.DEBUG if mode == "enabled" else stdlib_logging.INFO)
+    resolvers.LOG.handlers = [stdlib_logging.NullHandler()]
+    resolvers.LOG.propagate = False
+
+    def check():
+        resolver.user_has_resource_db_permission(
+            user_db=user_db, resource_db=pack_db, permission_type=PermissionType.PACK_VIEW
+        )
+
+    try:
+        duration = min(timeit.repeat(check, number=iterations, repeat=3))
+    finally:
+        resolvers.PermissionsResolver._log = original_log
+        resolvers.LOG.setLevel(original_level)
+        resolvers.LOG.handlers = original_handlers
+        resolvers.LOG.propagate = original_propagate
+
+    return duration
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Resolver debug logging micro benchmark")
+    parser.add_argument("--iterations", type=int, default=100000, help="Checks per run")
+    args = parser.parse_args(argv)
+
+    for mode in ["legacy", "disabled", "enabled"]:
+        duration = _run(mode=mode, iterations=args.iterations)
+        print(
+            "%-10s %.3fs total, %.2fus per permission check"
+            % (mode, duration, (duration / args.iterations) * 1000000)
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,121 @@
+# Copyright 2020 The StackStorm Authors.
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import os
+import json
+import zlib
+import shutil
+import tempfile
+
+import unittest2
+
+from st2tests import config
+from st2tests.fixturesloader import get_fixtures_base_path
+from st2rbac_backend import bundle
+from st2rbac_backend.loader import RBACDefinitionsLoader
+
+__all__ = [
+    'RBACDefinitionsBundleTestCase'
+]
+
+
+class RBACDefinitionsBundleTestCase(unittest2.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        config.parse_args()
+
+    def setUp(self):
+        super(RBACDefinitionsBundleTestCase, self).setUp()
+
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        self.bundle_path = os.path.join(temp_dir, 'rbac.bundle')
+
+        loader = RBACDefinitionsLoader()
+        self.definitions = {
+            'roles': {
+                'role_three': loader.load_role_definition_from_file(
+                    file_path=os.path.join(get_fixtures_base_path(), 'rbac/roles/role_three.yaml'))
+            },
+            'role_assignments': {},
+            'group_to_role_maps': {}
+        }
+
+        for file_name in ['mapping_one.yaml', 'mapping_two.yaml']:
+            file_path = os.path.join(get_fixtures_base_path(), 'rbac/mappings', file_name)
+            api = loader.load_group_to_role_map_assignment_from_file(file_path=file_path)
+            self.definitions['group_to_role_maps'][api.group] = api
+
+    def test_write_and_read_bundle(self):
+        bundle.write_bundle(path=self.bundle_path, definitions=self.definitions)
+
+        loader = RBACDefinitionsLoader()
+        result = loader.load_from_bundle(bundle_path=self.bundle_path)
+
+        self.assertEqual(list(result['roles'].keys()), ['role_three'])
+        self.assertEqual(result['roles']['role_three'].permission_grants,
+                         self.definitions['roles']['role_three'].permission_grants)
+        self.assertEqual(result['role_assignments'], {})
+
+        self.assertEqual(list(result['group_to_role_maps'].keys()),
+                         list(self.definitions['group_to_role_maps'].keys()))
+        mapping_api = result['group_to_role_maps']['CN=stormers,OU=groups,DC=stackstorm,DC=net']
+        self.assertEqual(mapping_api.roles, ['role_one', 'role_two', 'role_three'])
+        self.assertEqual(mapping_api.file_path, 'mappings/mapping_two.yaml')
+        self.assertFalse(mapping_api.enabled)
+
+    def test_only_schema_attributes_are_serialized(self):
+        mapping_api = self.definitions['group_to_role_maps'][
+            'CN=stormers,OU=groups,DC=stackstorm,DC=net']
+        mapping_api.some_extra_attribute = 'foo'
+
+        bundle.write_bundle(path=self.bundle_path, definitions=self.definitions)
+
+        with open(self.bundle_path, 'rb') as fp:
+            payload = fp.read()[bundle.HEADER_SIZE:]
+
+        payload = json.loads(zlib.decompress(payload).decode('utf-8'))
+        index = payload['index']['group_to_role_maps']
+        item = payload['sections']['group_to_role_maps'][
+            index.index('CN=stormers,OU=groups,DC=stackstorm,DC=net')]
+
+        self.assertEqual(item['file_path'], 'mappings/mapping_two.yaml')
+        self.assertNotIn('file_path', item['definition'])
+        self.assertNotIn('some_extra_attribute', item['definition'])
+        self.assertEqual(item['definition']['roles'], ['role_one', 'role_two', 'role_three'])
+
+        result = bundle.read_bundle(path=self.bundle_path)
+        mapping_api = result['group_to_role_maps']['CN=stormers,OU=groups,DC=stackstorm,DC=net']
+        self.assertEqual(mapping_api.file_path, 'mappings/mapping_two.yaml')
+        self.assertFalse(hasattr(mapping_api, 'some_extra_attribute'))
+
+    def test_read_bundle_checksum_mismatch(self):
+        bundle.write_bundle(path=self.bundle_path, definitions=self.definitions)
+
+        with open(self.bundle_path, 'ab') as fp:
+            fp.write(b'corrupted')
+
+        expected_msg = 'checksum mismatch'
+        self.assertRaisesRegexp(bundle.InvalidBundleError, expected_msg, bundle.read_bundle,
+                                path=self.bundle_path)
+
+    def test_read_invalid_bundle(self):
+        with open(self.bundle_path, 'wb') as fp:
+            fp.write(b'roles: []\n' * 10)
+
+        expected_msg = 'is not a valid RBAC definitions bundle'
+        self.assertRaisesRegexp(bundle.InvalidBundleError, expected_msg, bundle.read_bundle,
+                                path=self.bundle_path)
@@ -0,0 +1,198 @@
+# Copyright 2020 The StackStorm Authors.
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import unittest2
+from oslo_config import cfg
+
+from st2tests.base import CleanDbTestCase
+from st2common.rbac.types import PermissionType
+from st2common.persistence.auth import User
+from st2common.models.db.auth import UserDB
+
+from st2rbac_backend import cache as rbac_cache
+from st2rbac_backend import generation as rbac_generation
+from st2rbac_backend.cache import LRUCache
+from st2rbac_backend.service import RBACService as rbac_service
+from st2rbac_backend.utils import RBACUtils as rbac_utils
+
+__all__ = [
+    'LRUCacheTestCase',
+    'RBACDecisionsCacheTestCase'
+]
+
+
+class MockTimer(object):
+    def __init__(self):
+        self.now = 1000
+
+    def __call__(self):
+        return self.now
+
+
+class LRUCacheTestCase(unittest2.TestCase):
+    def test_get_and_set(self):
+        cache = LRUCache(max_size=10, ttl=60)
+
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('a', 'default'), 'default')
+
+        cache.set('a', True)
+        cache.set('b', False)
+        self.assertEqual(cache.get('a'), True)
+        self.assertEqual(cache.get('b', 'default'), False)
+
+        stats = cache.get_stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['evictions'], 0)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = LRUCache(max_size=2, ttl=60)
+
+        cache.set('a', 1)
+        cache.set('b', 2)
+
+        # Mark "a" as recently used
+        self.assertEqual(cache.get('a'), 1)
+
+        cache.set('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+
+    def test_expired_entries_are_evicted(self):
+        timer = MockTimer()
+        cache = LRUCache(max_size=10, ttl=60, timer=timer)
+
+        cache.set('a', 1)
+        timer.now += 59
+        self.assertEqual(cache.get('a'), 1)
+
+        timer.now += 1
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.get_stats()['evictions'], 1)
+
+    def test_delete_matching(self):
+        cache = LRUCache(max_size=10, ttl=60)
+
+        cache.set(('user_1', 'a'), 1)
+        cache.set(('user_1', 'b'), 2)
+        cache.set(('user_2', 'a'), 3)
+
+        self.assertEqual(cache.delete_matching(lambda key, value: key[0] == 'user_1'), 2)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get(('user_2', 'a')), 3)
+
+    def test_generation_bump_invalidates_entries(self):
+        cache = LRUCache(max_size=10, ttl=60)
+
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+
+        generation = rbac_cache.get_generation()
+        self.assertEqual(rbac_cache.bump_generation(), generation + 1)
+        self.assertEqual(cache.get('a'), None)
+
+        cache.set('a', 2)
+        self.assertEqual(cache.get('a'), 2)
+
+
+class RBACDecisionsCacheTestCase(CleanDbTestCase):
+    def setUp(self):
+        super(RBACDecisionsCacheTestCase, self).setUp()
+
+        cfg.CONF.set_override(name='enable', override=True, group='rbac')
+        cfg.CONF.set_override(name='backend', override='default', group='rbac')
+        cfg.CONF.set_override(name='cache_enabled', override=True, group='rbac')
+        rbac_cache.clear_caches()
+
+        user_db = UserDB(name='cache_user')
+        self.user_db = User.add_or_update(user_db)
+
+    def tearDown(self):
+        super(RBACDecisionsCacheTestCase, self).tearDown()
+
+        cfg.CONF.set_override(name='cache_enabled', override=False, group='rbac')
+        rbac_cache.clear_caches()
+
+    def test_decisions_are_cached_and_invalidated_on_change(self):
+        # Deny decision is cached
+        result = rbac_utils.user_has_permission(user_db=self.user_db,
+                                                permission_type=PermissionType.ACTION_LIST)
+        self.assertFalse(result)
+
+        result = rbac_utils.user_has_permission(user_db=self.user_db,
+                                                permission_type=PermissionType.ACTION_LIST)
+        self.assertFalse(result)
+
+        stats = rbac_cache.get_cache_stats()
+        self.assertEqual(stats['decisions']['hits'], 1)
+        self.assertEqual(stats['decisions']['misses'], 1)
+
+        # Changing RBAC definitions invalidates cached decisions
+        role_db = rbac_service.create_role(name='cache_role')
+        rbac_service.create_permission_grant(role_db=role_db, resource_uid=None,
+                                             resource_type=None,
+                                             permission_types=[PermissionType.ACTION_LIST])
+        rbac_service.assign_role_to_user(role_db=role_db, user_db=self.user_db,
+                                         source='assignments/cache_user.yaml')
+
+        result = rbac_utils.user_has_permission(user_db=self.user_db,
+                                                permission_type=PermissionType.ACTION_LIST)
+        self.assertTrue(result)
+
+        # Allow decision is cached
+        result = rbac_utils.user_has_permission(user_db=self.user_db,
+                                                permission_type=PermissionType.ACTION_LIST)
+        self.assertTrue(result)
+
+        stats = rbac_cache.get_cache_stats()
+        self.assertEqual(stats['decisions']['hits'], 2)
+
+    def test_active_generation_change_invalidates_cached_entries(self):
+        cfg.CONF.set_override(name='generation_check_interval', override=5, group='rbac')
+        self.addCleanup(cfg.CONF.clear_override, name='generation_check_interval', group='rbac')
+
+        timer = MockTimer()
+        rbac_cache.check_active_generation(timer=timer)
+        generation = rbac_cache.get_generation()
+
+        # Definitions are synced on a different node
+        rbac_generation.activate_new_generation()
+
+        # Database is only checked once per interval
+        timer.now += 1
+        rbac_cache.check_active_generation(timer=timer)
+        self.assertEqual(rbac_cache.get_generation(), generation)
+
+        timer.now += 5
+        rbac_cache.check_active_generation(timer=timer)
+        self.assertEqual(rbac_cache.get_generation(), generation + 1)
+
+    def test_cache_is_disabled_by_default(self):
+        cfg.CONF.set_override(name='cache_enabled', override=False, group='rbac')
+        rbac_cache.clear_caches()
+
+        rbac_utils.user_has_permission(user_db=self.user_db,
+                                       permission_type=PermissionType.ACTION_LIST)
+
+        self.assertEqual(rbac_cache.get_decisions_cache(), None)
+        self.assertEqual(rbac_cache.get_cache_stats()['decisions'], None)
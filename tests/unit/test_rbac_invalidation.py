@@ -0,0 +1,159 @@
+# Copyright 2020 The StackStorm Authors.
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import mock
+from oslo_config import cfg
+
+from st2tests.base import CleanDbTestCase
+from st2common.rbac.types import PermissionType
+from st2common.persistence.auth import User
+from st2common.models.db.auth import UserDB
+
+from st2rbac_backend import cache as rbac_cache
+from st2rbac_backend import invalidation
+from st2rbac_backend import request_scope
+from st2rbac_backend.service import RBACService as rbac_service
+from st2rbac_backend.syncer import RBACRemoteGroupToRoleSyncer
+
+__all__ = [
+    'RBACChangeEventsTestCase'
+]
+
+
+class RBACChangeEventsTestCase(CleanDbTestCase):
+    def setUp(self):
+        super(RBACChangeEventsTestCase, self).setUp()
+
+        cfg.CONF.set_override(name='enable', override=True, group='rbac')
+        cfg.CONF.set_override(name='backend', override='default', group='rbac')
+        cfg.CONF.set_override(name='cache_enabled', override=True, group='rbac')
+        cfg.CONF.set_override(name='change_events_enabled', override=True, group='rbac')
+        rbac_cache.clear_caches()
+
+        # Don't talk to the message bus
+        patcher = mock.patch.object(invalidation, 'start_watcher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(invalidation, '_publish_change')
+        self.publish_change = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.users = {}
+        for name in ['user_1', 'user_2', 'user_3']:
+            self.users[name] = User.add_or_update(UserDB(name=name))
+
+        self.role_db = rbac_service.create_role(name='role_1')
+        rbac_service.assign_role_to_user(role_db=self.role_db, user_db=self.users['user_1'],
+                                         source='assignments/user_1.yaml')
+
+        self.publish_change.reset_mock()
+
+    def tearDown(self):
+        super(RBACChangeEventsTestCase, self).tearDown()
+
+        cfg.CONF.set_override(name='cache_enabled', override=False, group='rbac')
+        cfg.CONF.set_override(name='change_events_enabled', override=False, group='rbac')
+        rbac_cache.clear_caches()
+
+    def _populate_cache(self):
+        for user_db in self.users.values():
+            request_scope.get_permissions_snapshot_for_user(user_db=user_db)
+            key = request_scope.get_decision_cache_key(user_db=user_db,
+                                                       permission_type=PermissionType.ACTION_LIST)
+            request_scope.set_memoized_decision(key, False)
+
+    def _get_cached_usernames(self):
+        snapshots_cache = rbac_cache.get_permissions_snapshots_cache()
+        return set([name for name in self.users.keys() if snapshots_cache.get(name) is not None])
+
+    def test_mutators_publish_change_events(self):
+        rbac_service.assign_role_to_user(role_db=self.role_db, user_db=self.users['user_2'],
+                                         source='assignments/user_2.yaml')
+        self.publish_change.assert_called_once_with(users=['user_2'], roles=None,
+                                                    all_users=False)
+
+        self.publish_change.reset_mock()
+        rbac_service.create_permission_grant(role_db=self.role_db, resource_uid=None,
+                                             resource_type=None,
+                                             permission_types=[PermissionType.ACTION_LIST])
+        self.publish_change.assert_called_once_with(users=None, roles=['role_1'],
+                                                    all_users=False)
+
+    def test_change_events_are_not_published_when_disabled(self):
+        cfg.CONF.set_override(name='change_events_enabled', override=False, group='rbac')
+
+        rbac_service.assign_role_to_user(role_db=self.role_db, user_db=self.users['user_2'],
+                                         source='assignments/user_2.yaml')
+        self.assertFalse(self.publish_change.called)
+
+    def test_batched_changes_are_published_as_single_event(self):
+        syncer = RBACRemoteGroupToRoleSyncer()
+        rbac_service.create_group_to_role_map(group='group_1', roles=['role_1'],
+                                              source='mappings/group_1.yaml')
+        self.publish_change.reset_mock()
+
+        with invalidation.batched_changes():
+            syncer.sync(user_db=self.users['user_2'], groups=['group_1'])
+            syncer.sync(user_db=self.users['user_3'], groups=['group_1'])
+
+        self.assertEqual(self.publish_change.call_count, 1)
+        call_kwargs = self.publish_change.call_args[1]
+        self.assertEqual(call_kwargs['users'], set(['user_2', 'user_3']))
+        self.assertEqual(call_kwargs['roles'], set([]))
+
+    def test_handle_change_event_users(self):
+        self._populate_cache()
+
+        result = invalidation.handle_change_event({'origin': 'node_2', 'users': ['user_2'],
+                                                   'roles': [], 'all': False})
+        self.assertEqual(result, set(['user_2']))
+        self.assertEqual(self._get_cached_usernames(), set(['user_1', 'user_3']))
+
+        decisions_cache = rbac_cache.get_decisions_cache()
+        key = request_scope.get_decision_cache_key(user_db=self.users['user_2'],
+                                                   permission_type=PermissionType.ACTION_LIST)
+        self.assertEqual(decisions_cache.get(key), None)
+        key = request_scope.get_decision_cache_key(user_db=self.users['user_1'],
+                                                   permission_type=PermissionType.ACTION_LIST)
+        self.assertEqual(decisions_cache.get(key), False)
+
+    def test_handle_change_event_roles(self):
+        self._populate_cache()
+
+        # user_1 has role_1 assigned in the database
+        result = invalidation.handle_change_event({'origin': 'node_2', 'users': [],
+                                                   'roles': ['role_1'], 'all': False})
+        self.assertEqual(result, set(['user_1']))
+        self.assertEqual(self._get_cached_usernames(), set(['user_2', 'user_3']))
+
+    def test_handle_change_event_all(self):
+        self._populate_cache()
+
+        result = invalidation.handle_change_event({'origin': 'node_2', 'users': [],
+                                                   'roles': [], 'all': True})
+        self.assertEqual(result, None)
+        self.assertEqual(self._get_cached_usernames(), set([]))
+
+    def test_handle_change_event_published_by_this_process_is_ignored(self):
+        self._populate_cache()
+
+        result = invalidation.handle_change_event({'origin': invalidation.ORIGIN,
+                                                   'users': ['user_2'], 'roles': [],
+                                                   'all': False})
+        self.assertEqual(result, set([]))
+        self.assertEqual(self._get_cached_usernames(), set(['user_1', 'user_2', 'user_3']))
@@ -15,6 +15,9 @@
 
 from __future__ import absolute_import
 import os
+import json
+import shutil
+import tempfile
 
 import unittest2
 import mock
@@ -22,6 +25,7 @@ import jsonschema
 
 from st2tests import config
 from st2tests.fixturesloader import get_fixtures_base_path
+from st2rbac_backend import loader as loader_module
 from st2rbac_backend.loader import RBACDefinitionsLoader
 
 __all__ = [
@@ -280,3 +284,212 @@ class RBACDefinitionsLoaderTestCase(unittest2.TestCase):
 
         file_paths = loader._get_group_to_role_maps_file_paths()
         self.assertEqual(file_paths, expected_result)
+
+    def test_load_group_to_role_mappings_parallel(self):
+        file_paths = [
+            os.path.join(get_fixtures_base_path(), 'rbac/mappings/mapping_one.yaml'),
+            os.path.join(get_fixtures_base_path(), 'rbac/mappings/mapping_two.yaml')
+        ]
+
+        loader = RBACDefinitionsLoader(parallel=1)
+        loader._get_group_to_role_maps_file_paths = mock.Mock(return_value=file_paths)
+        expected_result = loader.load_group_to_role_maps()
+
+        loader = RBACDefinitionsLoader(parallel=2)
+        loader._get_group_to_role_maps_file_paths = mock.Mock(return_value=file_paths)
+        result = loader.load_group_to_role_maps()
+
+        self.assertEqual(list(result.keys()), list(expected_result.keys()))
+        for group_name, role_mapping_api in expected_result.items():
+            self.assertEqual(result[group_name].roles, role_mapping_api.roles)
+            self.assertEqual(result[group_name].file_path, role_mapping_api.file_path)
+
+    def test_worker_load_file_doesnt_use_config(self):
+        file_path = os.path.join(get_fixtures_base_path(), 'rbac/mappings/mapping_one.yaml')
+        loader = RBACDefinitionsLoader(parallel=1)
+        expected_result = loader.load_group_to_role_map_assignment_from_file(file_path=file_path)
+
+        # Worker processes can be spawned in which case config is not parsed
+        with mock.patch.object(loader_module, 'cfg', mock.Mock(CONF=None)):
+            result = loader_module._load_file(
+                load_func_name='load_group_to_role_map_assignment_from_file',
+                file_path=file_path)
+
+        self.assertEqual(result.group, expected_result.group)
+        self.assertEqual(result.roles, expected_result.roles)
+        self.assertEqual(result.file_path, expected_result.file_path)
+
+    def test_load_role_definitions_duplicate_role_definition_parallel(self):
+        loader = RBACDefinitionsLoader(parallel=2)
+
+        file_path1 = os.path.join(get_fixtures_base_path(), 'rbac_invalid/roles/role_three1.yaml')
+        file_path2 = os.path.join(get_fixtures_base_path(), 'rbac_invalid/roles/role_three2.yaml')
+        file_paths = [file_path1, file_path2]
+
+        loader._get_role_definitions_file_paths = mock.Mock()
+        loader._get_role_definitions_file_paths.return_value = file_paths
+
+        expected_msg = 'Duplicate definition file found for role "role_three_name_conflict"'
+        self.assertRaisesRegexp(ValueError, expected_msg, loader.load_role_definitions)
+
+    def test_load_group_to_role_mappings_duplicate_group(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        source_file_path = os.path.join(get_fixtures_base_path(), 'rbac/mappings/mapping_one.yaml')
+        file_paths = []
+        for file_name in ['mapping_one.yaml', 'mapping_one_copy.yaml']:
+            file_path = os.path.join(temp_dir, 'mappings', file_name)
+            if not os.path.isdir(os.path.dirname(file_path)):
+                os.makedirs(os.path.dirname(file_path))
+            shutil.copy(source_file_path, file_path)
+            file_paths.append(file_path)
+
+        loader = RBACDefinitionsLoader()
+        loader._get_group_to_role_maps_file_paths = mock.Mock(return_value=file_paths)
+
+        expected_msg = ('Duplicate definition file found for group "some ldap group" '
+                        '\\("mappings/mapping_one.yaml" and "mappings/mapping_one_copy.yaml"\\)')
+        self.assertRaisesRegexp(ValueError, expected_msg, loader.load_group_to_role_maps)
+
+    def test_load_group_to_role_mappings_parse_cache(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        file_paths = []
+        for file_name in ['mapping_one.yaml', 'mapping_two.yaml']:
+            file_path = os.path.join(temp_dir, 'mappings', file_name)
+            if not os.path.isdir(os.path.dirname(file_path)):
+                os.makedirs(os.path.dirname(file_path))
+            shutil.copy(os.path.join(get_fixtures_base_path(), 'rbac/mappings', file_name),
+                        file_path)
+            file_paths.append(file_path)
+
+        cache_path = os.path.join(temp_dir, 'cache', 'definitions.json')
+
+        # Cold run, all the files are parsed and cached
+        loader = RBACDefinitionsLoader(cache_path=cache_path)
+        loader._get_group_to_role_maps_file_paths = mock.Mock(return_value=file_paths)
+        expected_result = loader.load_group_to_role_maps()
+        self.assertTrue(os.path.isfile(cache_path))
+
+        # Warm run, no files are parsed
+        loader = RBACDefinitionsLoader(cache_path=cache_path)
+        loader._get_group_to_role_maps_file_paths = mock.Mock(return_value=file_paths)
+        loader.load_group_to_role_map_assignment_from_file = mock.Mock()
+        result = loader.load_group_to_role_maps()
+
+        self.assertFalse(loader.load_group_to_role_map_assignment_from_file.called)
+        self.assertEqual(list(result.keys()), list(expected_result.keys()))
+        self.assertEqual(result['some ldap group'].roles, ['pack_admin'])
+
+        # Only the changed file is parsed
+        with open(file_paths[0], 'a') as fp:
+            fp.write('description: "changed"\n')
+
+        loader = RBACDefinitionsLoader(cache_path=cache_path)
+        loader._get_group_to_role_maps_file_paths = mock.Mock(return_value=file_paths)
+        result = loader.load_group_to_role_maps()
+        self.assertEqual(result['some ldap group'].description, 'changed')
+
+        loader = RBACDefinitionsLoader(cache_path=cache_path)
+        loader._get_group_to_role_maps_file_paths = mock.Mock(return_value=file_paths)
+        loader.load_group_to_role_map_assignment_from_file = mock.Mock()
+        result = loader.load_group_to_role_maps()
+        self.assertFalse(loader.load_group_to_role_map_assignment_from_file.called)
+        self.assertEqual(result['some ldap group'].description, 'changed')
+
+    def test_parse_cache_file_writable_by_other_users_is_ignored(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        file_paths = [os.path.join(get_fixtures_base_path(), 'rbac/mappings/mapping_one.yaml')]
+        cache_path = os.path.join(temp_dir, 'definitions.json')
+
+        loader = RBACDefinitionsLoader(cache_path=cache_path)
+        loader._get_group_to_role_maps_file_paths = mock.Mock(return_value=file_paths)
+        expected_result = loader.load_group_to_role_maps()
+
+        # Cache is stored as JSON and it's only accessible by the owner
+        with open(cache_path, 'r') as fp:
+            data = json.load(fp)
+
+        self.assertEqual(len(data['entries']['load_group_to_role_map_assignment_from_file']), 1)
+        self.assertEqual(os.stat(cache_path).st_mode & 0o777, 0o600)
+
+        os.chmod(cache_path, 0o666)
+
+        loader = RBACDefinitionsLoader(cache_path=cache_path)
+        loader._get_group_to_role_maps_file_paths = mock.Mock(return_value=file_paths)
+        loader.load_group_to_role_map_assignment_from_file = mock.Mock(
+            wraps=loader.load_group_to_role_map_assignment_from_file)
+        result = loader.load_group_to_role_maps()
+
+        # Cache file could have been tampered with so it's ignored and the file is parsed again
+        self.assertEqual(loader.load_group_to_role_map_assignment_from_file.call_count, 1)
+        self.assertEqual(list(result.keys()), list(expected_result.keys()))
+
+    def test_load_user_role_assignments_from_bulk_files(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        bulk_path = os.path.join(temp_dir, 'assignments', 'bulk')
+        os.makedirs(bulk_path)
+
+        yaml_file_path = os.path.join(bulk_path, 'users.yaml')
+        with open(yaml_file_path, 'w') as fp:
+            fp.write('---\nusername: user_1\nroles: [observer]\n'
+                     '---\nusername: user_2\nroles: [admin]\nenabled: false\n')
+
+        jsonl_file_path = os.path.join(bulk_path, 'users.jsonl')
+        with open(jsonl_file_path, 'w') as fp:
+            fp.write('{"username": "user_3", "roles": ["observer", "admin"]}\n\n')
+
+        loader = RBACDefinitionsLoader()
+        loader._get_role_assiginments_file_paths = mock.Mock(return_value=[])
+        loader._get_bulk_role_assignments_file_paths = mock.Mock(
+            return_value=[jsonl_file_path, yaml_file_path])
+
+        result = loader.load_user_role_assignments()
+        self.assertEqual(list(result.keys()), ['user_3', 'user_1'])
+        self.assertEqual(result['user_3'].roles, ['observer', 'admin'])
+        self.assertEqual(result['user_3'].file_path, 'assignments/bulk/users.jsonl#user_3')
+        self.assertEqual(result['user_1'].file_path, 'assignments/bulk/users.yaml#user_1')
+
+        # Duplicate user across files
+        with open(jsonl_file_path, 'a') as fp:
+            fp.write('{"username": "user_1", "roles": ["admin"]}\n')
+
+        expected_msg = 'Duplicate definition file found for user "user_1"'
+        self.assertRaisesRegexp(ValueError, expected_msg, loader.load_user_role_assignments)
+
+    def test_load_definition_files(self):
+        loader = RBACDefinitionsLoader()
+        fixtures_path = os.path.join(get_fixtures_base_path(), 'rbac')
+        loader._role_definitions_path = os.path.join(fixtures_path, 'roles/')
+        loader._role_maps_path = os.path.join(fixtures_path, 'mappings/')
+
+        role_file_path = os.path.join(fixtures_path, 'roles/role_three.yaml')
+        disabled_role_file_path = os.path.join(fixtures_path, 'roles/role_disabled.yaml')
+        mapping_file_path = os.path.join(fixtures_path, 'mappings/mapping_one.yaml')
+        removed_file_path = os.path.join(fixtures_path, 'roles/removed.yaml')
+        other_file_path = os.path.join(fixtures_path, 'roles/README.md')
+
+        result = loader.load_definition_files([role_file_path, disabled_role_file_path,
+                                               mapping_file_path, removed_file_path,
+                                               other_file_path])
+
+        # Removed files and files which are not definition files are ignored, disabled
+        # definitions are included
+        self.assertItemsEqual(result.keys(), [role_file_path, disabled_role_file_path,
+                                              mapping_file_path])
+
+        section, name, role_definition_api = result[role_file_path][0]
+        self.assertEqual(section, 'roles')
+        self.assertEqual(name, 'role_three')
+        self.assertEqual(role_definition_api.name, 'role_three')
+        self.assertEqual(result[disabled_role_file_path][0][0], 'roles')
+
+        section, name, _ = result[mapping_file_path][0]
+        self.assertEqual(section, 'group_to_role_maps')
+        self.assertEqual(name, 'some ldap group')
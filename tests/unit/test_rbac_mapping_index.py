@@ -0,0 +1,162 @@
+# Copyright 2020 The StackStorm Authors.
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import mock
+from oslo_config import cfg
+
+from st2tests.base import CleanDbTestCase
+from st2common.persistence.rbac import GroupToRoleMapping
+
+from st2rbac_backend import generation
+from st2rbac_backend import mapping_index
+from st2rbac_backend.service import RBACService as rbac_service
+
+__all__ = [
+    'GroupToRoleMapIndexTestCase'
+]
+
+
+class GroupToRoleMapIndexTestCase(CleanDbTestCase):
+    def setUp(self):
+        super(GroupToRoleMapIndexTestCase, self).setUp()
+
+        # Database is cleaned between the tests so the index needs to be reloaded
+        mapping_index.invalidate()
+
+        rbac_service.create_group_to_role_map(group='Admins', roles=['admin'],
+                                              source='mappings/admins.yaml')
+        rbac_service.create_group_to_role_map(group='testers', roles=['role_1', 'role_2'],
+                                              source='mappings/testers.yaml', enabled=False)
+
+    def tearDown(self):
+        super(GroupToRoleMapIndexTestCase, self).tearDown()
+
+        cfg.CONF.set_override(name='group_to_role_map_case_insensitive', override=False,
+                              group='rbac')
+
+    def test_get_mappings(self):
+        index = mapping_index.get_group_to_role_map_index()
+
+        mappings = index.get_mappings(groups=['testers', 'Admins', 'unknown', 'testers'])
+        self.assertEqual([mapping.group for mapping in mappings], ['Admins', 'testers'])
+        self.assertEqual(mappings[1].roles, ['role_1', 'role_2'])
+        self.assertEqual(mappings[1].source, 'mappings/testers.yaml')
+        self.assertFalse(mappings[1].enabled)
+
+        # Group names are case sensitive by default
+        self.assertEqual(index.get_mappings(groups=['admins']), [])
+
+    def test_case_insensitive_group_names(self):
+        cfg.CONF.set_override(name='group_to_role_map_case_insensitive', override=True,
+                              group='rbac')
+
+        index = mapping_index.get_group_to_role_map_index()
+        self.assertTrue(index.case_insensitive)
+
+        mappings = index.get_mappings(groups=['ADMINS', 'Testers'])
+        self.assertEqual([mapping.group for mapping in mappings], ['Admins', 'testers'])
+
+    def test_index_is_reloaded_when_mappings_change(self):
+        index = mapping_index.get_group_to_role_map_index()
+        self.assertEqual(len(index), 2)
+
+        # Index is not reloaded when nothing has changed
+        self.assertTrue(mapping_index.get_group_to_role_map_index() is index)
+
+        # Mapping created in this process
+        rbac_service.create_group_to_role_map(group='stormers', roles=['role_3'],
+                                              source='mappings/stormers.yaml')
+        index = mapping_index.get_group_to_role_map_index()
+        self.assertEqual(len(index.get_mappings(groups=['stormers'])), 1)
+
+        # Mapping removed by another process using RBACService which increments persisted mappings
+        # version (simulated here by removing the mapping and incrementing the version directly)
+        rbac_service.create_group_to_role_map(group='stormers_2', roles=['role_3'],
+                                              source='mappings/stormers_2.yaml')
+        index = mapping_index.get_group_to_role_map_index()
+        self.assertEqual(len(index.get_mappings(groups=['stormers_2'])), 1)
+
+        GroupToRoleMapping.query(group='stormers_2').delete()
+        generation.bump_group_to_role_maps_version()
+
+        index = mapping_index.get_group_to_role_map_index()
+        self.assertEqual(index.get_mappings(groups=['stormers_2']), [])
+
+        # Mapping removed by another process which then activated a new generation
+        GroupToRoleMapping.query(group='stormers').delete()
+        self.assertEqual(len(index.get_mappings(groups=['stormers'])), 1)
+
+        generation.activate_new_generation()
+        index = mapping_index.get_group_to_role_map_index()
+        self.assertEqual(index.get_mappings(groups=['stormers']), [])
+
+    def test_index_is_reloaded_when_mappings_are_written_directly(self):
+        index = mapping_index.get_group_to_role_map_index()
+
+        # Mapping created and deleted directly, bypassing RBACService, changes the collection stamp
+        mapping_db = GroupToRoleMapping.get(group='Admins')
+        mapping_db.id = None
+        mapping_db.group = 'stormers'
+        GroupToRoleMapping.add_or_update(mapping_db)
+
+        index = mapping_index.get_group_to_role_map_index()
+        self.assertEqual(len(index.get_mappings(groups=['stormers'])), 1)
+
+        GroupToRoleMapping.query(group='stormers').delete()
+
+        index = mapping_index.get_group_to_role_map_index()
+        self.assertEqual(index.get_mappings(groups=['stormers']), [])
+
+    def test_index_is_reloaded_once_older_than_max_age(self):
+        timer = mock.Mock(return_value=1000)
+        index = mapping_index.get_group_to_role_map_index(timer=timer)
+        self.assertEqual(index.get_mappings(groups=['Admins'])[0].roles, ['admin'])
+
+        # Mapping updated in place directly doesn't change versions or the collection stamp
+        mapping_db = GroupToRoleMapping.get(group='Admins')
+        mapping_db.roles = ['admin', 'role_3']
+        GroupToRoleMapping.add_or_update(mapping_db)
+
+        timer.return_value = 1059
+        self.assertTrue(mapping_index.get_group_to_role_map_index(timer=timer) is index)
+
+        timer.return_value = 1060
+        index = mapping_index.get_group_to_role_map_index(timer=timer)
+        self.assertEqual(index.get_mappings(groups=['Admins'])[0].roles, ['admin', 'role_3'])
+
+    def test_provided_active_versions_are_used(self):
+        active_versions = generation.get_active_versions()
+        index = mapping_index.get_group_to_role_map_index(active_versions=active_versions)
+
+        # Already retrieved versions are used as is
+        with mock.patch.object(generation, 'get_active_versions') as mock_get_active_versions:
+            self.assertTrue(mapping_index.get_group_to_role_map_index(
+                active_versions=active_versions) is index)
+
+        self.assertFalse(mock_get_active_versions.called)
+
+        # Index is reloaded once newer versions are provided
+        mapping_db = GroupToRoleMapping.get(group='testers')
+        mapping_db.enabled = True
+        GroupToRoleMapping.add_or_update(mapping_db)
+        generation.bump_group_to_role_maps_version()
+
+        active_versions = generation.get_active_versions()
+        self.assertEqual(active_versions.group_to_role_maps_version, 3)
+
+        index = mapping_index.get_group_to_role_map_index(active_versions=active_versions)
+        self.assertTrue(index.get_mappings(groups=['testers'])[0].enabled)
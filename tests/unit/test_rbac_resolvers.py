@@ -35,6 +35,7 @@ from st2common.models.db.pack import PackDB
 from st2common.rbac.migrations import insert_system_roles
 from st2tests.base import CleanDbTestCase
 
+from st2rbac_backend import resolvers
 from st2rbac_backend.backend import RBACBackend
 from st2rbac_backend.service import RBACService as rbac_service
 
@@ -110,6 +111,11 @@ class BasePermissionsResolverTestCase(CleanDbTestCase):
                    'grant was found' % (permission_type, user_db.name, resource_db.get_uid()))
             raise AssertionError(msg)
 
+        # Bulk filtering should result in the same decision
+        result = resolver.filter_resource_dbs(user_db=user_db, resource_dbs=[resource_db],
+                                              permission_type=permission_type)
+        self.assertEqual(result, [resource_db])
+
         return True
 
     def assertUserDoesntHaveResourceDbPermission(self, resolver, user_db, resource_db,
@@ -127,6 +133,11 @@ class BasePermissionsResolverTestCase(CleanDbTestCase):
                    'shouldn\'t exist' % (permission_type, user_db.name, resource_db.get_uid()))
             raise AssertionError(msg)
 
+        # Bulk filtering should result in the same decision
+        result = resolver.filter_resource_dbs(user_db=user_db, resource_dbs=[resource_db],
+                                              permission_type=permission_type)
+        self.assertEqual(result, [])
+
         return True
 
     def assertUserHasResourceDbPermissions(self, resolver, user_db, resource_db, permission_types):
@@ -307,3 +318,46 @@ class PermissionsResolverUtilsTestCase(unittest2.TestCase):
         self.assertRaisesRegexp(ValueError, expected_msg,
                                 self.backend.get_resolver_for_resource_type,
                                 resource_type='alias')
+
+    def test_get_resolver_returns_shared_instance(self):
+        resolver_1 = self.backend.get_resolver_for_resource_type(resource_type=ResourceType.ACTION)
+        resolver_2 = self.backend.get_resolver_for_resource_type(resource_type=ResourceType.ACTION)
+        resolver_3 = self.backend.get_resolver_for_permission_type(
+            permission_type=PermissionType.ACTION_EXECUTE)
+
+        self.assertTrue(resolver_1 is resolver_2)
+        self.assertTrue(resolver_1 is resolver_3)
+
+    def test_get_resolver_for_permission_type(self):
+        permission_types = {
+            PermissionType.PACK_INSTALL: ResourceType.PACK,
+            PermissionType.ACTION_EXECUTE: ResourceType.ACTION,
+            PermissionType.RULE_LIST: ResourceType.RULE,
+            PermissionType.RULE_ENFORCEMENT_VIEW: ResourceType.RULE_ENFORCEMENT,
+            PermissionType.EXECUTION_STOP: ResourceType.EXECUTION,
+            PermissionType.KEY_VALUE_PAIR_VIEW: ResourceType.KEY_VALUE_PAIR,
+            PermissionType.WEBHOOK_SEND: ResourceType.WEBHOOK
+        }
+
+        for permission_type, resource_type in six.iteritems(permission_types):
+            resolver_instance = self.backend.get_resolver_for_permission_type(
+                permission_type=permission_type)
+            self.assertEqual(resolver_instance.resource_type, resource_type)
+
+    def test_register_resolver(self):
+        class CustomPermissionsResolver(resolvers.PermissionsResolver):
+            resource_type = 'custom'
+
+        self.assertRaisesRegexp(ValueError, 'Unsupported resource: custom',
+                                self.backend.get_resolver_for_resource_type,
+                                resource_type='custom')
+
+        resolver_instance = resolvers.register_resolver(resource_type='custom',
+                                                        resolver_cls=CustomPermissionsResolver)
+
+        try:
+            self.assertTrue(self.backend.get_resolver_for_resource_type(
+                resource_type='custom') is resolver_instance)
+        finally:
+            del resolvers.RESOLVER_CLASSES['custom']
+            del resolvers._RESOLVERS_BY_RESOURCE_TYPE['custom']
@@ -15,6 +15,8 @@
 
 from __future__ import absolute_import
 
+import mock
+
 from st2common.rbac.types import PermissionType
 from st2common.rbac.types import ResourceType
 from st2common.persistence.auth import User
@@ -29,7 +31,9 @@ from st2common.models.db.rbac import PermissionGrantDB
 from st2common.models.db.action import ActionDB
 from st2common.models.api.action import ActionAPI
 
+from st2rbac_backend import request_scope
 from st2rbac_backend.resolvers import ActionPermissionsResolver
+from st2rbac_backend.service import RBACService as rbac_service
 from tests.unit.test_rbac_resolvers import BasePermissionsResolverTestCase
 
 __all__ = [
@@ -544,3 +548,115 @@ class ActionPermissionsResolverTestCase(BasePermissionsResolverTestCase):
             user_db=user_db,
             resource_db=resource_db,
             permission_types=permission_types)
+
+    def test_filter_resource_dbs(self):
+        resolver = ActionPermissionsResolver()
+        resource_dbs = [self.resources['action_1'], self.resources['action_3']]
+
+        # Admin user, all the resources are returned
+        user_db = self.users['admin']
+        result = resolver.filter_resource_dbs(user_db=user_db, resource_dbs=resource_dbs,
+                                              permission_type=PermissionType.ACTION_EXECUTE)
+        self.assertEqual(result, resource_dbs)
+
+        # No roles, no resources are returned
+        user_db = self.users['no_roles']
+        result = resolver.filter_resource_dbs(user_db=user_db, resource_dbs=resource_dbs,
+                                              permission_type=PermissionType.ACTION_VIEW)
+        self.assertEqual(result, [])
+
+        # Custom role with "action_view" grant on the action_1 parent pack
+        user_db = self.users['custom_role_action_pack_grant']
+        result = resolver.filter_resource_dbs(user_db=user_db, resource_dbs=resource_dbs,
+                                              permission_type=PermissionType.ACTION_VIEW)
+        self.assertEqual(result, [self.resources['action_1']])
+
+        # Custom role with "action_view" grant on action_3
+        user_db = self.users['custom_role_action_grant']
+        result = resolver.filter_resource_dbs(user_db=user_db, resource_dbs=resource_dbs,
+                                              permission_type=PermissionType.ACTION_VIEW)
+        self.assertEqual(result, [self.resources['action_3']])
+
+        # Permissions snapshot should only be compiled once for the whole list
+        with mock.patch.object(rbac_service, 'get_permissions_snapshot_for_user',
+                               mock.Mock(wraps=rbac_service.get_permissions_snapshot_for_user)) \
+                as mock_get_permissions_snapshot:
+            result = resolver.filter_resource_dbs(user_db=user_db,
+                                                  resource_dbs=resource_dbs * 50,
+                                                  permission_type=PermissionType.ACTION_VIEW)
+            self.assertEqual(len(result), 50)
+            self.assertEqual(mock_get_permissions_snapshot.call_count, 1)
+
+    def test_single_check_outside_of_request_scope_uses_existence_query(self):
+        resolver = ActionPermissionsResolver()
+        user_db = self.users['custom_role_action_grant']
+        resource_db = self.resources['action_3']
+
+        with mock.patch.object(rbac_service, 'get_permissions_snapshot_for_user',
+                               mock.Mock(wraps=rbac_service.get_permissions_snapshot_for_user)) \
+                as mock_get_permissions_snapshot, \
+                mock.patch.object(rbac_service, 'user_has_any_permission_grant',
+                                  mock.Mock(wraps=rbac_service.user_has_any_permission_grant)) \
+                as mock_user_has_any_permission_grant:
+            # Snapshot couldn't be re-used so it's not compiled for a single check
+            self.assertTrue(resolver.user_has_resource_db_permission(
+                user_db=user_db, resource_db=resource_db,
+                permission_type=PermissionType.ACTION_VIEW))
+            self.assertFalse(resolver.user_has_resource_db_permission(
+                user_db=user_db, resource_db=resource_db,
+                permission_type=PermissionType.ACTION_EXECUTE))
+
+            self.assertEqual(mock_get_permissions_snapshot.call_count, 0)
+            self.assertTrue(mock_user_has_any_permission_grant.called)
+
+            # Inside a request scope, snapshot is compiled once and shared by all the checks
+            mock_user_has_any_permission_grant.reset_mock()
+
+            with request_scope.request_scope():
+                self.assertTrue(resolver.user_has_resource_db_permission(
+                    user_db=user_db, resource_db=resource_db,
+                    permission_type=PermissionType.ACTION_VIEW))
+                self.assertFalse(resolver.user_has_resource_db_permission(
+                    user_db=user_db, resource_db=resource_db,
+                    permission_type=PermissionType.ACTION_EXECUTE))
+
+            self.assertEqual(mock_get_permissions_snapshot.call_count, 1)
+            self.assertFalse(mock_user_has_any_permission_grant.called)
+
+    def test_get_query_filter_for_user(self):
+        resolver = ActionPermissionsResolver()
+        all_action_uids = [self.resources['action_1'].get_uid(),
+                           self.resources['action_3'].get_uid()]
+
+        def get_action_uids(user_db, permission_type):
+            query_filter = resolver.get_query_filter_for_user(user_db=user_db,
+                                                              permission_type=permission_type)
+            return [action_db.uid for action_db in ActionDB.objects(query_filter)]
+
+        # Admin user, filter matches all the actions
+        user_db = self.users['admin']
+        self.assertItemsEqual(get_action_uids(user_db, PermissionType.ACTION_EXECUTE),
+                              all_action_uids)
+
+        # No roles, filter doesn't match anything
+        user_db = self.users['no_roles']
+        self.assertItemsEqual(get_action_uids(user_db, PermissionType.ACTION_VIEW), [])
+
+        # Custom role with "action_view" grant on the action_1 parent pack
+        user_db = self.users['custom_role_action_pack_grant']
+        self.assertItemsEqual(get_action_uids(user_db, PermissionType.ACTION_VIEW),
+                              [self.resources['action_1'].get_uid()])
+        self.assertItemsEqual(get_action_uids(user_db, PermissionType.ACTION_EXECUTE), [])
+
+        # Custom role with "action_view" grant on action_3
+        user_db = self.users['custom_role_action_grant']
+        self.assertItemsEqual(get_action_uids(user_db, PermissionType.ACTION_VIEW),
+                              [self.resources['action_3'].get_uid()])
+
+        # Custom role with "action_execute" grant on action_1, "execute" also grants "view"
+        user_db = self.users['custom_role_action_execute_grant']
+        self.assertItemsEqual(get_action_uids(user_db, PermissionType.ACTION_VIEW),
+                              [self.resources['action_1'].get_uid()])
+        self.assertItemsEqual(get_action_uids(user_db, PermissionType.ACTION_EXECUTE),
+                              [self.resources['action_1'].get_uid()])
+        self.assertItemsEqual(get_action_uids(user_db, PermissionType.ACTION_DELETE), [])
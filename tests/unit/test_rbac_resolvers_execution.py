@@ -436,3 +436,49 @@ class ExecutionPermissionsResolverTestCase(BasePermissionsResolverTestCase):
             user_db=user_db,
             resource_db=resource_db,
             permission_types=all_permission_types)
+
+    def test_get_query_filter_for_user(self):
+        resolver = ExecutionPermissionsResolver()
+        exec_1_id = self.resources['exec_1'].id
+
+        def get_execution_ids(user_db, permission_type):
+            query_filter = resolver.get_query_filter_for_user(user_db=user_db,
+                                                              permission_type=permission_type)
+            return [execution_db.id for execution_db in ActionExecutionDB.objects(query_filter)]
+
+        # Admin user, filter matches all the executions
+        user_db = self.users['admin']
+        self.assertItemsEqual(get_execution_ids(user_db, PermissionType.EXECUTION_STOP),
+                              [exec_1_id])
+
+        # Observer, filter matches all the executions for "view" permission
+        user_db = self.users['observer']
+        self.assertItemsEqual(get_execution_ids(user_db, PermissionType.EXECUTION_VIEW),
+                              [exec_1_id])
+        self.assertItemsEqual(get_execution_ids(user_db, PermissionType.EXECUTION_STOP), [])
+
+        # No roles, filter doesn't match anything
+        user_db = self.users['no_roles']
+        self.assertItemsEqual(get_execution_ids(user_db, PermissionType.EXECUTION_VIEW), [])
+
+        # Custom role with unrelated pack grant
+        user_db = self.users['custom_role_unrelated_pack_action_grant']
+        self.assertItemsEqual(get_execution_ids(user_db, PermissionType.EXECUTION_VIEW), [])
+
+        # Custom role with "action_view" grant on the parent pack
+        user_db = self.users['custom_role_pack_action_view_grant']
+        self.assertItemsEqual(get_execution_ids(user_db, PermissionType.EXECUTION_VIEW),
+                              [exec_1_id])
+        self.assertItemsEqual(get_execution_ids(user_db, PermissionType.EXECUTION_RE_RUN), [])
+
+        # Custom role with "action_execute" grant on the action
+        user_db = self.users['custom_role_action_execute_grant']
+        self.assertItemsEqual(get_execution_ids(user_db, PermissionType.EXECUTION_RE_RUN),
+                              [exec_1_id])
+        self.assertItemsEqual(get_execution_ids(user_db, PermissionType.EXECUTION_STOP),
+                              [exec_1_id])
+
+        # Custom role with "action_all" grant on the parent pack
+        user_db = self.users['custom_role_pack_action_all_grant']
+        self.assertItemsEqual(get_execution_ids(user_db, PermissionType.EXECUTION_VIEW),
+                              [exec_1_id])
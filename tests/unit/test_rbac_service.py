@@ -23,7 +23,9 @@ from st2common.rbac.types import PermissionType
 from st2common.rbac.types import ResourceType
 from st2common.rbac.types import SystemRole
 from st2common.persistence.auth import User
+from st2common.persistence.rbac import Role
 from st2common.persistence.rbac import UserRoleAssignment
+from st2common.persistence.rbac import PermissionGrant
 from st2common.persistence.rule import Rule
 from st2common.models.db.auth import UserDB
 from st2common.models.db.rbac import UserRoleAssignmentDB
@@ -283,6 +285,31 @@ class RBACServiceTestCase(CleanDbTestCase):
         self.assertEqual(role_assignment_db_1.user, role_assignment_db_2.user)
         self.assertEqual(role_assignment_db_1.role, role_assignment_db_2.role)
 
+    def test_bulk_upsert_role_assignments(self):
+        user_db = self.users['no_roles']
+
+        # Existing assignment is left untouched
+        existing_assignment_db = rbac_service.assign_role_to_user(
+            role_db=self.roles['custom_role_1'], user_db=user_db, source='mappings/group_1.yaml',
+            is_remote=True)
+
+        role_assignment_dbs = [
+            UserRoleAssignmentDB(user=user_db.name, role='custom_role_1',
+                                 source='mappings/group_1.yaml', is_remote=True),
+            UserRoleAssignmentDB(user=user_db.name, role='custom_role_2',
+                                 source='mappings/group_1.yaml', is_remote=True)
+        ]
+        created_role_assignment_dbs = rbac_service.bulk_upsert_role_assignments(
+            role_assignment_dbs=role_assignment_dbs)
+        self.assertEqual(len(created_role_assignment_dbs), 1)
+        self.assertEqual(created_role_assignment_dbs[0].role, 'custom_role_2')
+        self.assertTrue(created_role_assignment_dbs[0].id)
+
+        role_assignment_dbs = rbac_service.get_role_assignments_for_user(user_db=user_db)
+        self.assertEqual(len(role_assignment_dbs), 2)
+        self.assertEqual(role_assignment_dbs[0].id, existing_assignment_db.id)
+        self.assertTrue(role_assignment_dbs[1].is_remote)
+
     def test_get_all_permission_grants_for_user(self):
         user_db = self.users['1_custom_role']
         role_db = self.roles['custom_role_1']
@@ -312,6 +339,139 @@ class RBACServiceTestCase(CleanDbTestCase):
             resource_types=[ResourceType.RULE])
         self.assertItemsEqual(permission_grants, [permission_grant])
 
+    def test_get_permissions_snapshot_for_user(self):
+        user_db = self.users['1_custom_role']
+        role_db = self.roles['custom_role_1']
+
+        # No grants
+        snapshot = rbac_service.get_permissions_snapshot_for_user(user_db=user_db)
+        self.assertEqual(snapshot.username, user_db.name)
+        self.assertItemsEqual(snapshot.role_names, ['custom_role_1'])
+        self.assertTrue(snapshot.has_role('custom_role_1'))
+        self.assertFalse(snapshot.has_role(SystemRole.ADMIN))
+        self.assertItemsEqual(snapshot.get_permission_grants(), [])
+
+        # Grant some permissions
+        resource_db = self.resources['rule_1']
+        permission_types = [PermissionType.RULE_CREATE, PermissionType.RULE_MODIFY]
+
+        permission_grant = rbac_service.create_permission_grant_for_resource_db(
+            role_db=role_db,
+            resource_db=resource_db,
+            permission_types=permission_types)
+
+        snapshot = rbac_service.get_permissions_snapshot_for_user(user_db=user_db)
+        permission_grants = snapshot.get_permission_grants()
+        self.assertEqual(len(permission_grants), 1)
+        self.assertEqual(permission_grants[0].id, str(permission_grant.id))
+        self.assertEqual(permission_grants[0].resource_uid, resource_db.get_uid())
+        self.assertEqual(permission_grants[0].resource_type, ResourceType.RULE)
+        self.assertItemsEqual(permission_grants[0].permission_types, permission_types)
+
+        # Lookups should match the ones performed by get_all_permission_grants_for_user
+        filters = [
+            {'resource_types': [ResourceType.PACK]},
+            {'resource_types': [ResourceType.RULE]},
+            {'resource_uid': resource_db.get_uid()},
+            {'resource_uid': 'rule:test1:doesntexist'},
+            {'permission_types': [PermissionType.RULE_MODIFY, PermissionType.RULE_ALL]},
+            {'permission_types': [PermissionType.RULE_DELETE]},
+            {'resource_uid': resource_db.get_uid(), 'resource_types': [ResourceType.RULE],
+             'permission_types': [PermissionType.RULE_CREATE]}
+        ]
+
+        for kwargs in filters:
+            permission_grant_dbs = rbac_service.get_all_permission_grants_for_user(
+                user_db=user_db, **kwargs)
+            expected_ids = [str(permission_grant_db.id) for permission_grant_db in
+                            permission_grant_dbs]
+            actual_ids = [entry.id for entry in snapshot.get_permission_grants(**kwargs)]
+            self.assertItemsEqual(actual_ids, expected_ids)
+            self.assertEqual(snapshot.has_permission_grant(**kwargs), len(expected_ids) >= 1)
+
+    def test_permission_grants_lookup_aggregation_matches_query(self):
+        user_db = self.users['1_custom_role']
+        role_db = self.roles['custom_role_1']
+
+        resource_db = self.resources['rule_1']
+        permission_grant_1 = rbac_service.create_permission_grant_for_resource_db(
+            role_db=role_db,
+            resource_db=resource_db,
+            permission_types=[PermissionType.RULE_CREATE, PermissionType.RULE_MODIFY])
+        permission_grant_2 = rbac_service.create_permission_grant_for_resource_db(
+            role_db=role_db,
+            resource_db=resource_db,
+            permission_types=[PermissionType.RULE_DELETE])
+
+        # Same role assigned twice (different sources) shouldn't result in duplicated grants
+        rbac_service.assign_role_to_user(role_db=role_db, user_db=user_db,
+                                         source='assignments/%s_2.yaml' % user_db.name)
+
+        filters = [
+            {},
+            {'resource_types': [ResourceType.PACK]},
+            {'resource_types': [ResourceType.RULE]},
+            {'resource_uid': resource_db.get_uid()},
+            {'permission_types': [PermissionType.RULE_DELETE]},
+            {'resource_uid': resource_db.get_uid(), 'resource_types': [ResourceType.RULE],
+             'permission_types': [PermissionType.RULE_CREATE]}
+        ]
+
+        results = {}
+        for lookup in ['query', 'aggregation']:
+            cfg.CONF.set_override(name='permission_grants_lookup', override=lookup, group='rbac')
+
+            results[lookup] = []
+            for kwargs in filters:
+                permission_grant_dbs = rbac_service.get_all_permission_grants_for_user(
+                    user_db=user_db, **kwargs)
+                results[lookup].append(sorted([str(permission_grant_db.id) for
+                                               permission_grant_db in permission_grant_dbs]))
+
+            snapshot = rbac_service.get_permissions_snapshot_for_user(user_db=user_db)
+            self.assertItemsEqual(snapshot.role_names, ['custom_role_1'])
+            self.assertItemsEqual([entry.id for entry in snapshot.get_permission_grants()],
+                                  [str(permission_grant_1.id), str(permission_grant_2.id)])
+
+        cfg.CONF.set_override(name='permission_grants_lookup', override='query', group='rbac')
+
+        self.assertEqual(results['aggregation'], results['query'])
+        self.assertEqual(results['query'][0],
+                         sorted([str(permission_grant_1.id), str(permission_grant_2.id)]))
+
+    def test_user_has_any_permission_grant(self):
+        user_db = self.users['1_custom_role']
+        role_db = self.roles['custom_role_1']
+        resource_db = self.resources['rule_1']
+
+        for lookup in ['query', 'aggregation']:
+            cfg.CONF.set_override(name='permission_grants_lookup', override=lookup, group='rbac')
+            self.assertFalse(rbac_service.user_has_any_permission_grant(user_db=user_db))
+
+        rbac_service.create_permission_grant_for_resource_db(
+            role_db=role_db,
+            resource_db=resource_db,
+            permission_types=[PermissionType.RULE_CREATE, PermissionType.RULE_MODIFY])
+
+        for lookup in ['query', 'aggregation']:
+            cfg.CONF.set_override(name='permission_grants_lookup', override=lookup, group='rbac')
+
+            self.assertTrue(rbac_service.user_has_any_permission_grant(user_db=user_db))
+            self.assertTrue(rbac_service.user_has_any_permission_grant(
+                user_db=user_db, resource_uid=resource_db.get_uid(),
+                resource_types=[ResourceType.RULE],
+                permission_types=[PermissionType.RULE_MODIFY]))
+            self.assertFalse(rbac_service.user_has_any_permission_grant(
+                user_db=user_db, resource_types=[ResourceType.PACK]))
+            self.assertFalse(rbac_service.user_has_any_permission_grant(
+                user_db=user_db, permission_types=[PermissionType.RULE_DELETE]))
+
+            # User without any roles
+            self.assertFalse(rbac_service.user_has_any_permission_grant(
+                user_db=self.users['no_roles']))
+
+        cfg.CONF.set_override(name='permission_grants_lookup', override='query', group='rbac')
+
     def test_create_and_remove_permission_grant(self):
         role_db = self.roles['custom_role_2']
         resource_db = self.resources['rule_1']
@@ -333,6 +493,55 @@ class RBACServiceTestCase(CleanDbTestCase):
         role_db.reload()
         self.assertItemsEqual(role_db.permission_grants, [])
 
+    def test_create_roles_with_grants(self):
+        role_definitions = [
+            {
+                'name': 'bulk_role_1',
+                'description': 'bulk role 1',
+                'permission_grants': [
+                    {
+                        'resource_uid': 'pack:mapack1',
+                        'resource_type': ResourceType.PACK,
+                        'permission_types': [PermissionType.PACK_ALL]
+                    },
+                    {
+                        'resource_uid': None,
+                        'resource_type': None,
+                        'permission_types': [PermissionType.ACTION_LIST]
+                    }
+                ]
+            },
+            {
+                'name': 'bulk_role_2',
+                'description': None,
+                'permission_grants': []
+            }
+        ]
+
+        role_dbs = rbac_service.create_roles_with_grants(role_definitions=role_definitions)
+        self.assertEqual([role_db.name for role_db in role_dbs], ['bulk_role_1', 'bulk_role_2'])
+
+        role_db = Role.get_by_id(str(role_dbs[0].id))
+        self.assertEqual(role_db.description, 'bulk role 1')
+        self.assertEqual(role_db.permission_grants, role_dbs[0].permission_grants)
+        self.assertEqual(len(role_db.permission_grants), 2)
+
+        grant_db = PermissionGrant.get_by_id(role_db.permission_grants[0])
+        self.assertEqual(grant_db.resource_uid, 'pack:mapack1')
+        self.assertEqual(grant_db.permission_types, [PermissionType.PACK_ALL])
+
+        grant_db = PermissionGrant.get_by_id(role_db.permission_grants[1])
+        self.assertEqual(grant_db.resource_uid, None)
+        self.assertEqual(grant_db.permission_types, [PermissionType.ACTION_LIST])
+
+        role_db = Role.get_by_id(str(role_dbs[1].id))
+        self.assertEqual(role_db.permission_grants, [])
+
+        # System role names are blacklisted
+        role_definitions = [{'name': SystemRole.ADMIN, 'permission_grants': []}]
+        self.assertRaises(ValueError, rbac_service.create_roles_with_grants,
+                          role_definitions=role_definitions)
+
     def test_manipulate_permission_grants_unsupported_resource_type(self):
         # Try to manipulate permissions on an unsupported resource
         role_db = self.roles['custom_role_2']
@@ -15,6 +15,8 @@
 
 from __future__ import absolute_import
 
+import mock
+from oslo_config import cfg
 from pymongo import MongoClient
 
 from st2tests.base import CleanDbTestCase
@@ -26,9 +28,13 @@ from st2common.models.db.auth import UserDB
 from st2common.models.db.rbac import UserRoleAssignmentDB
 from st2common.models.api.rbac import RoleDefinitionFileFormatAPI
 from st2common.models.api.rbac import UserRoleAssignmentFileFormatAPI
+from st2common.models.api.rbac import AuthGroupToRoleMapAssignmentFileFormatAPI
+from st2rbac_backend import generation
+from st2rbac_backend import mapping_index
 from st2rbac_backend.service import RBACService as rbac_service
 from st2rbac_backend.syncer import RBACDefinitionsDBSyncer
 from st2rbac_backend.syncer import RBACRemoteGroupToRoleSyncer
+from st2rbac_backend.syncer import has_changes
 
 __all__ = [
     'RBACDefinitionsDBSyncerTestCase',
@@ -45,6 +51,9 @@ class BaseRBACDefinitionsDBSyncerTestCase(CleanDbTestCase):
     def setUp(self):
         super(BaseRBACDefinitionsDBSyncerTestCase, self).setUp()
 
+        # Database is cleaned between the tests so group to role mappings index needs to be reloaded
+        mapping_index.invalidate()
+
         self.roles = {}
         self.users = {}
 
@@ -182,16 +191,128 @@ class RBACDefinitionsDBSyncerTestCase(BaseRBACDefinitionsDBSyncerTestCase):
         self.assertRoleDBObjectExists(role_db=created_role_dbs[0])
         self.assertRoleDBObjectExists(role_db=created_role_dbs[1])
 
-        # We sync again, this time with one role (role 1) removed locally
+        role_2_db = Role.get(name='test_role_2')
+
+        # We sync again, this time with one role (role 1) removed locally, role 2 hasn't changed
+        # and is left untouched
         created_role_dbs, deleted_role_dbs = syncer.sync_roles(role_definition_apis=[api2])
-        self.assertEqual(len(created_role_dbs), 1)
-        self.assertEqual(len(deleted_role_dbs), 2)
+        self.assertEqual(len(created_role_dbs), 0)
+        self.assertEqual(len(deleted_role_dbs), 1)
+        self.assertEqual(deleted_role_dbs[0].name, 'test_role_1')
 
         # Assert role and grants have been created in the DB
         self.assertEqual(len(Role.get_all()), 1)
-        self.assertRoleDBObjectExists(role_db=created_role_dbs[0])
+        self.assertRoleDBObjectExists(role_db=role_2_db)
         self.assertEqual(Role.get_all()[0].name, 'test_role_2')
 
+    def test_sync_roles_unchanged_roles_are_not_touched(self):
+        syncer = RBACDefinitionsDBSyncer()
+
+        permission_grants = [
+            {
+                'resource_uid': 'pack:mapack1',
+                'permission_types': ['pack_all']
+            },
+            {
+                'permission_types': ['sensor_list', 'action_list']
+            }
+        ]
+        api = RoleDefinitionFileFormatAPI(name='test_role_1', description='test description 1',
+                                          permission_grants=permission_grants)
+        created_role_dbs, deleted_role_dbs = syncer.sync_roles(role_definition_apis=[api])
+        self.assertEqual(len(created_role_dbs), 1)
+        role_db = created_role_dbs[0]
+
+        # Order of grants and permission types doesn't matter
+        permission_grants = [
+            {
+                'permission_types': ['action_list', 'sensor_list']
+            },
+            {
+                'resource_uid': 'pack:mapack1',
+                'permission_types': ['pack_all']
+            }
+        ]
+        api = RoleDefinitionFileFormatAPI(name='test_role_1', description='test description 1',
+                                          permission_grants=permission_grants)
+        created_role_dbs, deleted_role_dbs = syncer.sync_roles(role_definition_apis=[api])
+        self.assertItemsEqual(created_role_dbs, [])
+        self.assertItemsEqual(deleted_role_dbs, [])
+
+        self.assertRoleDBObjectExists(role_db=role_db)
+        for permission_grant_id in role_db.permission_grants:
+            self.assertGrantDBObjectExists(permission_grant_id)
+
+    def test_sync_roles_changed_roles_are_updated(self):
+        syncer = RBACDefinitionsDBSyncer()
+
+        permission_grants = [
+            {
+                'resource_uid': 'pack:mapack1',
+                'permission_types': ['pack_all']
+            }
+        ]
+        api1 = RoleDefinitionFileFormatAPI(name='test_role_1', description='test description 1',
+                                           permission_grants=permission_grants)
+        api2 = RoleDefinitionFileFormatAPI(name='test_role_2', description='test description 2',
+                                           permission_grants=[])
+        syncer.sync_roles(role_definition_apis=[api1, api2])
+        role_2_db = Role.get(name='test_role_2')
+
+        # Permission types of role 1 grant have changed
+        permission_grants = [
+            {
+                'resource_uid': 'pack:mapack1',
+                'permission_types': ['pack_view']
+            }
+        ]
+        api1 = RoleDefinitionFileFormatAPI(name='test_role_1', description='test description 1',
+                                           permission_grants=permission_grants)
+        created_role_dbs, deleted_role_dbs = syncer.sync_roles(role_definition_apis=[api1, api2])
+        self.assertEqual(len(created_role_dbs), 1)
+        self.assertEqual(len(deleted_role_dbs), 1)
+        self.assertEqual(created_role_dbs[0].name, 'test_role_1')
+        self.assertEqual(deleted_role_dbs[0].name, 'test_role_1')
+
+        grant_db = PermissionGrant.get_by_id(str(created_role_dbs[0].permission_grants[0]))
+        self.assertEqual(grant_db.permission_types, ['pack_view'])
+
+        # Role has been updated in place
+        role_1_db = Role.get(name='test_role_1')
+        self.assertEqual(role_1_db.id, deleted_role_dbs[0].id)
+        self.assertEqual(role_1_db.permission_grants, created_role_dbs[0].permission_grants)
+
+        # Old grant has been removed
+        self.assertEqual(len(PermissionGrant.get_all()), 1)
+
+        self.assertRoleDBObjectExists(role_db=role_2_db)
+
+    def test_sync_activates_new_generation(self):
+        syncer = RBACDefinitionsDBSyncer()
+
+        active_generation = generation.get_active_generation()
+
+        api = RoleDefinitionFileFormatAPI(name='test_role_1', description='test description 1',
+                                          permission_grants=[])
+        result = syncer.sync(role_definition_apis=[api], role_assignment_apis=[],
+                             group_to_role_map_apis=[])
+        self.assertEqual(result['generation'], active_generation + 1)
+        self.assertEqual(generation.get_active_generation(), active_generation + 1)
+
+        # Nothing has changed, generation is left untouched so caches are not invalidated
+        result = syncer.sync(role_definition_apis=[api], role_assignment_apis=[],
+                             group_to_role_map_apis=[])
+        self.assertFalse(has_changes(result))
+        self.assertEqual(result['generation'], active_generation + 1)
+        self.assertEqual(generation.get_active_generation(), active_generation + 1)
+
+        api = RoleDefinitionFileFormatAPI(name='test_role_1', description='test description 2',
+                                          permission_grants=[])
+        result = syncer.sync(role_definition_apis=[api], role_assignment_apis=[],
+                             group_to_role_map_apis=[])
+        self.assertTrue(has_changes(result))
+        self.assertEqual(result['generation'], active_generation + 2)
+
     def test_sync_user_assignments_single_role_assignment(self):
         syncer = RBACDefinitionsDBSyncer()
 
@@ -351,6 +472,98 @@ class RBACDefinitionsDBSyncerTestCase(BaseRBACDefinitionsDBSyncerTestCase):
         self.assertEqual(len(role_dbs), 1)
         self.assertEqual(role_dbs[0], self.roles['role_2'])
 
+    def test_sync_user_assignments_only_changed_assignments_are_written(self):
+        syncer = RBACDefinitionsDBSyncer()
+
+        self._insert_mock_roles()
+
+        # Use a small batch size to exercise multiple bulk writes
+        cfg.CONF.set_override(name='sync_batch_size', override=1, group='rbac')
+        self.addCleanup(cfg.CONF.clear_override, name='sync_batch_size', group='rbac')
+
+        api1 = UserRoleAssignmentFileFormatAPI(
+            username='user_1', roles=['role_1', 'role_2'], file_path='assignments/user1.yaml')
+        api2 = UserRoleAssignmentFileFormatAPI(
+            username='user_2', roles=['role_1'], file_path='assignments/user2.yaml',
+            description='user 2')
+        results = syncer.sync_users_role_assignments(role_assignment_apis=[api1, api2])
+        self.assertEqual(len(results['user_1'][0]), 2)
+        self.assertEqual(len(results['user_2'][0]), 1)
+
+        user_1_assignment_ids = [role_assignment_db.id for role_assignment_db in
+                                 rbac_service.get_role_assignments_for_user(
+                                     user_db=self.users['user_1'])]
+
+        # Only user_2 assignment description has changed
+        api2 = UserRoleAssignmentFileFormatAPI(
+            username='user_2', roles=['role_1'], file_path='assignments/user2.yaml',
+            description='user 2 updated')
+        results = syncer.sync_users_role_assignments(role_assignment_apis=[api1, api2])
+        self.assertEqual(results['user_1'], ([], []))
+        self.assertEqual(len(results['user_2'][0]), 1)
+        self.assertEqual(len(results['user_2'][1]), 1)
+
+        role_assignment_dbs = rbac_service.get_role_assignments_for_user(
+            user_db=self.users['user_1'])
+        self.assertItemsEqual([role_assignment_db.id for role_assignment_db in
+                               role_assignment_dbs], user_1_assignment_ids)
+
+        role_assignment_dbs = rbac_service.get_role_assignments_for_user(
+            user_db=self.users['user_2'])
+        self.assertEqual(len(role_assignment_dbs), 1)
+        self.assertEqual(role_assignment_dbs[0].description, 'user 2 updated')
+        self.assertEqual(role_assignment_dbs[0].id, results['user_2'][0][0].id)
+
+    def test_sync_user_assignments_are_diffed_and_written_in_user_batches(self):
+        syncer = RBACDefinitionsDBSyncer()
+
+        self._insert_mock_roles()
+
+        api1 = UserRoleAssignmentFileFormatAPI(
+            username='user_1', roles=['role_1'], file_path='assignments/user1.yaml')
+        api2 = UserRoleAssignmentFileFormatAPI(
+            username='user_2', roles=['role_2'], file_path='assignments/user2.yaml')
+        api3 = UserRoleAssignmentFileFormatAPI(
+            username='doesntexist_3', roles=['role_1'], file_path='assignments/user3.yaml')
+        syncer.sync_users_role_assignments(role_assignment_apis=[api1, api2, api3])
+
+        cfg.CONF.set_override(name='sync_batch_size', override=2, group='rbac')
+        self.addCleanup(cfg.CONF.clear_override, name='sync_batch_size', group='rbac')
+
+        # user_1 assignment file is removed and user_2 assignment has changed
+        api2 = UserRoleAssignmentFileFormatAPI(
+            username='user_2', roles=['role_1'], file_path='assignments/user2.yaml')
+
+        bulk_write_role_assignments = mock.Mock(
+            wraps=rbac_service.bulk_write_role_assignments)
+
+        with mock.patch.object(rbac_service, 'bulk_write_role_assignments',
+                               bulk_write_role_assignments):
+            results = syncer.sync_users_role_assignments(role_assignment_apis=[api2, api3])
+
+        # Users are processed in sorted order, two users per batch
+        usernames = sorted(set(['user_1', 'user_2', 'doesntexist_3'] + list(self.users.keys())))
+        self.assertItemsEqual(results.keys(), usernames)
+        self.assertEqual(bulk_write_role_assignments.call_count, (len(usernames) + 1) // 2)
+
+        for call in bulk_write_role_assignments.call_args_list:
+            written_usernames = set([role_assignment_db.user for role_assignment_db in
+                                     call[1]['role_assignment_dbs_to_create'] +
+                                     call[1]['role_assignment_dbs_to_delete']])
+            self.assertTrue(len(written_usernames) <= 2)
+
+        self.assertEqual(len(results['user_1'][1]), 1)
+        self.assertEqual(results['doesntexist_3'], ([], []))
+
+        role_dbs = rbac_service.get_roles_for_user(user_db=self.users['user_1'])
+        self.assertItemsEqual(role_dbs, [])
+
+        role_dbs = rbac_service.get_roles_for_user(user_db=self.users['user_2'])
+        self.assertItemsEqual(role_dbs, [self.roles['role_1']])
+
+        role_dbs = rbac_service.get_roles_for_user(user_db=UserDB(name='doesntexist_3'))
+        self.assertItemsEqual(role_dbs, [self.roles['role_1']])
+
     def test_sync_assignments_user_doesnt_exist_in_db(self):
         # Make sure that the assignments for the users which don't exist in the db are still saved
         syncer = RBACDefinitionsDBSyncer()
@@ -376,6 +589,31 @@ class RBACDefinitionsDBSyncerTestCase(BaseRBACDefinitionsDBSyncerTestCase):
         self.assertEqual(role_dbs[0], self.roles['role_1'])
         self.assertEqual(role_dbs[1], self.roles['role_2'])
 
+    def test_sync_assignments_only_for_provided_usernames(self):
+        syncer = RBACDefinitionsDBSyncer()
+
+        self._insert_mock_roles()
+
+        api_1 = UserRoleAssignmentFileFormatAPI(username='user_1', roles=['role_1'],
+                                                file_path='assignments/user_1.yaml')
+        api_2 = UserRoleAssignmentFileFormatAPI(username='user_2', roles=['role_2'],
+                                                file_path='assignments/user_2.yaml')
+        syncer.sync_users_role_assignments(role_assignment_apis=[api_1, api_2])
+
+        # Only user_2 is synchronized, user_1 assignments are left untouched even though user_1
+        # is not in the provided assignments
+        api_2 = UserRoleAssignmentFileFormatAPI(username='user_2', roles=['role_1'],
+                                                file_path='assignments/user_2.yaml')
+        result = syncer.sync_users_role_assignments(role_assignment_apis=[api_2],
+                                                    usernames=['user_2'])
+        self.assertEqual(list(result.keys()), ['user_2'])
+
+        role_dbs = rbac_service.get_roles_for_user(user_db=self.users['user_1'])
+        self.assertItemsEqual(role_dbs, [self.roles['role_1']])
+
+        role_dbs = rbac_service.get_roles_for_user(user_db=self.users['user_2'])
+        self.assertItemsEqual(role_dbs, [self.roles['role_1']])
+
     def test_sync_assignments_are_removed_user_doesnt_exist_in_db(self):
         # Make sure that the assignments for the users which don't exist in the db are correctly
         # removed
@@ -520,6 +758,74 @@ class RBACDefinitionsDBSyncerTestCase(BaseRBACDefinitionsDBSyncerTestCase):
         role_dbs = rbac_service.get_roles_for_user(user_db=user_db)
         self.assertEqual(len(role_dbs), 0)
 
+    def test_sync_group_to_role_maps_only_changes_are_written(self):
+        syncer = RBACDefinitionsDBSyncer()
+
+        api1 = AuthGroupToRoleMapAssignmentFileFormatAPI(
+            group='group_1', roles=['role_1'], description='group 1', enabled=True)
+        api1.file_path = 'mappings/group_1.yaml'
+        api2 = AuthGroupToRoleMapAssignmentFileFormatAPI(
+            group='group_2', roles=['role_2'], description='group 2', enabled=True)
+        api2.file_path = 'mappings/group_2.yaml'
+        api3 = AuthGroupToRoleMapAssignmentFileFormatAPI(
+            group='group_3', roles=['role_3'], description='group 3', enabled=True)
+        api3.file_path = 'mappings/group_3.yaml'
+
+        created, updated, removed = syncer.sync_group_to_role_maps([api1, api2, api3])
+        self.assertEqual(len(created), 3)
+        self.assertEqual(len(updated), 0)
+        self.assertEqual(len(removed), 0)
+        self.assertEqual(len(GroupToRoleMapping.get_all()), 3)
+
+        mapping_1_db = GroupToRoleMapping.get(group='group_1')
+        mapping_2_db = GroupToRoleMapping.get(group='group_2')
+
+        # group_1 is unchanged, group_2 is disabled, group_3 is removed and group_4 is added
+        api2 = AuthGroupToRoleMapAssignmentFileFormatAPI(
+            group='group_2', roles=['role_2'], description='group 2', enabled=False)
+        api2.file_path = 'mappings/group_2.yaml'
+        api4 = AuthGroupToRoleMapAssignmentFileFormatAPI(
+            group='group_4', roles=['role_1', 'role_2'], description='group 4', enabled=True)
+        api4.file_path = 'mappings/group_4.yaml'
+
+        created, updated, removed = syncer.sync_group_to_role_maps([api1, api2, api4])
+        self.assertEqual([db.group for db in created], ['group_4'])
+        self.assertEqual([db.group for db in updated], ['group_2'])
+        self.assertEqual([db.group for db in removed], ['group_3'])
+
+        self.assertItemsEqual([db.group for db in GroupToRoleMapping.get_all()],
+                              ['group_1', 'group_2', 'group_4'])
+        self.assertEqual(GroupToRoleMapping.get(group='group_1').id, mapping_1_db.id)
+
+        mapping_db = GroupToRoleMapping.get(group='group_2')
+        self.assertEqual(mapping_db.id, mapping_2_db.id)
+        self.assertFalse(mapping_db.enabled)
+
+        mapping_db = GroupToRoleMapping.get(group='group_4')
+        self.assertEqual(mapping_db.roles, ['role_1', 'role_2'])
+        self.assertEqual(mapping_db.source, 'mappings/group_4.yaml')
+
+    def test_sync_group_to_role_maps_duplicate_group(self):
+        syncer = RBACDefinitionsDBSyncer()
+
+        api1 = AuthGroupToRoleMapAssignmentFileFormatAPI(
+            group='group_1', roles=['role_1'], description='group 1', enabled=True)
+        api1.file_path = 'mappings/group_1.yaml'
+        api2 = AuthGroupToRoleMapAssignmentFileFormatAPI(
+            group='group_2', roles=['role_2'], description='group 2', enabled=True)
+        api2.file_path = 'mappings/group_2.yaml'
+        api3 = AuthGroupToRoleMapAssignmentFileFormatAPI(
+            group='group_1', roles=['role_3'], description='group 1 copy', enabled=True)
+        api3.file_path = 'mappings/group_1_copy.yaml'
+
+        expected_msg = ('Duplicate definition file found for group "group_1" '
+                        '\\("mappings/group_1.yaml" and "mappings/group_1_copy.yaml"\\)')
+        self.assertRaisesRegexp(ValueError, expected_msg, syncer.sync_group_to_role_maps,
+                                [api1, api2, api3])
+
+        # Nothing has been written
+        self.assertEqual(len(GroupToRoleMapping.get_all()), 0)
+
     def assertRoleDBObjectExists(self, role_db):
         result = Role.get_by_id(str(role_db.id))
         self.assertTrue(result)
@@ -772,9 +1078,10 @@ class RBACRemoteGroupToRoleSyncerTestCase(BaseRBACDefinitionsDBSyncerTestCase):
         result = syncer.sync(user_db=self.users['user_1'], groups=groups)
         created_role_assignment_dbs = result[0]
         removed_role_assignment_dbs = result[1]
-        self.assertEqual(len(created_role_assignment_dbs), 1)
-        self.assertEqual(len(removed_role_assignment_dbs), 2)
-        self.assertEqual(created_role_assignment_dbs[0].role, 'mock_remote_role_3')
+        self.assertEqual(len(created_role_assignment_dbs), 0)
+        self.assertEqual(len(removed_role_assignment_dbs), 1)
+        self.assertEqual(removed_role_assignment_dbs[0].role, 'mock_remote_role_3')
+        self.assertEqual(removed_role_assignment_dbs[0].source, 'mappings/testers.yaml')
 
         role_assignment_dbs = rbac_service.get_role_assignments_for_user(
             user_db=self.users['user_1'])
@@ -907,7 +1214,13 @@ class RBACRemoteGroupToRoleSyncerTestCase(BaseRBACDefinitionsDBSyncerTestCase):
         self.assertEqual(role_dbs[2], self.roles['mock_remote_role_3'])
         self.assertEqual(role_dbs[3], self.roles['mock_remote_role_4'])
 
-        # Disable second mapping - one assignment should be removed
+        # Disable second mapping - one assignment should be removed. Mapping is updated in place
+        # directly which doesn't change mappings version or collection stamp so index is only
+        # reloaded once it's older than max age
+        cfg.CONF.set_override(name='group_to_role_map_index_max_age', override=0, group='rbac')
+        self.addCleanup(cfg.CONF.clear_override, name='group_to_role_map_index_max_age',
+                        group='rbac')
+
         mapping_db = GroupToRoleMapping.get(group='CN=testers,OU=groups,DC=stackstorm,DC=net')
         mapping_db.enabled = False
         GroupToRoleMapping.add_or_update(mapping_db)
@@ -915,11 +1228,9 @@ class RBACRemoteGroupToRoleSyncerTestCase(BaseRBACDefinitionsDBSyncerTestCase):
         result = syncer.sync(user_db=self.users['user_1'], groups=groups)
         created_role_assignment_dbs = result[0]
         removed_role_assignment_dbs = result[1]
-        self.assertEqual(len(created_role_assignment_dbs), 1)
-        self.assertEqual(len(removed_role_assignment_dbs), 2)
-        self.assertEqual(created_role_assignment_dbs[0].role, 'mock_remote_role_3')
-        self.assertEqual(removed_role_assignment_dbs[0].role, 'mock_remote_role_3')
-        self.assertEqual(removed_role_assignment_dbs[1].role, 'mock_remote_role_4')
+        self.assertEqual(len(created_role_assignment_dbs), 0)
+        self.assertEqual(len(removed_role_assignment_dbs), 1)
+        self.assertEqual(removed_role_assignment_dbs[0].role, 'mock_remote_role_4')
 
         # Verify post sync run state - mock_remote_role_4 assignment should be removed
         role_dbs = rbac_service.get_roles_for_user(user_db=user_db, include_remote=True)
@@ -928,6 +1239,70 @@ class RBACRemoteGroupToRoleSyncerTestCase(BaseRBACDefinitionsDBSyncerTestCase):
         self.assertEqual(role_dbs[1], self.roles['mock_local_role_2'])
         self.assertEqual(role_dbs[2], self.roles['mock_remote_role_3'])
 
+    def test_sync_unchanged_groups_and_mappings_is_noop(self):
+        syncer = RBACRemoteGroupToRoleSyncer()
+        user_db = self.users['user_1']
+
+        rbac_service.create_group_to_role_map(group='CN=stormers,OU=groups,DC=stackstorm,DC=net',
+                                              roles=['mock_remote_role_3', 'mock_remote_role_4'],
+                                              source='mappings/stormers.yaml')
+
+        groups = ['CN=stormers,OU=groups,DC=stackstorm,DC=net']
+        result = syncer.sync(user_db=user_db, groups=groups)
+        self.assertEqual(len(result[0]), 2)
+        self.assertEqual(result[1], [])
+
+        # Same groups and mappings - nothing should be written
+        with mock.patch.object(rbac_service, 'bulk_upsert_role_assignments') as mock_upsert:
+            result = syncer.sync(user_db=user_db, groups=list(reversed(groups)))
+
+        self.assertEqual(result, ([], []))
+        self.assertFalse(mock_upsert.called)
+
+        role_dbs = rbac_service.get_roles_for_user(user_db=user_db, include_remote=True)
+        self.assertEqual(len(role_dbs), 4)
+
+        # Revoking a role resets the fingerprint so the assignment is re-created on next sync
+        rbac_service.revoke_role_from_user(role_db=self.roles['mock_remote_role_4'],
+                                           user_db=user_db)
+        result = syncer.sync(user_db=user_db, groups=groups)
+        self.assertEqual(len(result[0]), 1)
+        self.assertEqual(result[0][0].role, 'mock_remote_role_4')
+
+        # Active generation of RBAC definitions changes (e.g. other roles have been re-synced),
+        # groups, mappings and mapped roles are the same so sync is still a no-op
+        generation.activate_new_generation()
+
+        with mock.patch.object(rbac_service, 'bulk_upsert_role_assignments') as mock_upsert:
+            result = syncer.sync(user_db=user_db, groups=groups)
+
+        self.assertEqual(result, ([], []))
+        self.assertFalse(mock_upsert.called)
+
+    def test_sync_mapped_role_which_is_created_later_is_assigned(self):
+        syncer = RBACRemoteGroupToRoleSyncer()
+        user_db = self.users['user_1']
+
+        rbac_service.create_group_to_role_map(group='CN=stormers,OU=groups,DC=stackstorm,DC=net',
+                                              roles=['mock_remote_role_3', 'role_created_later'],
+                                              source='mappings/stormers.yaml')
+
+        groups = ['CN=stormers,OU=groups,DC=stackstorm,DC=net']
+        result = syncer.sync(user_db=user_db, groups=groups)
+        self.assertEqual([role_assignment_db.role for role_assignment_db in result[0]],
+                         ['mock_remote_role_3'])
+
+        # Role doesn't exist yet, nothing has changed
+        result = syncer.sync(user_db=user_db, groups=groups)
+        self.assertEqual(result, ([], []))
+
+        # Missing role is created which changes the fingerprint so the assignment is created
+        rbac_service.create_role(name='role_created_later')
+
+        result = syncer.sync(user_db=user_db, groups=groups)
+        self.assertEqual([role_assignment_db.role for role_assignment_db in result[0]],
+                         ['role_created_later'])
+
     def test_no_mappings_in_db_old_mappings_are_deleted(self):
         # Test case which verifies that existing / old mappings are deleted from db if no mappings
         # exist on disk for a particular set of groups.
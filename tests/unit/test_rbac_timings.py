@@ -0,0 +1,89 @@
+# Copyright 2020 The StackStorm Authors.
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import unittest2
+
+from st2rbac_backend import timings
+
+__all__ = [
+    'PhaseRecorderTestCase'
+]
+
+
+class MockTimer(object):
+    def __init__(self):
+        self.now = 1000
+
+    def __call__(self):
+        return self.now
+
+
+class PhaseRecorderTestCase(unittest2.TestCase):
+    def tearDown(self):
+        super(PhaseRecorderTestCase, self).tearDown()
+        timings.stop_recording()
+
+    def test_phases_are_not_recorded_by_default(self):
+        with timings.phase('parse'):
+            pass
+
+        self.assertEqual(timings.stop_recording(), None)
+
+    def test_record_phases(self):
+        timer = MockTimer()
+        recorder = timings.start_recording(timings.PhaseRecorder(timer=timer))
+        counter = timings.QueryCounter()
+
+        with timings.phase('roles: db diff'):
+            timer.now += 2
+            counter.started(None)
+
+            with timings.phase('roles: write'):
+                timer.now += 1
+                counter.started(None)
+                counter.started(None)
+
+        with timings.phase('roles: db diff'):
+            timer.now += 1
+
+        self.assertTrue(timings.stop_recording() is recorder)
+
+        # Phases are no longer recorded
+        counter.started(None)
+
+        self.assertEqual(list(recorder.phases.keys()), ['roles: db diff', 'roles: write'])
+        self.assertEqual(recorder.phases['roles: db diff'],
+                         {'time': 4.0, 'calls': 2, 'queries': 3})
+        self.assertEqual(recorder.phases['roles: write'],
+                         {'time': 1.0, 'calls': 1, 'queries': 2})
+
+        report = recorder.format_report(count_queries=True)
+        self.assertEqual(report.splitlines()[0].split(), ['Phase', 'Time', '(s)', 'Queries'])
+        self.assertEqual(report.splitlines()[1].split(), ['roles:', 'db', 'diff', '4.0000', '3'])
+
+    def test_timed_iter(self):
+        timer = MockTimer()
+        recorder = timings.start_recording(timings.PhaseRecorder(timer=timer))
+
+        def items():
+            for item in [1, 2]:
+                timer.now += 1
+                yield item
+
+        self.assertEqual(list(timings.timed_iter('parse', items())), [1, 2])
+        self.assertEqual(recorder.phases['parse']['time'], 2.0)
+        self.assertEqual(recorder.phases['parse']['calls'], 3)
@@ -15,6 +15,7 @@
 
 from __future__ import absolute_import
 
+import mock
 from oslo_config import cfg
 
 from st2tests.base import DbTestCase
@@ -22,9 +23,12 @@ from st2tests.config import parse_args
 from st2common.models.db.auth import UserDB
 from st2common.models.db.rbac import UserRoleAssignmentDB
 
+from st2common.rbac.types import PermissionType
 from st2common.rbac.types import SystemRole
 from st2common.rbac.migrations import insert_system_roles
 
+from st2rbac_backend import request_scope
+from st2rbac_backend.service import RBACService as rbac_service
 from st2rbac_backend.utils import RBACUtils as rbac_utils
 
 __all__ = [
@@ -107,3 +111,92 @@ class RBACUtilsTestCase(DbTestCase):
 
         # Regular user
         self.assertFalse(rbac_utils.user_has_system_role(user_db=self.regular_user))
+
+    def test_request_scope_role_lookups_are_memoized(self):
+        # Make sure RBAC is enabled for the tests
+        cfg.CONF.set_override(name='enable', override=True, group='rbac')
+
+        get_permissions_snapshot_for_user = mock.Mock(
+            wraps=rbac_service.get_permissions_snapshot_for_user)
+
+        with mock.patch.object(rbac_service, 'get_permissions_snapshot_for_user',
+                               get_permissions_snapshot_for_user):
+            with request_scope.request_scope() as scope:
+                self.assertTrue(rbac_utils.user_is_admin(user_db=self.admin_user))
+                self.assertTrue(rbac_utils.user_has_system_role(user_db=self.admin_user))
+                self.assertFalse(rbac_utils.user_is_system_admin(user_db=self.admin_user))
+
+                # Nested scope re-uses the outer one
+                with request_scope.request_scope() as nested_scope:
+                    self.assertTrue(nested_scope is scope)
+                    self.assertTrue(rbac_utils.user_has_role(user_db=self.admin_user,
+                                                             role=SystemRole.ADMIN))
+
+                self.assertFalse(rbac_utils.user_is_admin(user_db=self.regular_user))
+
+            self.assertEqual(get_permissions_snapshot_for_user.call_count, 2)
+            self.assertEqual(request_scope.get_current_request_scope(), None)
+
+            # Outside of the scope, nothing is memoized
+            self.assertTrue(rbac_utils.user_is_admin(user_db=self.admin_user))
+            self.assertEqual(get_permissions_snapshot_for_user.call_count, 2)
+
+    def test_request_scope_decisions_are_memoized(self):
+        # Make sure RBAC is enabled for the tests
+        cfg.CONF.set_override(name='enable', override=True, group='rbac')
+        cfg.CONF.set_override(name='backend', override='default', group='rbac')
+
+        with request_scope.request_scope() as scope:
+            result = rbac_utils.user_has_permission(user_db=self.regular_user,
+                                                    permission_type=PermissionType.ACTION_LIST)
+            self.assertFalse(result)
+
+            cache_key = request_scope.get_decision_cache_key(
+                user_db=self.regular_user, permission_type=PermissionType.ACTION_LIST)
+            self.assertEqual(scope.get_decision(cache_key), False)
+
+            # Memoized decision is returned
+            scope.set_decision(cache_key, True)
+            result = rbac_utils.user_has_permission(user_db=self.regular_user,
+                                                    permission_type=PermissionType.ACTION_LIST)
+            self.assertTrue(result)
+
+        # Scope is gone, decision is evaluated again
+        result = rbac_utils.user_has_permission(user_db=self.regular_user,
+                                                permission_type=PermissionType.ACTION_LIST)
+        self.assertFalse(result)
+
+    def test_request_scope_middleware(self):
+        # Make sure RBAC is enabled for the tests
+        cfg.CONF.set_override(name='enable', override=True, group='rbac')
+
+        get_permissions_snapshot_for_user = mock.Mock(
+            wraps=rbac_service.get_permissions_snapshot_for_user)
+
+        def app(environ, start_response):
+            # Multiple checks performed as part of the same request share a single scope
+            scope = request_scope.get_current_request_scope()
+            self.assertTrue(scope is not None)
+
+            rbac_utils.assert_user_is_admin(user_db=self.admin_user)
+            self.assertTrue(rbac_utils.user_has_role(user_db=self.admin_user,
+                                                     role=SystemRole.ADMIN))
+            self.assertTrue(rbac_utils.user_has_system_role(user_db=self.admin_user))
+
+            start_response('200 OK', [])
+            return [b'ok']
+
+        middleware = request_scope.RequestScopeMiddleware(app)
+        start_response = mock.Mock()
+
+        with mock.patch.object(rbac_service, 'get_permissions_snapshot_for_user',
+                               get_permissions_snapshot_for_user):
+            self.assertEqual(middleware({}, start_response), [b'ok'])
+            self.assertEqual(get_permissions_snapshot_for_user.call_count, 1)
+
+            # Each request gets a new scope
+            self.assertEqual(middleware({}, start_response), [b'ok'])
+            self.assertEqual(get_permissions_snapshot_for_user.call_count, 2)
+
+        self.assertEqual(request_scope.get_current_request_scope(), None)
+        start_response.assert_called_with('200 OK', [])
@@ -0,0 +1,233 @@
+# Copyright 2020 The StackStorm Authors.
+# Copyright (C) 2020 Extreme Networks, Inc - All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+import mock
+from st2tests.base import CleanDbTestCase
+from st2common.models.api.rbac import RoleDefinitionFileFormatAPI
+from st2common.models.api.rbac import UserRoleAssignmentFileFormatAPI
+
+from st2rbac_backend import generation
+from st2rbac_backend.watch import RBACDefinitionsWatcher
+
+__all__ = [
+    'RBACDefinitionsWatcherTestCase'
+]
+
+
+class RBACDefinitionsWatcherTestCase(CleanDbTestCase):
+    def setUp(self):
+        super(RBACDefinitionsWatcherTestCase, self).setUp()
+
+        self.files = {}
+        self._set_file('roles/role_1.yaml', 'roles', 'role_1',
+                       RoleDefinitionFileFormatAPI(name='role_1', permission_grants=[]))
+        self._set_file('roles/role_2.yaml', 'roles', 'role_2',
+                       RoleDefinitionFileFormatAPI(name='role_2', permission_grants=[]))
+        self._set_file('assignments/user_1.yaml', 'role_assignments', 'user_1',
+                       UserRoleAssignmentFileFormatAPI(username='user_1', roles=['role_1'],
+                                                       file_path='assignments/user_1.yaml'))
+        self._set_file('assignments/user_2.yaml', 'role_assignments', 'user_2',
+                       UserRoleAssignmentFileFormatAPI(username='user_2', roles=['role_2'],
+                                                       file_path='assignments/user_2.yaml'))
+
+        def load_definition_files(file_paths):
+            return dict([(file_path, self.files[file_path]) for file_path in file_paths
+                         if file_path in self.files])
+
+        self.loader = mock.Mock()
+        self.loader.get_definition_file_paths.side_effect = lambda: sorted(self.files.keys())
+        self.loader.load_definition_files.side_effect = load_definition_files
+        self.syncer = mock.Mock()
+        self.syncer.sync_roles.return_value = [[], []]
+        self.syncer.sync_users_role_assignments.return_value = {}
+        self.syncer.sync_group_to_role_maps.return_value = [[], [], []]
+
+        self.watcher = RBACDefinitionsWatcher(loader=self.loader, syncer=self.syncer,
+                                              path='/tmp/rbac/')
+
+    def _set_file(self, file_path, section, name, api):
+        """
+        Add, change (api is provided) or remove (api is None) a definition file.
+
+        :return: Full path to the file.
+        """
+        file_path = os.path.join('/tmp/rbac/', file_path)
+
+        if api is None:
+            del self.files[file_path]
+        else:
+            self.files[file_path] = [(section, name, api)]
+
+        return file_path
+
+    def test_first_run_syncs_all_the_definitions(self):
+        self.watcher.apply()
+
+        self.assertEqual(self.syncer.sync.call_count, 1)
+        self.assertFalse(self.syncer.sync_users_role_assignments.called)
+
+        call_kwargs = self.syncer.sync.call_args[1]
+        self.assertEqual(len(call_kwargs['role_definition_apis']), 2)
+        self.assertEqual(len(call_kwargs['role_assignment_apis']), 2)
+        self.loader.load_definition_files.assert_called_once_with(sorted(self.files.keys()))
+
+    def test_only_changed_files_are_loaded_and_synced(self):
+        self.watcher.apply()
+        self.loader.reset_mock()
+
+        # Nothing has changed
+        self.assertEqual(self.watcher.apply(changed_file_paths=[]), None)
+        self.assertFalse(self.syncer.sync_roles.called)
+        self.assertFalse(self.syncer.sync_users_role_assignments.called)
+
+        # Single user assignment file has changed, only that file is loaded again
+        file_path = self._set_file('assignments/user_2.yaml', 'role_assignments', 'user_2',
+                                   UserRoleAssignmentFileFormatAPI(
+                                       username='user_2', roles=['role_1', 'role_2'],
+                                       file_path='assignments/user_2.yaml'))
+        self.watcher.apply(changed_file_paths=[file_path])
+
+        self.loader.load_definition_files.assert_called_once_with([file_path])
+        self.assertFalse(self.loader.get_definition_file_paths.called)
+        self.assertFalse(self.syncer.sync_roles.called)
+        self.assertFalse(self.syncer.sync_group_to_role_maps.called)
+        call_kwargs = self.syncer.sync_users_role_assignments.call_args[1]
+        self.assertEqual(call_kwargs['usernames'], set(['user_2']))
+
+        # Role file has been removed, users with that role are re-synced
+        self.syncer.reset_mock()
+        file_path = self._set_file('roles/role_1.yaml', 'roles', 'role_1', None)
+        self.watcher.apply(changed_file_paths=[file_path])
+
+        self.assertEqual(self.syncer.sync_roles.call_count, 1)
+        role_definition_apis = self.syncer.sync_roles.call_args[0][0]
+        self.assertEqual([api.name for api in role_definition_apis], ['role_2'])
+        call_kwargs = self.syncer.sync_users_role_assignments.call_args[1]
+        self.assertEqual(call_kwargs['usernames'], set(['user_1', 'user_2']))
+
+    def test_duplicate_definition_in_changed_file(self):
+        self.watcher.apply()
+
+        file_path = self._set_file('roles/role_1_copy.yaml', 'roles', 'role_1',
+                                   RoleDefinitionFileFormatAPI(name='role_1',
+                                                               permission_grants=[]))
+
+        expected_msg = ('Duplicate definition file found for role "role_1" '
+                        '\\("/tmp/rbac/roles/role_1.yaml" and '
+                        '"/tmp/rbac/roles/role_1_copy.yaml"\\)')
+        self.assertRaisesRegexp(ValueError, expected_msg, self.watcher.apply,
+                                changed_file_paths=[file_path])
+        self.assertFalse(self.syncer.sync_roles.called)
+
+        # Failed apply doesn't change the in-memory definitions
+        self._set_file('roles/role_1_copy.yaml', 'roles', 'role_1', None)
+        self.assertEqual(self.watcher.apply(changed_file_paths=[file_path]), None)
+
+    def test_generation_is_only_flipped_if_something_has_been_written(self):
+        self.watcher.apply()
+        active_generation = generation.get_active_generation()
+
+        # Assignment file has changed, but the database is already up to date
+        file_path = self._set_file('assignments/user_2.yaml', 'role_assignments', 'user_2',
+                                   UserRoleAssignmentFileFormatAPI(
+                                       username='user_2', roles=['role_2'],
+                                       description='changed',
+                                       file_path='assignments/user_2.yaml'))
+        result = self.watcher.apply(changed_file_paths=[file_path])
+        self.assertEqual(result['generation'], active_generation)
+        self.assertEqual(generation.get_active_generation(), active_generation)
+
+        self.syncer.sync_users_role_assignments.return_value = {'user_2': (['created'], [])}
+        file_path = self._set_file('assignments/user_2.yaml', 'role_assignments', 'user_2',
+                                   UserRoleAssignmentFileFormatAPI(
+                                       username='user_2', roles=['role_1'],
+                                       file_path='assignments/user_2.yaml'))
+        result = self.watcher.apply(changed_file_paths=[file_path])
+        self.assertEqual(result['generation'], active_generation + 1)
+        self.assertEqual(generation.get_active_generation(), active_generation + 1)
+
+    def test_run_applies_changes_after_debounce(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        file_path = os.path.join(temp_dir, 'user_1.yaml')
+
+        def mock_sleep(seconds):
+            sleep_calls.append(seconds)
+
+            if len(sleep_calls) == 2:
+                # Burst of changes
+                with open(file_path, 'w') as fp:
+                    fp.write('username: user_1\n')
+            elif len(sleep_calls) == 3:
+                with open(file_path, 'a') as fp:
+                    fp.write('roles: [role_1]\n')
+            elif len(sleep_calls) == 5:
+                watcher.stop()
+
+        sleep_calls = []
+        watcher = RBACDefinitionsWatcher(loader=self.loader, syncer=self.syncer, path=temp_dir,
+                                         interval=1.0, debounce=0.5, sleep=mock_sleep)
+        watcher.apply = mock.Mock()
+        watcher.run()
+
+        # Initial apply of all the files and a single apply of the changed file once the changes
+        # have settled down
+        self.assertEqual(watcher.apply.call_args_list, [
+            mock.call(changed_file_paths=None),
+            mock.call(changed_file_paths=[file_path])
+        ])
+        self.assertEqual(sleep_calls, [1.0, 1.0, 0.5, 0.5, 1.0])
+
+    @mock.patch('st2rbac_backend.watch.LOG')
+    def test_run_retries_failed_apply_with_backoff(self, mock_log):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+
+        file_path = os.path.join(temp_dir, 'user_1.yaml')
+
+        def mock_sleep(seconds):
+            sleep_calls.append(seconds)
+
+            if len(sleep_calls) == 8:
+                with open(file_path, 'w') as fp:
+                    fp.write('username: user_1\n')
+            elif len(sleep_calls) == 10:
+                watcher.stop()
+
+        sleep_calls = []
+        watcher = RBACDefinitionsWatcher(loader=self.loader, syncer=self.syncer, path=temp_dir,
+                                         interval=1.0, debounce=0.5, max_retry_interval=4.0,
+                                         sleep=mock_sleep)
+        # Initial apply fails (e.g. invalid definition file or database is not reachable) and so
+        # do the first two retries
+        watcher.apply = mock.Mock(side_effect=[ValueError('invalid'), ValueError('invalid'),
+                                               ValueError('invalid'), None, None])
+        watcher.run()
+
+        # Retries happen after 1, 2 and 4 (max) intervals, new change is applied right away
+        self.assertEqual(watcher.apply.call_count, 5)
+        self.assertEqual(sleep_calls, [1.0] * 8 + [0.5, 1.0])
+        self.assertEqual(watcher.apply.call_args_list[-1],
+                         mock.call(changed_file_paths=[file_path]))
+
+        # Full error is only logged once for the same snapshot
+        self.assertEqual(mock_log.exception.call_count, 1)